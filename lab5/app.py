@@ -1,11 +1,31 @@
-from flask import Flask, request, jsonify
-from db import SessionLocal
+from flask import Flask, Response, request, jsonify, stream_with_context
+from sqlalchemy.exc import ProgrammingError, IntegrityError, DataError
+from db import engine, Session, SessionLocal, pool_status
 from queries import *
+from instrumentation import export_metrics
+from pagination import next_cursor
+from search import search_products, autocomplete_products
+from cache import query_cache, listen_for_invalidations
+from transfers import transfer_stock, InsufficientStockError
+from sales import SalesIngestor
+from serialization import dumps_rows, dumps_grouped, row_columns, stream_rows, stream_formats, stream_mimetypes
+import atexit
 import inspect
+import queue
+import threading
 
 def create_app():
     app = Flask(__name__)
 
+    # Записи кэша, устаревшие из-за изменений в других процессах, удаляются по NOTIFY
+    if query_cache.enabled:
+        listen_for_invalidations(engine)
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        # Сессия запроса откатывается, закрывается и возвращает соединение в пул
+        Session.remove()
+
     @app.route("/") 
     def index():
         return "Flask работает"
@@ -20,8 +40,31 @@ def create_app():
                 v = request.args.get(arg, None)
                 if v != None:
                     args[arg] = v
-            args["session"]=SessionLocal()
-            return str(func(**args))
+            if "limit" in args:
+                try:
+                    args["limit"] = int(args["limit"])
+                except ValueError:
+                    args["limit"] = 0
+                if args["limit"] < 1:
+                    return Response(f"Неверный параметр limit: {request.args['limit']}", status=400)
+            # ?layout=columns - столбцовое представление результата
+            layout = request.args.get("layout", "rows")
+            if layout not in ("rows", "columns"):
+                return Response(f"Неизвестный формат: {layout}", status=400)
+            args["session"]=Session()
+            try:
+                rows, execution_time = func(**args)
+            except ValueError as e:
+                return Response(str(e), status=400)
+            except DataError as e:
+                # Значение параметра не приводится к типу столбца
+                return Response(f"Неверный параметр: {e.orig}", status=400)
+            # Списочные запросы постраничные: ?cursor=<next_cursor предыдущей страницы>
+            extra = dict()
+            if func.__name__ in keyset_columns:
+                limit = args.get("limit", sig.parameters["limit"].default)
+                extra["next_cursor"] = next_cursor(rows, keyset_columns[func.__name__], limit)
+            return Response(dumps_rows(row_columns(rows), rows, execution_time, layout, **extra), mimetype="application/json")
         
         return query_func 
         
@@ -29,41 +72,187 @@ def create_app():
         app.add_url_rule(f"/{func.__name__}", endpoint=func.__name__, view_func=call_func(func))
     
     
+    @app.route("/stream/<name>")
+    def stream(name):
+        # Выгрузка без ограничения числа строк: /stream/query_3_department_products?department_id=1&format=csv
+        if name not in query_statements:
+            return Response(f"Неизвестный запрос: {name}", status=404)
+        format = request.args.get("format", "ndjson")
+        if format not in stream_formats:
+            return Response(f"Неизвестный формат: {format}", status=400)
+        try:
+            chunk_size = int(request.args.get("chunk_size", 1000))
+            limit = int(request.args["limit"]) if "limit" in request.args else None
+        except ValueError as e:
+            return Response(f"Неверный параметр: {e}", status=400)
+        if chunk_size < 1:
+            return Response(f"Неверный параметр chunk_size: {chunk_size}", status=400)
+
+        statement, params = query_statements[name]
+        args = dict()
+        for arg in inspect.signature(params).parameters:
+            v = request.args.get(arg, None)
+            if v != None:
+                args[arg] = v
+
+        def generate():
+            # Отдельная сессия живёт, пока ответ не отправлен целиком (серверный курсор открыт до конца выгрузки)
+            session = SessionLocal()
+            try:
+                columns, partitions = stream_query(session, name, chunk_size=chunk_size, limit=limit, **args)
+                yield from stream_rows(columns, partitions, format)
+            finally:
+                session.close()
+
+        return Response(stream_with_context(generate()), mimetype=stream_mimetypes[format])
+
+    @app.route("/batch/<name>")
+    def batch(name):
+        # Один запрос для нескольких ключей: /batch/query_1_1_store_products?ids=1,2,3&limit=10
+        if name not in batch_statements:
+            return Response(f"Неизвестный пакетный запрос: {name}", status=404)
+        layout = request.args.get("layout", "rows")
+        if layout not in ("rows", "columns"):
+            return Response(f"Неизвестный формат: {layout}", status=400)
+        try:
+            ids = [int(id) for id in request.args.get("ids", "").split(",") if id]
+            limit = int(request.args.get("limit", 100))
+        except ValueError as e:
+            return Response(f"Неверный параметр: {e}", status=400)
+        if not ids:
+            return Response("Не заданы ключи ids", status=400)
+        grouped, execution_time = query_batch(Session(), name, ids, limit=limit, show_output=False)
+        return Response(dumps_grouped(grouped, execution_time, layout), mimetype="application/json")
+
+    @app.route("/search")
+    def search():
+        # /search?q=молоко&mode=auto|fts|substring|similar&limit=20
+        try:
+            rows, execution_time = search_products(
+                Session(), request.args.get("q", ""), mode=request.args.get("mode", "auto"),
+                limit=int(request.args.get("limit", 20)), show_output=False
+            )
+        except ValueError as e:
+            return Response(str(e), status=400)
+        except ProgrammingError as e:
+            # Режим similar недоступен без расширения pg_trgm
+            Session.rollback()
+            return Response(f"Режим поиска недоступен: {e.orig}", status=501)
+        return Response(dumps_rows(row_columns(rows), rows, execution_time), mimetype="application/json")
+
+    @app.route("/autocomplete")
+    def autocomplete():
+        # /autocomplete?prefix=мол&limit=10
+        try:
+            rows, execution_time = autocomplete_products(
+                Session(), request.args.get("prefix", ""), limit=int(request.args.get("limit", 10)), show_output=False
+            )
+        except ValueError as e:
+            return Response(str(e), status=400)
+        return Response(dumps_rows(row_columns(rows), rows, execution_time), mimetype="application/json")
+
+    @app.route("/transfer", methods=["POST"])
+    def transfer():
+        # [{"trading_base_id": 1, "department_id": 2, "article": 3, "quantity": 5}, ...] - весь пакет в одной транзакции
+        try:
+            transfers = [
+                (int(t["trading_base_id"]), int(t["department_id"]), int(t["article"]), int(t["quantity"]))
+                for t in request.get_json(force=True)
+            ]
+            session = Session()
+            count = transfer_stock(session, transfers)
+        except (KeyError, TypeError, ValueError) as e:
+            # Количество <= 0 отвергает transfer_stock: отрицательное перемещение вернуло бы товар на базу
+            return Response(f"Неверный пакет перемещений: {e}", status=400)
+        except InsufficientStockError as e:
+            Session.rollback()
+            return jsonify({"error": str(e), "shortages": [list(s) for s in e.shortages]}), 409
+        except IntegrityError as e:
+            # Отдел или товар, которых нет в справочниках: в detail - ключ, нарушивший внешний ключ
+            Session.rollback()
+            return jsonify({"error": "Неизвестный отдел или товар", "detail": e.orig.diag.message_detail}), 409
+        except DataError as e:
+            # Ключ или количество вне диапазона integer
+            Session.rollback()
+            return Response(f"Неверный пакет перемещений: {e.orig.diag.message_primary}", status=400)
+        session.commit()
+        return jsonify({"transferred": count})
+
+    # Приём продаж запускается при первой продаже: восстанавливает журнал и работает в фоне
+    sales = {"ingestor": None}
+    sales_lock = threading.Lock()
+
+    def sales_ingestor():
+        with sales_lock:
+            if sales["ingestor"] is None:
+                sales["ingestor"] = SalesIngestor(engine).start()
+                atexit.register(sales["ingestor"].stop)
+            return sales["ingestor"]
+
+    @app.route("/sales", methods=["POST"])
+    def sales_():
+        # [{"department_id": 1, "article": 2, "quantity": 1}, ...] - применяются окнами в фоне
+        try:
+            events = [
+                (int(e["department_id"]), int(e["article"]), int(e.get("quantity", 1)))
+                for e in request.get_json(force=True)
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            return Response(f"Неверный список продаж: {e}", status=400)
+        # Ответ после записи продаж в журнал на диске: принятое переживёт сбой процесса
+        try:
+            accepted = sales_ingestor().submit_many(events, timeout=1)
+        except ValueError as e:
+            return Response(f"Неверный список продаж: {e}", status=400)
+        except queue.Full as e:
+            # Очередь полна дольше секунды: клиент повторяет непринятые продажи позже
+            return jsonify({"accepted": e.accepted}), 503, {"Retry-After": "1"}
+        except OSError as e:
+            return jsonify({"accepted": 0, "error": str(e)}), 503, {"Retry-After": "1"}
+        return jsonify({"accepted": accepted}), 202
+
     @app.route("/hack_me")
     def hack_me():
-        session = SessionLocal()
+        session = Session()
         try:
             value = request.args.get("value", "")
             return str(bad_query_like(session, value))
         except Exception as e:
             print(f"Произошла ошибка: {e}")
             session.rollback()
-        finally:
-            session.close()
             
     @app.route("/bad_query")        
     def bad_query_():
-        session = SessionLocal()
+        session = Session()
         try:
             value = request.args.get("value", "")
             return str(bad_query_id(session, value))
         except Exception as e:
             print(f"Произошла ошибка: {e}")
             session.rollback()
-        finally:
-            session.close()
         
     
+    @app.route("/metrics")
+    def metrics():
+        # Гистограммы фаз выполнения запросов (instrumentation), состояние пула соединений и кэша
+        metrics = export_metrics()
+        metrics.setdefault("pool", {}).update(pool_status())
+        metrics["cache"] = query_cache.stats()
+        return jsonify(metrics)
+
     @app.route("/request")
     def execute_queries_():
-        session = SessionLocal()
+        # ?concurrency=8 - запросы выполняются параллельно на отдельных соединениях
+        try:
+            concurrency = int(request.args.get("concurrency", 1))
+        except ValueError as e:
+            return Response(f"Неверный параметр: {e}", status=400)
+        session = Session()
         try:
-            return jsonify(execute_queries(session))
+            return jsonify(execute_queries(session, concurrency=concurrency))
         except Exception as e:
             print(f"Произошла ошибка: {e}")
             session.rollback()
-        finally:
-            session.close()
 
     
 
@@ -0,0 +1,69 @@
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, JSONResponse, Response
+from starlette.routing import Route
+from async_db import async_engine, AsyncSessionLocal
+from async_queries import queries
+from instrumentation import export_metrics
+from serialization import dumps_rows, row_columns
+from db import pool_status
+from contextlib import asynccontextmanager
+import inspect
+
+
+def query_args(func, query_params):
+    """
+    Аргументы запроса из строки запроса. asyncpg не приводит типы параметров сам,
+    поэтому значения приводятся к типу значения по умолчанию ('3' -> 3 для store_id).
+    """
+    args = dict()
+    for name, parameter in list(inspect.signature(func).parameters.items())[1:]:
+        v = query_params.get(name, None)
+        if v != None:
+            args[name] = type(parameter.default)(v)
+    return args
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_engine.dispose()
+
+
+def create_app():
+    async def index(request):
+        return PlainTextResponse("Starlette работает")
+
+    def call_func(func):
+        async def query_func(request):
+            try:
+                args = query_args(func, request.query_params)
+            except ValueError as e:
+                return PlainTextResponse(f"Неверный параметр: {e}", status_code=400)
+            layout = request.query_params.get("layout", "rows")
+            if layout not in ("rows", "columns"):
+                return PlainTextResponse(f"Неизвестный формат: {layout}", status_code=400)
+            async with AsyncSessionLocal() as session:
+                rows, execution_time = await func(session, **args)
+            return Response(dumps_rows(row_columns(rows), rows, execution_time, layout), media_type="application/json")
+
+        return query_func
+
+    async def metrics(request):
+        # Гистограммы фаз выполнения запросов (instrumentation) и состояние пула соединений
+        metrics = export_metrics()
+        metrics.setdefault("pool", {}).update(pool_status(async_engine.sync_engine))
+        return JSONResponse(metrics)
+
+    routes = [Route("/", index)]
+    for func in queries: # queries - список внутри модуля async_queries
+        routes.append(Route(f"/{func.__name__}", call_func(func), name=func.__name__))
+    routes.append(Route("/metrics", metrics))
+
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=8001, log_level="warning")
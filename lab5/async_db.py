@@ -0,0 +1,17 @@
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from db import (db_host, db_port, db_name, db_user, db_password,
+                pool_size, pool_max_overflow, pool_pre_ping, pool_recycle, pool_timeout)
+
+# Асинхронное подключение к PostgreSQL через asyncpg с теми же настройками пула, что и в db
+async_database_url = f'postgresql+asyncpg://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
+async_engine = create_async_engine(
+    async_database_url,
+    echo=False,
+    pool_size=pool_size,
+    max_overflow=pool_max_overflow,
+    pool_pre_ping=pool_pre_ping,
+    pool_recycle=pool_recycle,
+    pool_timeout=pool_timeout,
+)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
@@ -0,0 +1,58 @@
+from queries import (store_products_statement, base_products_statement, orderable_products_statement,
+                     extended_orderable_products_statement, department_products_statement,
+                     department_managers_statement, department_values_statement, search_products_statement)
+from instrumentation import instrumented_async
+
+# Асинхронные варианты запросов queries: те же готовые операторы и те же параметры,
+# выполнение через AsyncSession без вывода результата в консоль
+
+@instrumented_async("1.1")
+async def query_1_1_store_products(session, store_id=1, limit=100):
+    """1.1 Какие товары имеются в магазине?"""
+    return (await session.execute(store_products_statement, {"store_id": store_id, "limit": limit})).all()
+
+@instrumented_async("1.2")
+async def query_1_2_base_products(session, base_id=2, limit=100):
+    """1.2 Какие товары имеются на базе?"""
+    return (await session.execute(base_products_statement, {"base_id": base_id, "limit": limit})).all()
+
+@instrumented_async("2")
+async def query_2_1_orderable_products(session, store_id=1, limit=100):
+    """2. Какие отсутствующие товары может заказать магазин на базе?"""
+    return (await session.execute(orderable_products_statement, {"store_id": store_id, "limit": limit})).all()
+
+@instrumented_async("2.2")
+async def query_2_2_extended_orderable_products(session, store_id=1, limit=100):
+    """2.2 Какие отсутствующие товары может заказать магазин на базе (включая новые товары)?"""
+    return (await session.execute(extended_orderable_products_statement, {"store_id": store_id, "limit": limit})).all()
+
+@instrumented_async("3")
+async def query_3_department_products(session, department_id=1, store_id=1, limit=100):
+    """3. Какие товары, и в каком количестве имеются в отделе магазина?"""
+    return (await session.execute(department_products_statement, {"department_id": department_id, "limit": limit})).all()
+
+@instrumented_async("4")
+async def query_4_department_managers(session, store_id=1, limit=100):
+    """4. Список заведующих отделами магазина"""
+    return (await session.execute(department_managers_statement, {"store_id": store_id, "limit": limit})).all()
+
+@instrumented_async("5")
+async def query_5_department_values(session, limit=100):
+    """5. Суммарная стоимость товара в каждом отделе"""
+    return (await session.execute(department_values_statement, {"limit": limit})).all()
+
+@instrumented_async("6")
+async def query_6_product_search(session, product_name='Молоко', limit=100):
+    """6. На каких базах, и в каких количествах есть товар нужного наименования?"""
+    return (await session.execute(search_products_statement, {"pattern": f'%{product_name}%', "limit": limit})).all()
+
+queries = [
+    query_1_1_store_products,
+    query_1_2_base_products,
+    query_2_1_orderable_products,
+    query_2_2_extended_orderable_products,
+    query_3_department_products,
+    query_4_department_managers,
+    query_5_department_values,
+    query_6_product_search
+]
@@ -0,0 +1,101 @@
+from contextlib import contextmanager, nullcontext
+import argparse
+import asyncio
+import httpx
+import numpy as np
+import os
+import subprocess
+import sys
+import time
+
+# Запросы нагрузочного теста: поиск товаров магазина по разным store_id
+default_paths = [f"/query_1_1_store_products?store_id={store_id}" for store_id in range(1, 21)]
+
+# Команды запуска серверов: Flask (многопоточный сервер разработки) и Starlette под uvicorn
+servers = {
+    "flask": lambda port: [sys.executable, "-m", "flask", "--app", "app:create_app", "run", "--port", str(port)],
+    "asgi": lambda port: [sys.executable, "-m", "uvicorn", "asgi_app:app", "--port", str(port), "--log-level", "warning"]
+}
+
+
+@contextmanager
+def running_server(name, port):
+    # Кэш результатов Flask-приложения отключён: сравнивается обращение к базе
+    process = subprocess.Popen(servers[name](port), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               env={**os.environ, "QUERY_CACHE_SIZE": "0"})
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for i in range(100):
+            try:
+                httpx.get(url + "/")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError(f"Сервер {name} не запустился на порту {port}")
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def load(url, paths, requests, concurrency, timeout):
+    """Отправляет requests запросов не более чем по concurrency одновременно."""
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(paths[i % len(paths)])
+
+    async def client_worker(client):
+        nonlocal errors
+        while not queue.empty():
+            path = queue.get_nowait()
+            start_time = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start_time)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        await client.get(paths[0])  # Прогрев
+        start_time = time.perf_counter()
+        await asyncio.gather(*(client_worker(client) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start_time
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность Flask и ASGI-приложения на одних и тех же запросах")
+    parser.add_argument("--requests", type=int, default=2000, help="число запросов на каждый уровень конкурентности")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--timeout", type=float, default=60, help="таймаут одного запроса, секунд")
+    parser.add_argument("--flask-url", help="адрес уже запущенного Flask-приложения (иначе запускается на порту 8000)")
+    parser.add_argument("--asgi-url", help="адрес уже запущенного ASGI-приложения (иначе запускается на порту 8001)")
+    args = parser.parse_args()
+
+    targets = [("flask", args.flask_url, 8000), ("asgi", args.asgi_url, 8001)]
+    print(f"{'сервер':8} {'клиентов':>9} {'запросов/с':>11} {'p50':>10} {'p95':>10} {'p99':>10} {'ошибок':>7}")
+    for name, url, port in targets:
+        with (running_server(name, port) if url is None else nullcontext(url)) as url:
+            for concurrency in args.concurrency:
+                stats = asyncio.run(load(url, default_paths, args.requests, concurrency, args.timeout))
+                print(f"{name:8} {concurrency:9} {stats['rps']:11.1f} {stats['p50_ms']:7.1f} мс "
+                      f"{stats['p95_ms']:7.1f} мс {stats['p99_ms']:7.1f} мс {stats['errors']:7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+from sqlalchemy import select, func
+from db import SessionLocal
+from queries import *
+from models import Store, TradingBase, Department
+from cache import query_cache
+import argparse
+import time
+
+# Ключи, по которым выбираются идентификаторы для каждого пакетного запроса
+key_columns = {
+    "store_id": Store.store_id,
+    "base_id": TradingBase.trading_base_id,
+    "department_id": Department.department_id
+}
+
+
+def sample_ids(session, key, count):
+    column = key_columns[key]
+    return session.execute(select(column).order_by(func.random()).limit(count)).scalars().all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N отдельных запросов против одного пакетного запроса по списку ключей")
+    parser.add_argument("--keys", type=int, default=500, help="число ключей (магазинов, баз, отделов) в пакете")
+    parser.add_argument("--limit", type=int, default=20, help="LIMIT на каждый ключ")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    # Сравнивается обращение к базе, а не кэш результатов
+    query_cache.enabled = False
+    session = SessionLocal()
+    print(f"{'запрос':40} {'ключей':>7} {'по одному':>12} {'пакетом':>12} {'ускорение':>10} {'обращений':>14}")
+
+    for name, (key, statement) in batch_statements.items():
+        ids = sample_ids(session, key, args.keys)
+        single_statement, params = query_statements[name]
+
+        def one_by_one():
+            return {id: session.execute(single_statement, {**params(**{key: id}), "limit": args.limit}).all() for id in ids}
+
+        def batched():
+            return session.execute(statement, {"ids": ids, "limit": args.limit}).all()
+
+        single_rows = sum(len(rows) for rows in one_by_one().values())  # Прогрев
+        batch_rows = len(batched())
+        assert single_rows == batch_rows, (name, single_rows, batch_rows)
+
+        timings = []
+        for action in (one_by_one, batched):
+            start_time = time.perf_counter()
+            for i in range(args.runs):
+                action()
+            timings.append((time.perf_counter() - start_time) / args.runs * 1000)
+
+        print(f"{name:40} {len(ids):7} {timings[0]:9.1f} мс {timings[1]:9.1f} мс "
+              f"{timings[0] / timings[1]:9.1f}x {len(ids):7} -> 1")
+
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from sqlalchemy import text
+from db import engine
+from models import Base
+from populate_data import truncate_sql
+from delta_sync import sync_snapshot, export_snapshot, print_result, snapshot_file, csv_chunks, derived_tables
+from department_values import check_department_values
+import argparse
+import filecmp
+import os
+import shutil
+import tempfile
+import time
+
+# Изменения доли fraction строк крупных таблиц для построения нового снимка
+change_sql = [
+    "SELECT setseed(:seed)",
+    "UPDATE department_product SET count = count + 1 WHERE random() < :fraction",
+    "UPDATE warehouse_product SET count = count + 1, price = price + 1 WHERE random() < :fraction",
+    "UPDATE product_price SET price = price + 1 WHERE random() < :fraction",
+    "DELETE FROM department_product WHERE random() < :fraction / 2",
+    "DELETE FROM warehouse_priority WHERE random() < :fraction / 2",
+    """INSERT INTO department_product (department_id, article, count)
+SELECT d.department_id, p.article, 5
+FROM (SELECT department_id FROM department ORDER BY random() LIMIT 100) d
+CROSS JOIN (SELECT article FROM product ORDER BY random() LIMIT (SELECT count(*) * :fraction / 200 FROM department_product)::int + 1) p
+ON CONFLICT DO NOTHING""",
+    "UPDATE product SET name = name || ' (новая упаковка)' WHERE random() < :fraction",
+    # Смена класса магазина и перенос отдела: department_value меняется в обход триггеров
+    """UPDATE store SET store_class_id = (SELECT min(store_class_id) FROM store_class)
+WHERE store_id = (SELECT min(store_id) FROM store WHERE store_class_id <> (SELECT min(store_class_id) FROM store_class))""",
+    """UPDATE department SET store_id = (SELECT max(store_id) FROM store)
+WHERE department_id IN (SELECT department_id FROM department WHERE store_id <> (SELECT max(store_id) FROM store)
+                        ORDER BY department_id LIMIT 10)"""
+]
+
+
+def snapshots_equal(first, second):
+    names = sorted(os.listdir(first))
+    match, mismatch, errors = filecmp.cmpfiles(first, second, names, shallow=False)
+    return not mismatch and not errors, mismatch
+
+
+def full_reload_time(directory):
+    """TRUNCATE и COPY всех таблиц снимка, транзакция откатывается."""
+    start_time = time.perf_counter()
+    with engine.connect() as conn:
+        conn.execute(text(truncate_sql))
+        for table in Base.metadata.sorted_tables:
+            if table.name in derived_tables:
+                continue
+            path, format = snapshot_file(directory, table.name)
+            header, stream = csv_chunks(path, format)
+            with stream, conn.connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY {table.name} ({', '.join(header)}) FROM STDIN WITH (FORMAT csv)", stream)
+        elapsed = time.perf_counter() - start_time
+        conn.rollback()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синхронизация по снимку против полной перезагрузки")
+    parser.add_argument("--fraction", type=float, default=0.01, help="доля изменённых строк")
+    parser.add_argument("--seed", type=float, default=0.42)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="delta_sync_bench_")
+    current, changed, check = (os.path.join(directory, name) for name in ("current", "changed", "check"))
+    try:
+        with engine.connect() as conn:
+            export_snapshot(conn, current)
+            # Новый снимок: изменения внутри транзакции, выгрузка, откат
+            for statement in change_sql:
+                conn.execute(text(statement), {"seed": args.seed, "fraction": args.fraction})
+            export_snapshot(conn, changed)
+            conn.rollback()
+        rows = sum(1 for name in os.listdir(current) for line in open(os.path.join(current, name), "rb")) - len(os.listdir(current))
+        print(f"Снимок: {rows} строк в {len(os.listdir(current))} таблицах, изменено около {args.fraction:.1%}")
+
+        start_time = time.perf_counter()
+        with engine.begin() as conn:
+            result = sync_snapshot(conn, changed)
+        print_result(result, time.perf_counter() - start_time)
+
+        with engine.connect() as conn:
+            export_snapshot(conn, check)
+            mismatches = check_department_values(conn)
+        equal, different = snapshots_equal(changed, check)
+        print("Таблицы совпадают со снимком" if equal else f"Расхождения: {different}")
+        print("department_value согласована" if not mismatches else f"department_value: расхождений {len(mismatches)}")
+
+        print(f"Полная перезагрузка (TRUNCATE + COPY): {full_reload_time(changed):.2f} секунд")
+    finally:
+        # Возврат к исходным данным той же синхронизацией
+        if os.path.isdir(current):
+            with engine.begin() as conn:
+                sync_snapshot(conn, current)
+            with engine.connect() as conn:
+                export_snapshot(conn, check)
+            print("Исходные данные восстановлены" if snapshots_equal(current, check)[0] else "ИСХОДНЫЕ ДАННЫЕ НЕ ВОССТАНОВЛЕНЫ")
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
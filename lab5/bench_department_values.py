@@ -0,0 +1,73 @@
+from sqlalchemy import text
+from db import engine
+from queries import department_values_statement
+from department_values import build_live_department_values, check_department_values
+import argparse
+import numpy as np
+import time
+
+
+def measure(conn, statement, params, runs):
+    conn.execute(statement, params).all()  # Прогрев
+    latencies = []
+    for i in range(runs):
+        start_time = time.perf_counter()
+        conn.execute(statement, params).all()
+        latencies.append(time.perf_counter() - start_time)
+    latencies = np.array(latencies) * 1000
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def measure_update(conn, sql, triggers, runs):
+    """Время изменения строк с триггерами department_value и без них; изменения откатываются."""
+    latencies = []
+    for i in range(runs):
+        transaction = conn.begin()
+        if not triggers:
+            conn.execute(text("ALTER TABLE department_product DISABLE TRIGGER USER"))
+            conn.execute(text("ALTER TABLE product_price DISABLE TRIGGER USER"))
+        start_time = time.perf_counter()
+        conn.execute(text(sql))
+        latencies.append(time.perf_counter() - start_time)
+        transaction.rollback()
+    return float(np.median(latencies) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запрос 5: агрегат по исходным таблицам против таблицы department_value")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    live_statement = build_live_department_values().order_by(text("total_value DESC")).limit(args.limit)
+
+    with engine.connect() as conn:
+        counts = conn.execute(text("SELECT (SELECT count(*) FROM department_product), (SELECT count(*) FROM product_price)")).one()
+        print(f"department_product: {counts[0]} строк, product_price: {counts[1]} строк")
+
+        live = measure(conn, live_statement, {}, args.runs)
+        summary = measure(conn, department_values_statement, {"limit": args.limit}, args.runs)
+        print(f"{'чтение':28} {'p50':>10} {'p95':>10}")
+        print(f"{'агрегат по исходным таблицам':28} {live[0]:7.2f} мс {live[1]:7.2f} мс")
+        print(f"{'department_value':28} {summary[0]:7.2f} мс {summary[1]:7.2f} мс")
+        print(f"Ускорение чтения: {live[0] / summary[0]:.1f}x")
+        conn.rollback()
+
+        # Цена поддержки: те же изменения с триггерами и без
+        print(f"{'изменение':45} {'без триггеров':>14} {'с триггерами':>14}")
+        for name, sql in [
+            ("UPDATE 1 строки department_product", "UPDATE department_product SET count = count + 1 "
+                                                   "WHERE (department_id, article) IN (SELECT department_id, article FROM department_product LIMIT 1)"),
+            ("UPDATE 1% department_product", "UPDATE department_product SET count = count + 1 WHERE article % 100 = 0"),
+            ("UPDATE 1% product_price", "UPDATE product_price SET price = price + 1 WHERE article % 100 = 0")
+        ]:
+            plain = measure_update(conn, sql, False, max(args.runs // 4, 3))
+            triggered = measure_update(conn, sql, True, max(args.runs // 4, 3))
+            print(f"{name:45} {plain:11.2f} мс {triggered:11.2f} мс")
+
+        mismatches = check_department_values(conn)
+        print("department_value согласована" if not mismatches else f"Расхождений: {len(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
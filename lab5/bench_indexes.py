@@ -0,0 +1,158 @@
+from sqlalchemy import event, text
+from db import engine, SessionLocal
+from models import Base
+from populate_data import populate_test_data_copy, create_indexes, drop_indexes, deferred_indexes, indexes
+from queries import queries
+from cache import query_cache
+from contextlib import redirect_stdout
+import argparse
+import io
+import json
+import numpy as np
+import time
+
+
+def index_configurations():
+    """Наборы индексов: без индексов, все индексы и все без одного."""
+    all_names = [name for name, table, definition in indexes]
+    configurations = {"none": [], "all": all_names}
+    for name in all_names:
+        configurations[f"without:{name}"] = [other for other in all_names if other != name]
+    return configurations
+
+
+def apply_configuration(names):
+    with redirect_stdout(io.StringIO()):
+        drop_indexes(engine)
+        if names:
+            create_indexes(engine, names=names)
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        conn.commit()
+
+
+def capture_statements(query_func):
+    """Выполняет запрос один раз и возвращает отправленные им SQL-операторы с параметрами."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        run_query(query_func)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def explain(statements):
+    plans = []
+    with engine.connect() as conn:
+        with conn.connection.cursor() as cursor:
+            for statement, parameters in statements:
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+                plans.append(cursor.fetchone()[0][0])
+        conn.rollback()
+    return plans
+
+
+def run_query(query_func):
+    session = SessionLocal()
+    try:
+        with redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            query_func(session, show_output=False)
+            return time.perf_counter() - start_time
+    finally:
+        session.close()
+
+
+def measure(query_func, runs):
+    run_query(query_func)  # Прогрев кэша и соединения
+    latencies = np.array([run_query(query_func) for i in range(runs)]) * 1000
+    return {
+        "runs": runs,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99))
+    }
+
+
+def index_impact(results):
+    """Насколько медленнее становится каждый запрос без каждого индекса (по p50, относительно all)."""
+    impact = {}
+    for configuration, measurements in results.items():
+        if not configuration.startswith("without:"):
+            continue
+        name = configuration.split(":", 1)[1]
+        slowdown = {
+            query: measurements[query]["p50_ms"] / results["all"][query]["p50_ms"]
+            for query in measurements
+        }
+        impact[name] = {
+            "p50_slowdown": slowdown,
+            "max_slowdown": max(slowdown.values())
+        }
+    return impact
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка запросов queries при разных наборах индексов")
+    parser.add_argument("--records", type=int, default=0,
+                        help="перезагрузить набор данных с этим числом записей на таблицу (0 - использовать текущие данные)")
+    parser.add_argument("--runs", type=int, default=50, help="число запусков каждого запроса")
+    parser.add_argument("--no-explain", action="store_true", help="не собирать планы EXPLAIN (ANALYZE, BUFFERS)")
+    parser.add_argument("--output", default="index_benchmark.json", help="файл отчёта")
+    parser.add_argument("--threshold", type=float, default=1.1,
+                        help="индекс считается полезным, если без него запрос замедляется сильнее")
+    args = parser.parse_args()
+
+    # Замеряется выполнение запросов в базе, а не чтение из кэша
+    query_cache.enabled = False
+    Base.metadata.create_all(engine)
+    if args.records:
+        with deferred_indexes(engine):
+            populate_test_data_copy(engine, records_per_table=args.records)
+
+    results = {}
+    plans = {}
+    for configuration, names in index_configurations().items():
+        print(f"Конфигурация {configuration} ({len(names)} индексов)...")
+        apply_configuration(names)
+        results[configuration] = {}
+        plans[configuration] = {}
+        for query_func in queries:
+            results[configuration][query_func.__name__] = measure(query_func, args.runs)
+            if not args.no_explain:
+                plans[configuration][query_func.__name__] = explain(capture_statements(query_func))
+            stats = results[configuration][query_func.__name__]
+            print(f"  {query_func.__name__:40} p50 {stats['p50_ms']:9.2f} мс  "
+                  f"p95 {stats['p95_ms']:9.2f} мс  p99 {stats['p99_ms']:9.2f} мс")
+
+    # Восстанавливаем полный набор индексов
+    apply_configuration(index_configurations()["all"])
+
+    impact = index_impact(results)
+    useless = [name for name, stats in impact.items() if stats["max_slowdown"] < args.threshold]
+
+    report = {
+        "records_per_table": args.records or None,
+        "runs": args.runs,
+        "latency": results,
+        "explain": plans,
+        "index_impact": impact,
+        "candidates_to_drop": useless
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"Индексы, без которых ни один запрос не замедляется больше чем в {args.threshold} раза:")
+    for name in useless:
+        print(f"  {name}")
+    print(f"Отчёт сохранён в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
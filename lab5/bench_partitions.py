@@ -0,0 +1,145 @@
+from sqlalchemy import text
+from db import engine
+from models import hash_partitions_sql
+import argparse
+import random
+import statistics
+import time
+
+# department_product двух видов с одинаковыми строками: обычная таблица и секционированная
+# по хешу department_id, как при DB_PARTITIONS (models.py)
+plain_table = "department_product_pbench"
+hash_table = "department_product_pbench_hash"
+
+columns_sql = "(department_id integer, article integer, count integer, PRIMARY KEY (department_id, article))"
+
+# Строки одного отдела разбросаны по таблице, как при поступлении товаров в разные отделы вперемешку
+fill_sql = """
+INSERT INTO {table} (department_id, article, count)
+SELECT department_id, article, (department_id + article) % 50
+FROM generate_series(1, :per_department) AS article CROSS JOIN generate_series(1, :departments) AS department_id
+"""
+
+# Запрос 3 без соединений: товары отдела
+lookup_sql = "SELECT article, count FROM {table} WHERE department_id = :department_id ORDER BY article LIMIT 100"
+
+# Запрос 5 без соединений: количество товаров по отделам
+aggregate_sql = "SELECT department_id, SUM(count) FROM {table} GROUP BY department_id"
+
+# pg_partition_tree не возвращает строк для обычной таблицы
+size_sql = """
+SELECT COALESCE((SELECT SUM(pg_total_relation_size(relid)) FROM pg_partition_tree(:table)),
+                pg_total_relation_size(:table))
+"""
+
+
+def create_tables(args):
+    results = {}
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {plain_table}, {hash_table}"))
+        conn.execute(text(f"CREATE TABLE {plain_table} {columns_sql}"))
+        conn.execute(text(f"CREATE TABLE {hash_table} {columns_sql} PARTITION BY HASH (department_id)"))
+        for statement in hash_partitions_sql(hash_table, args.partitions):
+            conn.execute(text(statement))
+    for table in (plain_table, hash_table):
+        start_time = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(text(fill_sql.format(table=table)),
+                         {"departments": args.departments, "per_department": args.rows // args.departments})
+        load_time = time.perf_counter() - start_time
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"VACUUM ANALYZE {table}"))
+            size = conn.execute(text(size_sql), {"table": table}).scalar()
+        results[table] = {"load": load_time, "size": size}
+    return results
+
+
+def lookup_times(table, department_ids):
+    statement = text(lookup_sql.format(table=table))
+    times = []
+    with engine.connect() as conn:
+        for department_id in department_ids:
+            start_time = time.perf_counter()
+            conn.execute(statement, {"department_id": department_id}).all()
+            times.append(time.perf_counter() - start_time)
+    return times
+
+
+def aggregate_time(table, partitionwise, repeats=3):
+    """Лучшее время из repeats запусков."""
+    times = []
+    with engine.connect() as conn:
+        conn.execute(text(f"SET enable_partitionwise_aggregate = {'on' if partitionwise else 'off'}"))
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            conn.execute(text(aggregate_sql.format(table=table))).all()
+            times.append(time.perf_counter() - start_time)
+        conn.rollback()
+    return min(times)
+
+
+def cleanup_times(department_ids):
+    """
+    Удаление товаров нескольких отделов и VACUUM: обычная таблица очищается целиком,
+    секционированная - только секция, где лежат эти отделы. INDEX_CLEANUP ON - проход по
+    индексу и при малой доле удалённых строк, иначе VACUUM его пропускает.
+    """
+    results = {}
+    for table, vacuum_table in ((plain_table, plain_table), (hash_table, f"{hash_table}_p0")):
+        with engine.begin() as conn:
+            start_time = time.perf_counter()
+            conn.execute(text(f"DELETE FROM {table} WHERE department_id = ANY(:department_ids)"),
+                         {"department_ids": department_ids})
+            delete_time = time.perf_counter() - start_time
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            start_time = time.perf_counter()
+            conn.execute(text(f"VACUUM (INDEX_CLEANUP ON) {vacuum_table}"))
+            results[table] = (delete_time, time.perf_counter() - start_time)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="department_product: обычная таблица против секционированной по хешу отдела")
+    parser.add_argument("--rows", type=int, default=100000000)
+    parser.add_argument("--departments", type=int, default=200000)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--lookups", type=int, default=2000, help="запросов товаров отдела")
+    parser.add_argument("--cleanup", type=int, default=200, help="отделов, товары которых удаляются")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Заполнение: {args.rows} строк, {args.departments} отделов, {args.partitions} секций")
+    tables = create_tables(args)
+
+    rng = random.Random(args.seed)
+    department_ids = [rng.randint(1, args.departments) for _ in range(args.lookups)]
+    for table in (plain_table, hash_table):
+        lookup_times(table, department_ids[:100])  # прогрев кэша
+        times = lookup_times(table, department_ids)
+        tables[table]["lookup"] = statistics.mean(times)
+        tables[table]["lookup_p95"] = statistics.quantiles(times, n=20)[-1]
+        tables[table]["aggregate"] = aggregate_time(table, partitionwise=False)
+    tables[hash_table]["aggregate_partitionwise"] = aggregate_time(hash_table, partitionwise=True)
+
+    with engine.connect() as conn:
+        cleanup_ids = conn.execute(text(
+            f"SELECT DISTINCT department_id FROM {hash_table}_p0 ORDER BY department_id LIMIT :count"
+        ), {"count": args.cleanup}).scalars().all()
+    for table, (delete_time, vacuum_time) in cleanup_times(cleanup_ids).items():
+        tables[table]["delete"] = delete_time
+        tables[table]["vacuum"] = vacuum_time
+
+    print(f"{'таблица':32} {'загрузка':>10} {'размер':>10} {'отдел':>10} {'p95':>10} {'агрегат':>10} "
+          f"{'DELETE':>10} {'VACUUM':>10}")
+    for table, result in tables.items():
+        print(f"{table:32} {result['load']:8.1f} с {result['size'] / 2**20:7.0f} МБ "
+              f"{result['lookup'] * 1000:7.2f} мс {result['lookup_p95'] * 1000:7.2f} мс {result['aggregate']:8.2f} с "
+              f"{result['delete']:8.2f} с {result['vacuum']:8.2f} с")
+    print(f"Агрегат по секциям (enable_partitionwise_aggregate): {tables[hash_table]['aggregate_partitionwise']:.2f} с")
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {plain_table}, {hash_table}"))
+
+
+if __name__ == "__main__":
+    main()
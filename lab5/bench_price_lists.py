@@ -0,0 +1,91 @@
+from sqlalchemy import text
+from db import engine
+from bulk_load import copy_table
+from price_lists import apply_price_list, print_summary, staging_sql, merge_sql
+from decimal import Decimal
+import argparse
+import random
+import time
+
+bench_table = "product_price_bench"
+store_class_id = 1
+
+create_sql = [
+    f"DROP TABLE IF EXISTS {bench_table}",
+    f"CREATE TABLE {bench_table} (LIKE product_price INCLUDING ALL)",
+    f"""INSERT INTO {bench_table} (store_class_id, article, price)
+SELECT {store_class_id}, article, (article % 1000) + 0.99 FROM generate_series(1, :articles) AS article""",
+]
+
+# Тот же INSERT ... ON CONFLICT, но без пропуска неизменных цен: переписывается каждая строка
+rewrite_all_sql = merge_sql.replace("    WHERE {table}.price IS DISTINCT FROM EXCLUDED.price\n", "")
+
+size_sql = text(f"SELECT pg_table_size('{bench_table}')")
+
+
+def create_table(articles):
+    with engine.begin() as conn:
+        for statement in create_sql:
+            conn.execute(text(statement), {"articles": articles})
+    # VACUUM вне транзакции: карта видимости и свободного места как у рабочей таблицы
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"VACUUM ANALYZE {bench_table}"))
+
+
+def price_list(articles, changed, new, seed):
+    """Текущие цены всех товаров, доля changed с новой ценой и new новых товаров."""
+    rng = random.Random(seed)
+    changed_articles = set(rng.sample(range(1, articles + 1), int(articles * changed)))
+    for article in range(1, articles + 1):
+        price = Decimal(article % 1000) + Decimal("0.99")
+        yield article, price + 1 if article in changed_articles else price
+    for article in range(articles + 1, articles + 1 + int(articles * new)):
+        yield article, Decimal("9.99")
+
+
+def rewrite_all(conn, prices):
+    start_time = time.perf_counter()
+    for statement in staging_sql:
+        conn.execute(text(statement))
+    copy_table(conn, "price_list_staging", ["article", "price"], prices, report=False)
+    conn.execute(text("ANALYZE price_list_staging"))
+    conn.execute(text(rewrite_all_sql.format(table=bench_table)), {"store_class_id": store_class_id}).one()
+    return time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Применение прайс-листа: пропуск неизменных цен против перезаписи всех строк")
+    parser.add_argument("--articles", type=int, default=1000000, help="строк в прайс-листе и в таблице")
+    parser.add_argument("--changed", type=float, default=0.01, help="доля изменённых цен")
+    parser.add_argument("--new", type=float, default=0.005, help="доля новых товаров")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results = []
+    for name in ("пропуск неизменных", "перезапись всех"):
+        create_table(args.articles)
+        with engine.connect() as conn:
+            size_before = conn.execute(size_sql).scalar()
+        prices = price_list(args.articles, args.changed, args.new, args.seed)
+        with engine.begin() as conn:
+            if name == "пропуск неизменных":
+                summary = apply_price_list(conn, store_class_id, prices, table=bench_table)
+                print_summary(summary)
+                elapsed = summary["total_seconds"]
+            else:
+                elapsed = rewrite_all(conn, prices)
+        with engine.connect() as conn:
+            size_after = conn.execute(size_sql).scalar()
+        results.append((name, elapsed, size_before, size_after))
+
+    print(f"{'способ':20} {'время':>12} {'таблица до':>12} {'после':>12} {'рост':>8}")
+    for name, elapsed, size_before, size_after in results:
+        print(f"{name:20} {elapsed:9.2f} с {size_before / 2**20:9.1f} МБ {size_after / 2**20:9.1f} МБ "
+              f"{(size_after - size_before) / size_before:7.1%}")
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {bench_table}"))
+
+
+if __name__ == "__main__":
+    main()
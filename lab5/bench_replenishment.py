@@ -0,0 +1,114 @@
+from sqlalchemy import text
+from db import engine
+from replenishment import plan_replenishment, check_plan, print_summary
+import argparse
+import time
+
+# Синтетическая сеть: в случайной тестовой базе пары (магазин, товар) без остатка почти не
+# пересекаются с warehouse_priority, поэтому план строится по плотным копиям таблиц
+bench_tables = {
+    "department_product": "department_product_rbench",
+    "department": "department_rbench",
+    "warehouse_product": "warehouse_product_rbench",
+    "warehouse_priority": "warehouse_priority_rbench"
+}
+
+create_sql = [
+    "DROP TABLE IF EXISTS {department_product}, {department}, {warehouse_product}, {warehouse_priority}",
+    "SELECT setseed(:seed)",
+    # Один отдел на магазин
+    """CREATE UNLOGGED TABLE {department} AS
+SELECT store_id AS department_id, store_id FROM generate_series(1, :stores) AS store_id""",
+    "ALTER TABLE {department} ADD PRIMARY KEY (department_id)",
+    """CREATE UNLOGGED TABLE {department_product} (department_id integer, article integer, count integer,
+PRIMARY KEY (department_id, article))""",
+    # Отсутствующие товары и товары с остатком, которые в план попасть не должны
+    """INSERT INTO {department_product}
+SELECT 1 + floor(random() * :stores), 1 + floor(random() * :articles), CASE WHEN random() < 0.8 THEN 0 ELSE 20 END
+FROM generate_series(1, :demand) ON CONFLICT DO NOTHING""",
+    """CREATE UNLOGGED TABLE {warehouse_priority} (article integer, store_id integer, trading_base_id integer,
+priority integer, PRIMARY KEY (article, store_id, trading_base_id))""",
+    """INSERT INTO {warehouse_priority}
+SELECT dp.article, dp.department_id, 1 + floor(random() * :bases), 1 + floor(random() * 10)
+FROM {department_product} dp, generate_series(1, :candidates) ON CONFLICT DO NOTHING""",
+    # Новые товары: базы назначены, в отделах магазина товара ещё не было
+    """INSERT INTO {warehouse_priority}
+SELECT 1 + floor(random() * :articles), 1 + floor(random() * :stores), 1 + floor(random() * :bases), 1 + floor(random() * 10)
+FROM generate_series(1, :new) ON CONFLICT DO NOTHING""",
+    """CREATE UNLOGGED TABLE {warehouse_product} AS
+SELECT trading_base_id, article, floor(random() * :max_stock)::integer AS count
+FROM {warehouse_priority} GROUP BY trading_base_id, article""",
+    "ALTER TABLE {warehouse_product} ADD PRIMARY KEY (trading_base_id, article)"
+]
+
+# Кандидаты одного магазина, как в запросе 2.1 без ограничения числа строк
+per_store_sql = """
+SELECT p.article, p.trading_base_id, wp.count, p.priority
+FROM {department} d
+JOIN {department_product} dp ON dp.department_id = d.department_id AND dp.count = 0
+JOIN {warehouse_priority} p ON p.store_id = d.store_id AND p.article = dp.article
+JOIN {warehouse_product} wp ON wp.trading_base_id = p.trading_base_id AND wp.article = p.article AND wp.count >= 1
+WHERE d.store_id = :store_id
+ORDER BY p.article, p.priority
+"""
+
+
+def create_bench_tables(params):
+    start_time = time.perf_counter()
+    with engine.begin() as conn:
+        for statement in create_sql:
+            conn.execute(text(statement.format(**bench_tables)), params)
+    with engine.connect() as conn:
+        for table in bench_tables.values():
+            conn.execute(text(f"ANALYZE {table}"))
+        conn.commit()
+        counts = {name: conn.execute(text(f"SELECT count(*) FROM {table}")).scalar() for name, table in bench_tables.items()}
+    print(f"Тестовые таблицы созданы за {time.perf_counter() - start_time:.2f} секунд: "
+          + ", ".join(f"{name} {count}" for name, count in counts.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="План пополнения для всей сети на синтетических данных")
+    parser.add_argument("--stores", type=int, default=2000)
+    parser.add_argument("--articles", type=int, default=200000)
+    parser.add_argument("--demand", type=int, default=1000000, help="число строк department_product (80%% без остатка)")
+    parser.add_argument("--candidates", type=int, default=3, help="баз в warehouse_priority на пару (магазин, товар)")
+    parser.add_argument("--new", type=int, default=100000, help="строк warehouse_priority для товаров, которых в магазине не было")
+    parser.add_argument("--bases", type=int, default=100)
+    parser.add_argument("--max-stock", type=int, default=30, help="остаток базы по товару - случайный от 0 до max-stock")
+    parser.add_argument("--target-stock", type=int, default=10)
+    parser.add_argument("--per-store", type=int, default=50, help="для сравнения: число магазинов, запрошенных по одному")
+    parser.add_argument("--seed", type=float, default=0.42)
+    parser.add_argument("--keep", action="store_true", help="не удалять тестовые таблицы")
+    args = parser.parse_args()
+
+    create_bench_tables({
+        "seed": args.seed, "stores": args.stores, "articles": args.articles, "demand": args.demand,
+        "candidates": args.candidates, "new": args.new, "bases": args.bases, "max_stock": args.max_stock
+    })
+
+    with engine.begin() as conn:
+        summary = plan_replenishment(conn, target_stock=args.target_stock, tables=bench_tables)
+        print_summary(summary)
+        problems = check_plan(conn, bench_tables)
+        print("План корректен" if not problems else f"Нарушения: {problems}")
+
+    # Список кандидатов по одному магазину (без распределения остатков между магазинами)
+    if args.per_store:
+        statement = text(per_store_sql.format(**bench_tables))
+        with engine.connect() as conn:
+            start_time = time.perf_counter()
+            for store_id in range(1, args.per_store + 1):
+                conn.execute(statement, {"store_id": store_id}).all()
+            per_store = (time.perf_counter() - start_time) / args.per_store
+        print(f"По одному магазину: {per_store * 1000:.2f} мс на магазин, "
+              f"{per_store * args.stores:.2f} секунд на {args.stores} магазинов только на список кандидатов; "
+              f"план для всей сети: {summary['total_seconds']:.2f} секунд")
+
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text(create_sql[0].format(**bench_tables)))
+
+
+if __name__ == "__main__":
+    main()
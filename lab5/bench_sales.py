@@ -0,0 +1,139 @@
+from sqlalchemy import text
+from db import engine
+from sales import SalesIngestor, format_sale
+from department_values import check_department_values
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+hot_stock = 10 ** 9
+
+single_sale_sql = text("UPDATE department_product SET count = GREATEST(count - :quantity, 0) "
+                       "WHERE department_id = :department_id AND article = :article")
+
+
+class HotRows:
+    """Строки department_product, по которым идут продажи; исходные остатки для отката."""
+
+    def __init__(self, count, seed):
+        with engine.begin() as conn:
+            conn.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+            self.rows = conn.execute(text(
+                "SELECT department_id, article, count FROM department_product ORDER BY random() LIMIT :count"
+            ), {"count": count}).all()
+        self.keys = [(row.department_id, row.article) for row in self.rows]
+
+    def set_counts(self, counts):
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE department_product dp SET count = c.count "
+                "FROM unnest(CAST(:department_ids AS integer[]), CAST(:articles AS integer[]), CAST(:counts AS integer[])) "
+                "AS c(department_id, article, count) "
+                "WHERE dp.department_id = c.department_id AND dp.article = c.article"
+            ), {"department_ids": [key[0] for key in self.keys], "articles": [key[1] for key in self.keys], "counts": counts})
+
+    def sold(self):
+        """Сколько продано по горячим строкам с момента set_counts([hot_stock, ...])."""
+        with engine.connect() as conn:
+            remaining = conn.execute(text(
+                "SELECT SUM(dp.count) FROM department_product dp "
+                "JOIN unnest(CAST(:department_ids AS integer[]), CAST(:articles AS integer[])) AS k(department_id, article) "
+                "ON dp.department_id = k.department_id AND dp.article = k.article"
+            ), {"department_ids": [key[0] for key in self.keys], "articles": [key[1] for key in self.keys]}).scalar()
+        return hot_stock * len(self.keys) - remaining
+
+
+def produce(ingestor, keys, events, producers, request_size, seed):
+    """
+    producers потоков отправляют events продаж пачками по request_size (как POST /sales),
+    каждая пачка ждёт записи в журнал; первые ключи продаются чаще (распределение Парето).
+    """
+    weights = [1 / (rank + 1) for rank in range(len(keys))]
+    submitted = [0] * producers
+
+    def producer(number):
+        rng = random.Random(seed + number)
+        sales = [(department_id, article, rng.randint(1, 3))
+                 for department_id, article in rng.choices(keys, weights, k=events // producers)]
+        for start in range(0, len(sales), request_size):
+            request = sales[start:start + request_size]
+            ingestor.submit_many(request)
+            submitted[number] += sum(quantity for department_id, article, quantity in request)
+
+    threads = [threading.Thread(target=producer, args=(number,)) for number in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(submitted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Приём продаж: окна с журналом против UPDATE на каждую продажу")
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--producers", type=int, default=4)
+    parser.add_argument("--hot", type=int, default=1000, help="число строк department_product, по которым идут продажи")
+    parser.add_argument("--request-size", type=int, default=100, help="продаж в одном запросе")
+    parser.add_argument("--window", type=float, default=0.05)
+    parser.add_argument("--single", type=int, default=2000, help="продаж для сравнения с UPDATE на каждую продажу")
+    parser.add_argument("--seed", type=float, default=0.42)
+    args = parser.parse_args()
+
+    hot = HotRows(args.hot, args.seed)
+    log_dir = tempfile.mkdtemp(prefix="sales_bench_")
+    log_path = os.path.join(log_dir, "sales.log")
+    try:
+        hot.set_counts([hot_stock] * len(hot.keys))
+
+        # По одной продаже: UPDATE и COMMIT на каждое событие
+        rng = random.Random(args.seed)
+        start_time = time.perf_counter()
+        with engine.connect() as conn:
+            for i in range(args.single):
+                department_id, article = rng.choice(hot.keys)
+                conn.execute(single_sale_sql, {"department_id": department_id, "article": article, "quantity": 1})
+                conn.commit()
+        single_rate = args.single / (time.perf_counter() - start_time)
+        print(f"UPDATE на каждую продажу: {single_rate:10.0f} продаж/с")
+        hot.set_counts([hot_stock] * len(hot.keys))
+
+        ingestor = SalesIngestor(engine, log_path=log_path, window=args.window).start()
+        start_time = time.perf_counter()
+        submitted = produce(ingestor, hot.keys, args.events, args.producers, args.request_size, int(args.seed * 1000))
+        accepted = time.perf_counter() - start_time
+        ingestor.flush()
+        applied = time.perf_counter() - start_time
+        ingestor.stop()
+        stats = ingestor.stats()
+        print(f"Окна по {args.window * 1000:.0f} мс:      {stats['events'] / applied:10.0f} продаж/с до применения, "
+              f"{stats['events'] / accepted:.0f} продаж/с приём")
+        print(f"Окон: {stats['batches']}, строк обновлено: {stats['rows']} "
+              f"(в среднем {stats['events'] / max(stats['batches'], 1):.0f} продаж -> "
+              f"{stats['rows'] / max(stats['batches'], 1):.0f} строк за окно)")
+        print("Продано по базе совпадает с принятым" if hot.sold() == submitted
+              else f"РАСХОЖДЕНИЕ: принято {submitted}, списано {hot.sold()}")
+
+        # Сбой после записи окна в журнал, но до применения: при следующем запуске окно применяется
+        lost = [(department_id, article, 1) for department_id, article in hot.keys[:100]]
+        with open(log_path, "ab") as log:
+            log.write(b"".join(format_sale(*sale) for sale in lost))
+            log.write(b"1,2")  # недописанная строка
+        recovered = SalesIngestor(engine, log_path=log_path, window=args.window).start()
+        recovered.stop()
+        print("Восстановление по журналу: " + ("верно" if hot.sold() == submitted + len(lost) else "РАСХОЖДЕНИЕ"))
+    finally:
+        hot.set_counts([row.count for row in hot.rows])
+        for name in os.listdir(log_dir):
+            os.remove(os.path.join(log_dir, name))
+        os.rmdir(log_dir)
+
+    with engine.connect() as conn:
+        mismatches = check_department_values(conn)
+    print("department_value согласована" if not mismatches else f"department_value: расхождений {len(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
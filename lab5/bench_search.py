@@ -0,0 +1,131 @@
+from sqlalchemy import text, Table, Column, MetaData
+from db import engine
+from bulk_load import copy_table
+from generators import DataGenerator
+from populate_data import indexes, index_extensions
+from search import (build_fts_search, build_substring_search, build_similar_search, build_autocomplete,
+                    search_params, autocomplete_params)
+from models import Product
+import argparse
+import numpy as np
+import time
+
+bench_table = "product_search_bench"
+load_part_size = 200000
+
+
+def load_products(count, seed):
+    """Копия структуры product с count товарами от DataGenerator, загрузка частями через COPY."""
+    generator = DataGenerator(count, seed=seed, vocabulary_size=5000)
+    parts = -(-count // load_part_size)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {bench_table}"))
+        conn.execute(text(f"CREATE UNLOGGED TABLE {bench_table} (LIKE product)"))
+        for part in range(parts):
+            batch = generator.product(part, parts)
+            copy_table(conn, bench_table, list(batch.columns), batch.rows(), report=False)
+        conn.execute(text(f"ALTER TABLE {bench_table} ADD PRIMARY KEY (article)"))
+    with engine.connect() as conn:
+        conn.execute(text(f"ANALYZE {bench_table}"))
+        conn.commit()
+
+
+def create_search_indexes():
+    """Индексы реестра для таблицы product, построенные на копии."""
+    with engine.connect() as conn:
+        for extension in index_extensions:
+            try:
+                conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {extension}"))
+                conn.commit()
+            except Exception as e:
+                print(f"Расширение {extension} недоступно: {e.orig}")
+                conn.rollback()
+        for name, table, definition in indexes:
+            if table != "product":
+                continue
+            start_time = time.perf_counter()
+            try:
+                conn.execute(text(f"CREATE INDEX {name}_bench ON {bench_table} {definition}"))
+                conn.commit()
+                print(f"Индекс {name}_bench создан за {time.perf_counter() - start_time:.2f} секунд")
+            except Exception as e:
+                print(f"Индекс {name}_bench не создан: {e.orig}")
+                conn.rollback()
+        conn.execute(text(f"ANALYZE {bench_table}"))
+        conn.commit()
+
+
+def sample_terms(count):
+    """Слова из названий случайных товаров: целое слово, его середина и начало названия."""
+    with engine.connect() as conn:
+        names = conn.execute(text(f"SELECT name FROM {bench_table} TABLESAMPLE SYSTEM (1) LIMIT :count"),
+                             {"count": count}).scalars().all()
+    words = [name.split()[-1] for name in names]
+    return {
+        "word": words,
+        "substring": [word[1:4] if len(word) > 4 else word for word in words],
+        "prefix": [name[:4] for name in names]
+    }
+
+
+def cases(table, terms, limit):
+    """Режим поиска, оператор, параметры каждого запуска."""
+    return [
+        ("fts", build_fts_search(table), [search_params("fts", word, limit) for word in terms["word"]]),
+        ("substring", build_substring_search(table),
+         [search_params("substring", word, limit) for word in terms["substring"]]),
+        ("similar", build_similar_search(table), [search_params("similar", word, limit) for word in terms["word"]]),
+        ("autocomplete", build_autocomplete(table), [autocomplete_params(prefix, limit) for prefix in terms["prefix"]])
+    ]
+
+
+def measure(statement, runs_params):
+    latencies = []
+    with engine.connect() as conn:
+        try:
+            conn.execute(statement, runs_params[0]).all()  # Прогрев
+        except Exception:
+            conn.rollback()
+            return None
+        for params in runs_params:
+            start_time = time.perf_counter()
+            conn.execute(statement, params).all()
+            latencies.append(time.perf_counter() - start_time)
+    return float(np.percentile(np.array(latencies) * 1000, 50))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск товаров по названию без индексов и с индексами pg_trgm / полнотекстовым")
+    parser.add_argument("--products", type=int, default=2000000, help="число товаров в тестовой таблице")
+    parser.add_argument("--runs", type=int, default=20, help="число разных поисковых запросов на режим")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="не удалять тестовую таблицу")
+    args = parser.parse_args()
+
+    print(f"Загрузка {args.products} товаров в {bench_table}...")
+    start_time = time.perf_counter()
+    load_products(args.products, args.seed)
+    print(f"Загружено за {time.perf_counter() - start_time:.2f} секунд")
+
+    table = Table(bench_table, MetaData(), *[Column(column.name, column.type) for column in Product.__table__.columns])
+    terms = sample_terms(args.runs)
+
+    before = {mode: measure(statement, runs_params) for mode, statement, runs_params in cases(table, terms, args.limit)}
+    create_search_indexes()
+    after = {mode: measure(statement, runs_params) for mode, statement, runs_params in cases(table, terms, args.limit)}
+
+    print(f"{'режим':14} {'без индексов':>14} {'с индексами':>14} {'ускорение':>10}")
+    for mode in before:
+        if before[mode] is None or after[mode] is None:
+            print(f"{mode:14} {'недоступен (нет pg_trgm)':>40}")
+            continue
+        print(f"{mode:14} {before[mode]:11.2f} мс {after[mode]:11.2f} мс {before[mode] / after[mode]:9.1f}x")
+
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE {bench_table}"))
+
+
+if __name__ == "__main__":
+    main()
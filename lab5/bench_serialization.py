@@ -0,0 +1,59 @@
+from sqlalchemy import text
+from db import SessionLocal
+from serialization import dumps_rows, row_columns
+from decimal import Decimal
+import argparse
+import json
+import time
+
+# Результат той же формы, что у запроса 1.1 (строки, целые и Decimal-цены), из generate_series
+rows_sql = """
+SELECT 'Магазин ' || (i % 500) AS store_name,
+       'Отдел ' || (i % 37) AS department_name,
+       i AS article,
+       'Товар "' || i || '"' AS product_name,
+       CASE WHEN i % 2 = 0 THEN 'Элитный' ELSE 'Эконом' END AS product_sort,
+       i % 100 AS quantity,
+       ((i * 7919) % 100000 / 100.0)::numeric(10, 2) AS current_price,
+       ((i % 100) * ((i * 7919) % 100000 / 100.0))::numeric(12, 2) AS total_value
+FROM generate_series(1, :count) AS i
+"""
+
+
+def serializers():
+    return {
+        "str(rows)": lambda rows: str(rows),
+        "json.dumps(dict)": lambda rows: json.dumps([row._asdict() for row in rows], default=str, ensure_ascii=False),
+        "dumps_rows(rows)": lambda rows: dumps_rows(row_columns(rows), rows, 0.0, "rows"),
+        "dumps_rows(columns)": lambda rows: dumps_rows(row_columns(rows), rows, 0.0, "columns")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сериализация результата запроса: str(rows), json с dict и serialization")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    rows = session.execute(text(rows_sql), {"count": args.rows}).all()
+    session.close()
+
+    print(f"{'способ':22} {'время':>12} {'размер':>12}")
+    for name, serialize in serializers().items():
+        times = []
+        for i in range(args.runs):
+            start_time = time.perf_counter()
+            payload = serialize(rows)
+            times.append(time.perf_counter() - start_time)
+        size = len(payload.encode("utf-8"))
+        print(f"{name:22} {min(times) * 1000:9.1f} мс {size / 1024:9.0f} КБ")
+
+    # Decimal-цены должны читаться обратно без потери точности
+    decoded = json.loads(dumps_rows(row_columns(rows), rows), parse_float=Decimal)
+    assert [tuple(row) for row in decoded["rows"]] == [tuple(row) for row in rows]
+    print("Проверка: значения после json.loads(parse_float=Decimal) совпадают с исходными")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+from db import engine, SessionLocal
+from queries import *
+import argparse
+import time
+
+# Сборщик выражения, готовый оператор и параметры для каждого запроса
+cases = [
+    ("query_1_1_store_products", build_store_products, store_products_statement, {"store_id": 1, "limit": 100}),
+    ("query_1_2_base_products", build_base_products, base_products_statement, {"base_id": 2, "limit": 100}),
+    ("query_2_1_orderable_products", build_orderable_products, orderable_products_statement, {"store_id": 1, "limit": 100}),
+    ("query_2_2_extended_orderable_products", build_extended_orderable_products,
+     extended_orderable_products_statement, {"store_id": 1, "limit": 100}),
+    ("query_3_department_products", build_department_products, department_products_statement, {"department_id": 1, "limit": 100}),
+    ("query_4_department_managers", build_department_managers, department_managers_statement, {"store_id": 1, "limit": 100}),
+    ("query_5_department_values", build_department_values, department_values_statement, {"limit": 100}),
+    ("query_6_product_search", build_search_products, search_products_statement, {"pattern": "%Молоко%", "limit": 100})
+]
+
+
+def per_call_us(action, runs):
+    action()  # Прогрев
+    start_time = time.perf_counter()
+    for i in range(runs):
+        action()
+    return (time.perf_counter() - start_time) / runs * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы Python на вызов запроса: сборка заново и готовый оператор")
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--no-db", action="store_true", help="только сборка и компиляция, без обращения к базе")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    print(f"{'запрос':40} {'построение':>16} {'с компиляцией':>18}", end="")
+    print("" if args.no_db else f" {'выполнение заново':>18} {'выполнение готового':>20}")
+
+    for name, build, statement, params in cases:
+        # Без базы: только построение выражения и построение с компиляцией SQL, которую
+        # готовый оператор при повторных вызовах берёт из кэша компиляции движка
+        built = per_call_us(build, args.runs)
+        compiled = per_call_us(lambda: build().compile(dialect=engine.dialect), args.runs)
+        print(f"{name:40} {built:13.1f} мкс {compiled:15.1f} мкс", end="")
+
+        if args.no_db:
+            print()
+            continue
+
+        # С базой: выражение строится при каждом вызове против одного и того же оператора
+        execute_rebuilt = per_call_us(lambda: session.execute(build(), params).all(), args.runs)
+        execute_prepared = per_call_us(lambda: session.execute(statement, params).all(), args.runs)
+        print(f" {execute_rebuilt:15.1f} мкс {execute_prepared:17.1f} мкс")
+
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
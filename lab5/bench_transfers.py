@@ -0,0 +1,215 @@
+from sqlalchemy import text, create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from db import engine
+from transfers import transfer_stock, InsufficientStockError
+from department_values import check_department_values
+import argparse
+import random
+import threading
+import numpy as np
+import time
+
+hot_stock = 10 ** 7
+
+# Наивное перемещение: строки блокируются в порядке поступления, по одному обращению на каждую
+naive_lock_sql = text("SELECT count FROM warehouse_product WHERE trading_base_id = :trading_base_id AND article = :article FOR UPDATE")
+naive_take_sql = text("UPDATE warehouse_product SET count = count - :quantity "
+                      "WHERE trading_base_id = :trading_base_id AND article = :article")
+naive_give_sql = text("INSERT INTO department_product (department_id, article, count) VALUES (:department_id, :article, :quantity) "
+                      "ON CONFLICT (department_id, article) DO UPDATE SET count = department_product.count + EXCLUDED.count")
+
+lock_waits_sql = text("SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND wait_event_type = 'Lock'")
+deadlocks_sql = text("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")
+
+
+def naive_transfer(session, transfers):
+    for trading_base_id, department_id, article, quantity in transfers:
+        params = {"trading_base_id": trading_base_id, "department_id": department_id, "article": article, "quantity": quantity}
+        available = session.execute(naive_lock_sql, params).scalar()
+        if available is None or available < quantity:
+            raise InsufficientStockError([])
+        session.execute(naive_take_sql, params)
+        session.execute(naive_give_sql, params)
+
+
+class Hotspot:
+    """Горячие строки warehouse_product и отделы, между которыми идут перемещения; исходное состояние для отката."""
+
+    def __init__(self, hot, departments, seed):
+        with engine.begin() as conn:
+            conn.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+            self.rows = conn.execute(text(
+                "SELECT trading_base_id, article, count FROM warehouse_product ORDER BY random() LIMIT :hot"
+            ), {"hot": hot}).all()
+            self.departments = conn.execute(text(
+                "SELECT department_id FROM department ORDER BY department_id LIMIT :departments"
+            ), {"departments": departments}).scalars().all()
+            self.department_rows = conn.execute(text(
+                "SELECT department_id, article, count FROM department_product "
+                "WHERE department_id = ANY(:departments) AND article = ANY(:articles)"
+            ), {"departments": self.departments, "articles": self.articles}).all()
+
+    @property
+    def articles(self):
+        return [row.article for row in self.rows]
+
+    def prepare(self):
+        with engine.begin() as conn:
+            self._set_counts(conn, [hot_stock] * len(self.rows))
+
+    def total(self):
+        """Сумма остатков горячих товаров на базах и в отделах - перемещения её не меняют."""
+        with engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT (SELECT SUM(count) FROM warehouse_product "
+                "        WHERE (trading_base_id, article) IN (SELECT * FROM unnest(CAST(:bases AS integer[]), CAST(:articles AS integer[])))) "
+                "     + (SELECT COALESCE(SUM(count), 0) FROM department_product "
+                "        WHERE department_id = ANY(:departments) AND article = ANY(:articles))"
+            ), {"bases": [row.trading_base_id for row in self.rows], "articles": self.articles,
+                "departments": self.departments}).scalar()
+
+    def restore(self):
+        with engine.begin() as conn:
+            self._set_counts(conn, [row.count for row in self.rows])
+            conn.execute(text(
+                "DELETE FROM department_product WHERE department_id = ANY(:departments) AND article = ANY(:articles)"
+            ), {"departments": self.departments, "articles": self.articles})
+            if self.department_rows:
+                department_ids, articles, counts = (list(column) for column in zip(*self.department_rows))
+                conn.execute(text(
+                    "INSERT INTO department_product (department_id, article, count) "
+                    "SELECT * FROM unnest(CAST(:department_ids AS integer[]), CAST(:articles AS integer[]), CAST(:counts AS integer[]))"
+                ), {"department_ids": department_ids, "articles": articles, "counts": counts})
+
+    def _set_counts(self, conn, counts):
+        conn.execute(text(
+            "UPDATE warehouse_product wp SET count = c.count "
+            "FROM unnest(CAST(:bases AS integer[]), CAST(:articles AS integer[]), CAST(:counts AS integer[])) "
+            "AS c(trading_base_id, article, count) "
+            "WHERE wp.trading_base_id = c.trading_base_id AND wp.article = c.article"
+        ), {"bases": [row.trading_base_id for row in self.rows], "articles": self.articles, "counts": counts})
+
+
+class LockWaitSampler(threading.Thread):
+    """Раз в interval секунд считает сеансы, ждущие блокировку; сумма даёт оценку общего времени ожидания."""
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.wait_seconds = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        with engine.connect() as conn:
+            last = time.perf_counter()
+            while not self._stop_event.wait(self.interval):
+                waiting = conn.execute(lock_waits_sql).scalar()
+                conn.rollback()
+                now = time.perf_counter()
+                self.wait_seconds += waiting * (now - last)
+                last = now
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_workers(hotspot, transfer, workers, batches, batch_size, seed):
+    latencies, errors = [], {"deadlock": 0, "insufficient": 0}
+    lock = threading.Lock()
+    # Своё соединение каждому исполнителю: общий пул приложения меньше числа потоков
+    workers_engine = create_engine(engine.url, pool_size=workers, max_overflow=0)
+    session_factory = sessionmaker(bind=workers_engine)
+
+    def worker(number):
+        rng = random.Random(seed + number)
+        session = session_factory()
+        own_latencies = []
+        try:
+            for i in range(batches):
+                transfers = []
+                for j in range(batch_size):
+                    row = rng.choice(hotspot.rows)
+                    transfers.append((row.trading_base_id, rng.choice(hotspot.departments), row.article, rng.randint(1, 3)))
+                start_time = time.perf_counter()
+                try:
+                    transfer(session, transfers)
+                    session.commit()
+                    own_latencies.append(time.perf_counter() - start_time)
+                except OperationalError as e:
+                    session.rollback()
+                    if "deadlock" not in str(e.orig):
+                        raise
+                    with lock:
+                        errors["deadlock"] += 1
+                except InsufficientStockError:
+                    session.rollback()
+                    with lock:
+                        errors["insufficient"] += 1
+        finally:
+            session.close()
+        with lock:
+            latencies.extend(own_latencies)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(workers)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    workers_engine.dispose()
+    return elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельные перемещения товара с баз в отделы по горячим товарам")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--batches", type=int, default=100, help="транзакций на одного исполнителя")
+    parser.add_argument("--batch-size", type=int, default=5, help="перемещений в одной транзакции")
+    parser.add_argument("--hot", type=int, default=10, help="число горячих строк warehouse_product")
+    parser.add_argument("--departments", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", choices=["batched", "naive"], default=["batched", "naive"])
+    parser.add_argument("--seed", type=float, default=0.42)
+    args = parser.parse_args()
+
+    modes = {"batched": transfer_stock, "naive": naive_transfer}
+    hotspot = Hotspot(args.hot, args.departments, args.seed)
+    print(f"Горячих строк: {len(hotspot.rows)}, отделов: {len(hotspot.departments)}, "
+          f"перемещений в транзакции: {args.batch_size}")
+    print(f"{'режим':8} {'потоков':>8} {'транз/с':>9} {'перем/с':>9} {'p50':>9} {'p95':>9} "
+          f"{'ожидание блокировок':>20} {'deadlock':>9} {'баланс':>7}")
+
+    try:
+        hotspot.prepare()
+        for mode in args.modes:
+            for workers in args.workers:
+                before_total = hotspot.total()
+                with engine.connect() as conn:
+                    deadlocks_before = conn.execute(deadlocks_sql).scalar()
+                sampler = LockWaitSampler()
+                sampler.start()
+                elapsed, latencies, errors = run_workers(
+                    hotspot, modes[mode], workers, args.batches, args.batch_size, int(args.seed * 1000)
+                )
+                sampler.stop()
+                with engine.connect() as conn:
+                    deadlocks = conn.execute(deadlocks_sql).scalar() - deadlocks_before
+
+                latencies = np.array(latencies or [0]) * 1000
+                committed = len(latencies)
+                balanced = "да" if hotspot.total() == before_total else "НЕТ"
+                print(f"{mode:8} {workers:8} {committed / elapsed:9.1f} {committed * args.batch_size / elapsed:9.1f} "
+                      f"{np.percentile(latencies, 50):6.2f} мс {np.percentile(latencies, 95):6.2f} мс "
+                      f"{sampler.wait_seconds:16.2f} с {deadlocks:9} {balanced:>7}")
+    finally:
+        hotspot.restore()
+
+    with engine.connect() as conn:
+        mismatches = check_department_values(conn)
+    print("department_value согласована" if not mismatches else f"department_value: расхождений {len(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+from sqlalchemy import text
+from models import Base
+from itertools import islice
+import time
+
+# Размер блока, которым psycopg2 читает данные при COPY
+COPY_BUFFER_SIZE = 1 << 20
+
+# Сколько строк форматируется за одно обращение к генератору
+COPY_BATCH_ROWS = 10000
+
+# Экранирование спецсимволов текстового формата COPY
+_COPY_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r"
+})
+
+
+def format_copy_value(value):
+    if value is None:
+        return "\\N"
+    if type(value) is int:
+        return str(value)
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def format_copy_row(row):
+    return "\t".join(map(format_copy_value, row)) + "\n"
+
+
+class CopyStream:
+    """Файлоподобный объект для COPY ... FROM STDIN: строки форматируются по мере чтения."""
+
+    def __init__(self, rows, batch_rows=COPY_BATCH_ROWS):
+        self._rows = iter(rows)
+        self._batch_rows = batch_rows
+        self._buffer = ""
+        self._pos = 0
+        self.count = 0
+
+    def _fill(self):
+        batch = list(islice(self._rows, self._batch_rows))
+        if not batch:
+            return False
+        self.count += len(batch)
+        self._buffer = self._buffer[self._pos:] + "".join(map(format_copy_row, batch))
+        self._pos = 0
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while self._fill():
+                pass
+            size = len(self._buffer) - self._pos
+        while len(self._buffer) - self._pos < size and self._fill():
+            pass
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def readline(self, size=-1):
+        end = self._buffer.find("\n", self._pos)
+        while end < 0 and self._fill():
+            end = self._buffer.find("\n", self._pos)
+        if end < 0:
+            return self.read(size)
+        return self.read(end - self._pos + 1)
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Загружает строки (кортежи) в таблицу через COPY ... FROM STDIN, возвращает их количество."""
+    stream = CopyStream(rows)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN",
+        stream,
+        size=COPY_BUFFER_SIZE
+    )
+    return stream.count
+
+
+def copy_table(connection, table, columns, rows, report=True):
+    """COPY в рамках соединения SQLAlchemy с замером скорости загрузки."""
+    start_time = time.perf_counter()
+    with connection.connection.cursor() as cursor:
+        count = copy_rows(cursor, table, columns, rows)
+    execution_time = time.perf_counter() - start_time
+
+    if report:
+        print_copy_stats(table, count, execution_time)
+    return count, execution_time
+
+
+def copy_batch(connection, batch, report=True):
+    """COPY колоночного пакета генератора (generators.ColumnBatch)."""
+    return copy_table(connection, batch.table, list(batch.columns), batch.rows(), report)
+
+
+def print_copy_stats(table, count, execution_time):
+    rate = count / execution_time if execution_time > 0 else 0
+    print(f"{table:20} {count:10} строк за {execution_time:8.2f} секунд ({rate:,.0f} строк/с)")
+
+
+def max_id(connection, table, column):
+    return connection.execute(text(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")).scalar()
+
+
+def reset_sequences(connection):
+    """После COPY с явными ключами сдвигает serial-последовательности за максимальный ключ."""
+    for table in Base.metadata.sorted_tables:
+        pk = list(table.primary_key.columns)
+        if len(pk) != 1:
+            continue
+        column = pk[0].name
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column}'), "
+            f"COALESCE(MAX({column}), 0) + 1, false) FROM {table.name}"
+        ))
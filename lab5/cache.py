@@ -0,0 +1,289 @@
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, object_mapper
+from collections import OrderedDict
+from time import monotonic
+import functools
+import inspect
+import os
+import select
+import threading
+import time
+
+# Кэш результатов запросов в памяти процесса: LRU с ограничением времени жизни записи.
+# Запись привязана к таблицам, из которых читает запрос, и удаляется, когда сессия
+# SQLAlchemy фиксирует изменения этих таблиц.
+#
+# Другие процессы (загрузчики, другие экземпляры приложения) узнают об изменениях через
+# NOTIFY query_cache: сессии и notify_changed отправляют имена изменённых таблиц в той же
+# транзакции, PostgreSQL доставляет уведомление только после COMMIT. Поток
+# listen_for_invalidations в приложении получает их и удаляет записи. Изменения, о которых
+# уведомления не было (psql, SQL в обход этих функций), устаревают только по TTL.
+cache_size = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+cache_ttl = float(os.getenv('QUERY_CACHE_TTL', '30'))
+
+
+class QueryCache:
+    def __init__(self, maxsize=cache_size, ttl=cache_ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = maxsize > 0
+        self._entries = OrderedDict()  # ключ -> (срок действия, таблицы, значение)
+        self._keys_by_table = {}
+        # Поколения таблиц растут при каждой инвалидации: результат запроса, во время которого
+        # таблица сменила поколение, мог быть прочитан до изменения и в кэш не кладётся
+        self._generations = {}
+        self._generation_all = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, tables, value = entry
+            if expires < monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def generations(self, tables):
+        """Снимок поколений таблиц tables - до выполнения запроса, для put."""
+        with self._lock:
+            return self._generation_all, tuple(self._generations.get(table, 0) for table in sorted(tables))
+
+    def put(self, key, tables, value, ttl=None, generations=None):
+        """generations - снимок generations(tables) до запроса: если с тех пор таблицы менялись, запись не сохраняется."""
+        with self._lock:
+            if generations is not None and generations != (
+                self._generation_all, tuple(self._generations.get(table, 0) for table in sorted(tables))
+            ):
+                self.stale_puts += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (monotonic() + (ttl or self.ttl), tables, value)
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        expires, tables, value = self._entries.pop(key)
+        for table in tables:
+            keys = self._keys_by_table.get(table)
+            if keys:
+                keys.discard(key)
+
+    def invalidate_tables(self, tables):
+        """Удаляет записи запросов, читающих любую из таблиц tables."""
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in list(self._keys_by_table.pop(table, ())):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def invalidate_all(self):
+        with self._lock:
+            self._generation_all += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_table.clear()
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / requests if requests else 0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts
+            }
+
+
+query_cache = QueryCache()
+
+
+notify_channel = "query_cache"
+
+notify_sql = text(f"SELECT pg_notify('{notify_channel}', :tables)")
+
+
+def invalidate_tables(*tables):
+    """Удаляет записи по таблицам tables только в кэше этого процесса."""
+    query_cache.invalidate_tables(tables)
+
+
+def invalidate_all():
+    query_cache.invalidate_all()
+
+
+def notify_changed(connection, *tables):
+    """
+    Уведомляет все процессы с listen_for_invalidations об изменении таблиц tables (без tables - всех).
+    Выполняется в транзакции изменения: при откате уведомление не отправляется.
+    """
+    connection.execute(notify_sql, {"tables": ",".join(sorted(tables)) or "*"})
+
+
+def _apply_notification(payload):
+    if payload == "*":
+        query_cache.invalidate_all()
+    else:
+        query_cache.invalidate_tables(payload.split(","))
+
+
+def _listen(engine, reconnect_delay):
+    while True:
+        connection = None
+        try:
+            cargs, cparams = engine.dialect.create_connect_args(engine.url)
+            connection = engine.dialect.connect(*cargs, **cparams)
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {notify_channel}")
+            # Пока соединения не было, уведомления могли быть пропущены
+            query_cache.invalidate_all()
+            while True:
+                select.select([connection], [], [], 60)
+                connection.poll()
+                while connection.notifies:
+                    _apply_notification(connection.notifies.pop(0).payload)
+        except Exception as e:
+            print(f"Ошибка получения уведомлений кэша: {e}")
+            query_cache.invalidate_all()
+            time.sleep(reconnect_delay)
+        finally:
+            if connection is not None:
+                connection.close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def listen_for_invalidations(engine, reconnect_delay=1):
+    """Запускает (один раз на процесс) поток, который удаляет записи кэша по NOTIFY query_cache."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(
+                target=_listen, args=(engine, reconnect_delay), name="query-cache-listener", daemon=True
+            )
+            _listener.start()
+    return _listener
+
+
+def cached(tables, ttl=None):
+    """
+    Кэширует результат функции запроса по имени функции и значениям аргументов
+    (кроме session и show_output). tables - таблицы, изменение которых делает результат устаревшим.
+    """
+    tables = frozenset(tables)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not query_cache.enabled:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__name__,) + tuple(
+                (name, value) for name, value in bound.arguments.items() if name not in ("session", "show_output")
+            )
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            if _has_pending_changes(bound.arguments.get("session")):
+                # Сессия видит свои незафиксированные изменения: её результат не для других,
+                # а записи кэша - не для неё
+                return func(*args, **kwargs)
+            entry = query_cache.get(key)
+            if entry is not None:
+                result = entry[2]
+                print(f"Запрос {func.__name__} взят из кэша, обработано {len(result[0])} записей")
+                return result
+            generations = query_cache.generations(tables)
+            result = func(*args, **kwargs)
+            query_cache.put(key, tables, result, ttl, generations)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def _has_pending_changes(session):
+    if not isinstance(session, Session):
+        return False
+    return bool(session.info.get("cache_changed_tables") or session.new or session.dirty or session.deleted)
+
+
+# Таблицы, изменённые сессией, копятся до фиксации транзакции: до COMMIT другие
+# соединения видят старые данные, и удалённая раньше запись снова попала бы в кэш
+# Для других процессов таблицы сразу уходят в NOTIFY той же транзакции
+def _collect_changed_tables(session, tables):
+    changed = session.info.setdefault("cache_changed_tables", set())
+    new = set(tables) - changed
+    if new:
+        changed.update(new)
+        notify_changed(session.connection(), *new)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    tables = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tables.update(table.name for table in object_mapper(obj).tables)
+    _collect_changed_tables(session, tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state):
+    # Массовые UPDATE/DELETE/INSERT через session.execute(update(...)) минуют flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None and hasattr(table, "name"):
+            _collect_changed_tables(orm_execute_state.session, {table.name})
+
+
+def mark_changed(session, *tables):
+    """Отмечает таблицы, изменённые текстовым SQL в обход ORM: записи кэша по ним удалятся при COMMIT сессии."""
+    _collect_changed_tables(session, tables)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_tables(session):
+    changed = session.info.pop("cache_changed_tables", None)
+    if changed:
+        query_cache.invalidate_tables(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_tables(session):
+    # Данные не менялись, но записи, положенные во время транзакции, могли быть прочитаны с её изменениями
+    changed = session.info.pop("cache_changed_tables", None)
+    if changed:
+        query_cache.invalidate_tables(changed)
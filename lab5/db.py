@@ -1,5 +1,8 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
+from instrumentation import histogram
+from time import perf_counter_ns
 import os
 
 db_host = os.getenv('DB_HOST', 'localhost')
@@ -8,11 +11,61 @@ db_name = os.getenv('DB_NAME', 'university_store_database')
 db_user = os.getenv('DB_USER', 'postgres')
 db_password = os.getenv('DB_PASSWORD', 'postgres')
 
+# Настройки пула соединений (по умолчанию - значения SQLAlchemy)
+pool_size = int(os.getenv('DB_POOL_SIZE', '5'))
+pool_max_overflow = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+pool_pre_ping = os.getenv('DB_POOL_PRE_PING', '0').lower() in ('1', 'true', 'yes')
+pool_recycle = int(os.getenv('DB_POOL_RECYCLE', '-1'))
+pool_timeout = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool, который пишет время получения соединения в гистограмму ("pool", "checkout_wait")."""
+
+    def connect(self):
+        # Публичный Pool.connect: ожидание свободного соединения, открытие нового, если пул
+        # ещё не заполнен, и события checkout (pre_ping). Событие checkout само по себе
+        # наступает после ожидания и его начала не знает, поэтому время меряется здесь
+        start = perf_counter_ns()
+        try:
+            return super().connect()
+        finally:
+            histogram("pool", "checkout_wait").observe(perf_counter_ns() - start)
+
+
 # Создание подключения к PostgreSQL
 database_url = f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
 engine = create_engine(
     database_url,
     echo=False,
+    poolclass=TimedQueuePool,
+    pool_size=pool_size,
+    max_overflow=pool_max_overflow,
+    pool_pre_ping=pool_pre_ping,
+    pool_recycle=pool_recycle,
+    pool_timeout=pool_timeout,
 )
     
 SessionLocal = sessionmaker(bind=engine)
+
+# Сессия текущего потока для обработчиков Flask, закрывается в teardown_appcontext
+Session = scoped_session(SessionLocal)
+
+
+def pool_status(bind=engine):
+    """
+    Заполненность пула соединений движка bind. При DB_MAX_OVERFLOW < 0 пул не ограничен:
+    saturation - None, unbounded - True.
+    """
+    pool = bind.pool
+    unbounded = pool_max_overflow < 0
+    capacity = pool.size() + pool_max_overflow
+    return {
+        "size": pool.size(),
+        "max_overflow": pool_max_overflow,
+        "unbounded": unbounded,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "saturation": None if unbounded else (pool.checkedout() / capacity if capacity else 0)
+    }
@@ -0,0 +1,251 @@
+from sqlalchemy import text
+from models import Base
+from bulk_load import reset_sequences, COPY_BATCH_ROWS, COPY_BUFFER_SIZE
+from department_values import refresh_department_values
+import argparse
+import io
+import os
+import time
+
+# Синхронизация с внешним снимком без TRUNCATE: каждая таблица снимка (<таблица>.csv с
+# заголовком или <таблица>.parquet) загружается COPY во временную таблицу и сравнивается с
+# текущими данными по первичному ключу. Применяются только различия, в одной транзакции:
+#   вставки и изменения - от родительских таблиц к дочерним (порядок внешних ключей),
+#   удаления - от дочерних к родительским.
+# API продолжает читать старые данные до COMMIT. Таблицы без файла в снимке не меняются;
+# department_value в снимок не входит - её поддерживают триггеры, а если снимок переносит
+# отделы в другие магазины или меняет класс магазинов (этого триггеры не отслеживают),
+# она пересчитывается в той же транзакции.
+
+snapshot_formats = ("csv", "parquet")
+derived_tables = {"department_value"}
+# Столбцы, изменение которых меняет department_value в обход триггеров
+department_value_columns = {"store": "store_class_id", "department": "store_id"}
+
+# Строки снимка, которых нет в таблице или которые отличаются хотя бы одним столбцом
+upsert_sql = """
+WITH applied AS (
+    INSERT INTO {table} ({columns})
+    SELECT {staged_columns}
+    FROM {staging} s
+    LEFT JOIN {table} t ON {key_match}
+    WHERE t.{first_key} IS NULL OR ({current_values}) IS DISTINCT FROM ({staged_values})
+    ON CONFLICT ({keys}) DO UPDATE SET {assignments}
+    RETURNING xmax = 0 AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM applied
+"""
+
+moved_sql = """
+SELECT EXISTS (SELECT 1 FROM {staging} s JOIN {table} t ON {key_match} WHERE t.{column} IS DISTINCT FROM s.{column})
+"""
+
+delete_sql = """
+DELETE FROM {table} t
+WHERE NOT EXISTS (SELECT 1 FROM {staging} s WHERE {key_match})
+"""
+
+
+def snapshot_file(directory, table):
+    for format in snapshot_formats:
+        path = os.path.join(directory, f"{table}.{format}")
+        if os.path.exists(path):
+            return path, format
+    return None, None
+
+
+class ParquetCsvStream:
+    """
+    Файлоподобный объект для COPY ... FROM STDIN WITH (FORMAT csv): Parquet читается группами
+    строк (iter_batches), в памяти одновременно CSV только одной группы.
+    """
+
+    def __init__(self, parquet_file, batch_rows=COPY_BATCH_ROWS):
+        import pyarrow.csv as arrow_csv
+        self._arrow_csv = arrow_csv
+        self._file = parquet_file
+        self._batches = parquet_file.iter_batches(batch_size=batch_rows)
+        self._buffer = b""
+        self._pos = 0
+
+    def _fill(self):
+        batch = next(self._batches, None)
+        if batch is None:
+            return False
+        chunk = io.BytesIO()
+        self._arrow_csv.write_csv(batch, chunk, self._arrow_csv.WriteOptions(include_header=False))
+        self._buffer = self._buffer[self._pos:] + chunk.getvalue()
+        self._pos = 0
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while self._fill():
+                pass
+            size = len(self._buffer) - self._pos
+        while len(self._buffer) - self._pos < size and self._fill():
+            pass
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def csv_chunks(path, format):
+    """Файл снимка в виде CSV: заголовок и поток байтов для COPY."""
+    if format == "csv":
+        file = open(path, "rb")
+        header = file.readline().decode().strip().split(",")
+        return header, file
+    try:
+        import pyarrow.parquet as parquet
+    except ImportError:
+        raise RuntimeError(f"Для снимка {path} нужен пакет pyarrow")
+    # Без pre_buffer iter_batches не держит в памяти уже прочитанные группы строк
+    parquet_file = parquet.ParquetFile(path, pre_buffer=False, buffer_size=COPY_BUFFER_SIZE)
+    return parquet_file.schema_arrow.names, ParquetCsvStream(parquet_file)
+
+
+def stage_table(connection, table, path, format):
+    """Загружает файл снимка во временную таблицу со структурой table, возвращает её имя и столбцы."""
+    staging = f"{table.name}_snapshot"
+    header, stream = csv_chunks(path, format)
+    unknown = set(header) - set(table.columns.keys())
+    if unknown:
+        raise ValueError(f"{path}: неизвестные столбцы {sorted(unknown)}")
+
+    connection.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+    connection.execute(text(f"CREATE TEMP TABLE {staging} (LIKE {table.name}) ON COMMIT DROP"))
+    with stream, connection.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {staging} ({', '.join(header)}) FROM STDIN WITH (FORMAT csv)", stream,
+                           size=COPY_BUFFER_SIZE)
+    connection.execute(text(f"ANALYZE {staging}"))
+    return staging, header
+
+
+def upsert_changes(connection, table, staging, columns):
+    keys = [column.name for column in table.primary_key.columns]
+    values = [column for column in columns if column not in keys]
+    key_match = " AND ".join(f"t.{key} = s.{key}" for key in keys)
+    sql = upsert_sql.format(
+        table=table.name,
+        staging=staging,
+        columns=", ".join(columns),
+        staged_columns=", ".join(f"s.{column}" for column in columns),
+        key_match=key_match,
+        first_key=keys[0],
+        keys=", ".join(keys),
+        current_values="ROW(" + ", ".join(f"t.{column}" for column in values) + ")" if values else "NULL",
+        staged_values="ROW(" + ", ".join(f"s.{column}" for column in values) + ")" if values else "NULL",
+        assignments=", ".join(f"{column} = EXCLUDED.{column}" for column in values) or f"{keys[0]} = EXCLUDED.{keys[0]}"
+    )
+    return connection.execute(text(sql)).one()
+
+
+def changes_department_values(connection, table, staging, columns):
+    """Меняет ли снимок столбец table, изменение которого триггеры department_value не отслеживают."""
+    column = department_value_columns.get(table.name)
+    if column not in columns:
+        return False
+    keys = [key.name for key in table.primary_key.columns]
+    key_match = " AND ".join(f"t.{key} = s.{key}" for key in keys)
+    return connection.execute(text(moved_sql.format(
+        table=table.name, staging=staging, key_match=key_match, column=column
+    ))).scalar()
+
+
+def delete_missing(connection, table, staging):
+    keys = [column.name for column in table.primary_key.columns]
+    key_match = " AND ".join(f"t.{key} = s.{key}" for key in keys)
+    return connection.execute(text(delete_sql.format(table=table.name, staging=staging, key_match=key_match))).rowcount
+
+
+def sync_snapshot(connection, directory, delete=True):
+    """
+    Приводит таблицы к снимку из directory в транзакции connection.
+    delete=False только добавляет и изменяет строки. Возвращает {таблица: (вставлено, изменено, удалено)}.
+    """
+    tables = [
+        table for table in Base.metadata.sorted_tables
+        if table.name not in derived_tables and snapshot_file(directory, table.name)[0]
+    ]
+    staged = {}
+    for table in tables:
+        path, format = snapshot_file(directory, table.name)
+        staged[table.name] = stage_table(connection, table, path, format)
+
+    result = {}
+    refresh = False
+    for table in tables:
+        start_time = time.perf_counter()
+        staging, columns = staged[table.name]
+        refresh = changes_department_values(connection, table, staging, columns) or refresh
+        inserted, updated = upsert_changes(connection, table, staging, columns)
+        result[table.name] = [inserted, updated, 0, time.perf_counter() - start_time]
+
+    if delete:
+        for table in reversed(tables):
+            start_time = time.perf_counter()
+            staging, columns = staged[table.name]
+            result[table.name][2] = delete_missing(connection, table, staging)
+            result[table.name][3] += time.perf_counter() - start_time
+
+    if refresh:
+        refresh_department_values(connection)
+    reset_sequences(connection)
+    return result
+
+
+def export_snapshot(connection, directory, tables=None):
+    """Выгружает таблицы в directory как <таблица>.csv (в порядке первичного ключа) - исходный снимок для синхронизации."""
+    os.makedirs(directory, exist_ok=True)
+    for table in Base.metadata.sorted_tables:
+        if table.name in derived_tables or (tables and table.name not in tables):
+            continue
+        keys = ", ".join(column.name for column in table.primary_key.columns)
+        with open(os.path.join(directory, f"{table.name}.csv"), "wb") as file, \
+                connection.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY (SELECT * FROM {table.name} ORDER BY {keys}) TO STDOUT WITH (FORMAT csv, HEADER true)", file
+            )
+
+
+def print_result(result, execution_time):
+    print(f"{'таблица':20} {'вставлено':>10} {'изменено':>10} {'удалено':>10} {'время':>10}")
+    for table, (inserted, updated, deleted, table_time) in result.items():
+        print(f"{table:20} {inserted:10} {updated:10} {deleted:10} {table_time:8.2f} с")
+    print(f"Снимок применён за {execution_time:.2f} секунд")
+
+
+def main():
+    from db import engine
+    from cache import notify_changed
+
+    parser = argparse.ArgumentParser(description="Синхронизация таблиц с каталогом снимка без TRUNCATE")
+    parser.add_argument("action", choices=["apply", "export"])
+    parser.add_argument("directory")
+    parser.add_argument("--no-delete", action="store_true", help="не удалять строки, которых нет в снимке")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    with engine.begin() as conn:
+        if args.action == "export":
+            export_snapshot(conn, args.directory)
+            print(f"Снимок выгружен в {args.directory} за {time.perf_counter() - start_time:.2f} секунд")
+            return
+        result = sync_snapshot(conn, args.directory, delete=not args.no_delete)
+        # Кэш запросов приложения очищается после COMMIT по уведомлению
+        notify_changed(conn)
+    print_result(result, time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    main()
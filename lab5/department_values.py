@@ -0,0 +1,184 @@
+from sqlalchemy import func, select, text, and_, insert, delete
+from models import DepartmentValue, DepartmentProduct, Department, Store, ProductPrice
+import argparse
+import sys
+
+# department_value хранит по каждому отделу сумму count * price его товаров и число строк
+# department_product, у которых есть цена для класса магазина. Таблица поддерживается
+# триггерами уровня оператора с таблицами переходов: один INSERT/UPDATE/DELETE/COPY
+# department_product или product_price пересчитывает только затронутые отделы одним запросом.
+#
+# Триггеры не отслеживают перенос отдела в другой магазин и смену класса магазина, а две
+# одновременные транзакции, добавляющие товар в отдел и цену на этот же товар, не видят
+# изменений друг друга. Такие расхождения находит check_department_values, исправляет
+# refresh_department_values (выполняется и после параллельной загрузки).
+
+# Строки department_value обновляются в порядке department_id: параллельные транзакции,
+# меняющие одни и те же отделы, блокируют их в одном порядке и не попадают во взаимоблокировку.
+
+# Изменённые строки department_product: (department_id, article, count, sign)
+department_product_changes = {
+    "INSERT": "SELECT department_id, article, count, 1 AS sign FROM new_rows",
+    "DELETE": "SELECT department_id, article, count, -1 AS sign FROM old_rows",
+    "UPDATE": "SELECT department_id, article, count, 1 AS sign FROM new_rows "
+              "UNION ALL SELECT department_id, article, count, -1 AS sign FROM old_rows"
+}
+
+# Изменённые строки product_price: (store_class_id, article, price, sign)
+product_price_changes = {
+    "INSERT": "SELECT store_class_id, article, price, 1 AS sign FROM new_rows",
+    "DELETE": "SELECT store_class_id, article, price, -1 AS sign FROM old_rows",
+    "UPDATE": "SELECT store_class_id, article, price, 1 AS sign FROM new_rows "
+              "UNION ALL SELECT store_class_id, article, price, -1 AS sign FROM old_rows"
+}
+
+apply_delta_sql = """
+INSERT INTO department_value (department_id, total_value, row_count)
+{delta}
+ON CONFLICT (department_id) DO UPDATE SET
+    total_value = department_value.total_value + EXCLUDED.total_value,
+    row_count = department_value.row_count + EXCLUDED.row_count
+"""
+
+department_product_delta_sql = """
+SELECT c.department_id, COALESCE(SUM(c.sign * c.count * pp.price), 0), SUM(c.sign)
+FROM ({changes}) AS c
+JOIN department d ON d.department_id = c.department_id
+JOIN store s ON s.store_id = d.store_id
+JOIN product_price pp ON pp.store_class_id = s.store_class_id AND pp.article = c.article
+GROUP BY c.department_id
+ORDER BY c.department_id
+"""
+
+product_price_delta_sql = """
+SELECT dp.department_id, COALESCE(SUM(c.sign * dp.count * c.price), 0), SUM(c.sign)
+FROM ({changes}) AS c
+JOIN store s ON s.store_class_id = c.store_class_id
+JOIN department d ON d.store_id = s.store_id
+JOIN department_product dp ON dp.department_id = d.department_id AND dp.article = c.article
+GROUP BY dp.department_id
+ORDER BY dp.department_id
+"""
+
+# Таблица, шаблон пересчёта и изменённые строки для каждого события
+trigger_sources = {
+    "department_product": (department_product_delta_sql, department_product_changes),
+    "product_price": (product_price_delta_sql, product_price_changes)
+}
+
+transition_tables = {
+    "INSERT": "REFERENCING NEW TABLE AS new_rows",
+    "DELETE": "REFERENCING OLD TABLE AS old_rows",
+    "UPDATE": "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"
+}
+
+
+def trigger_ddl(table, event):
+    delta_sql, changes = trigger_sources[table]
+    name = f"{table}_value_{event.lower()}"
+    body = apply_delta_sql.format(delta=delta_sql.format(changes=changes[event]))
+    return [
+        f"""CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+{body};
+RETURN NULL;
+END
+$$""",
+        f"DROP TRIGGER IF EXISTS {name} ON {table}",
+        f"CREATE TRIGGER {name} AFTER {event} ON {table} {transition_tables[event]} "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION {name}()"
+    ]
+
+
+def build_live_department_values():
+    """Стоимость отделов, вычисленная по исходным таблицам (как раньше в запросе 5)."""
+    return (select(
+        DepartmentProduct.department_id,
+        func.coalesce(func.sum(DepartmentProduct.count * ProductPrice.price), 0).label('total_value'),
+        func.count().label('row_count')
+    )
+    .select_from(DepartmentProduct)
+    .join(Department, DepartmentProduct.department_id == Department.department_id)
+    .join(Store, Department.store_id == Store.store_id)
+    .join(ProductPrice, and_(
+        DepartmentProduct.article == ProductPrice.article,
+        Store.store_class_id == ProductPrice.store_class_id
+    ))
+    .group_by(DepartmentProduct.department_id)
+    )
+
+live_department_values_statement = build_live_department_values()
+
+
+def install_triggers(connection):
+    """Создаёт триггеры; пустую department_value заполняет по текущим данным."""
+    for table in trigger_sources:
+        for event in transition_tables:
+            for statement in trigger_ddl(table, event):
+                connection.execute(text(statement))
+    if connection.execute(select(DepartmentValue.department_id).limit(1)).first() is None:
+        refresh_department_values(connection)
+
+
+def refresh_department_values(connection):
+    """Полный пересчёт department_value по исходным таблицам."""
+    connection.execute(delete(DepartmentValue))
+    connection.execute(insert(DepartmentValue).from_select(
+        ['department_id', 'total_value', 'row_count'], live_department_values_statement
+    ))
+
+
+def check_department_values(connection):
+    """Отделы, у которых department_value расходится с пересчётом по исходным таблицам."""
+    live = live_department_values_statement.subquery()
+    department_id = func.coalesce(DepartmentValue.department_id, live.c.department_id)
+    stored_value = func.coalesce(DepartmentValue.total_value, 0)
+    live_value = func.coalesce(live.c.total_value, 0)
+    stored_count = func.coalesce(DepartmentValue.row_count, 0)
+    live_count = func.coalesce(live.c.row_count, 0)
+    return connection.execute(
+        select(
+            department_id.label('department_id'),
+            stored_value.label('stored_value'),
+            live_value.label('live_value'),
+            stored_count.label('stored_count'),
+            live_count.label('live_count')
+        )
+        .select_from(DepartmentValue.__table__.join(live, DepartmentValue.department_id == live.c.department_id, full=True))
+        .where((stored_value != live_value) | (stored_count != live_count))
+        .order_by(department_id)
+    ).all()
+
+
+def main():
+    from db import engine
+    from cache import notify_changed
+
+    parser = argparse.ArgumentParser(description="Проверка и пересчёт суммарной стоимости отделов (department_value)")
+    parser.add_argument("--refresh", action="store_true", help="пересчитать department_value по исходным таблицам")
+    parser.add_argument("--install", action="store_true", help="пересоздать триггеры")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.install:
+            install_triggers(conn)
+            print("Триггеры department_value установлены")
+        if args.refresh:
+            refresh_department_values(conn)
+            notify_changed(conn, "department_value")
+            print("department_value пересчитана")
+
+        mismatches = check_department_values(conn)
+
+    if not mismatches:
+        print("department_value согласована с исходными таблицами")
+        return
+    print(f"Расхождений: {len(mismatches)}")
+    for row in mismatches[:20]:
+        print(f"Отдел {row.department_id:8}: сохранено {row.stored_value} ({row.stored_count} строк), "
+              f"по данным {row.live_value} ({row.live_count} строк)")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
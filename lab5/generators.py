@@ -0,0 +1,332 @@
+from sampling import sample_unique_keys, block_counts
+from faker import Faker
+import numpy as np
+import time
+
+# Словари для генерации тестовых данных
+store_classes_data = [
+    ('Элитный', 'Магазины премиум-класса с широким ассортиментом'),
+    ('Стандарт', 'Магазины среднего ценового сегмента'),
+    ('Эконом', 'Бюджетные магазины'),
+    ('Специализированный', 'Магазины узкой направленности'),
+    ('Гипермаркет', 'Крупные торговые центры')
+]
+
+base_suffixes = ['Центр', 'База', 'Склад', 'Комплекс', 'Хаб']
+
+store_names = ['Супермаркет', 'Гипермаркет', 'Магазин', 'Торговый центр', 'Универмаг', 'Маркет', 'Торговая точка']
+
+department_names = [
+    'Молочный отдел', 'Хлебный отдел', 'Овощной отдел', 'Мясной отдел', 'Бакалея',
+    'Гастрономия', 'Кондитерский отдел', 'Бытовая техника', 'Электроника', 'Напитки',
+    'Фруктовый отдел', 'Рыбный отдел', 'Колбасный отдел', 'Сыры', 'Замороженные продукты',
+    'Хозтовары', 'Косметика', 'Одежда', 'Обувь', 'Аксессуары'
+]
+
+product_types = {
+    'Молочные': ['Молоко', 'Йогурт', 'Сыр', 'Кефир', 'Творог', 'Сметана'],
+    'Хлебные': ['Хлеб', 'Булочка', 'Батон', 'Пирог', 'Печенье'],
+    'Овощи': ['Картофель', 'Морковь', 'Лук', 'Помидоры', 'Огурцы'],
+    'Мясо': ['Курица', 'Говядина', 'Свинина', 'Баранина', 'Колбаса'],
+    'Бакалея': ['Рис', 'Гречка', 'Макароны', 'Мука', 'Сахар'],
+    'Напитки': ['Сок', 'Вода', 'Лимонад', 'Чай', 'Кофе'],
+    'Электроника': ['Телевизор', 'Смартфон', 'Ноутбук', 'Планшет', 'Наушники']
+}
+
+product_sorts = ['Премиум', 'Стандарт', 'Эконом']
+food_sorts = ['Высший сорт', 'Первый сорт', 'Отборный']
+
+# Наценка относительно базовой цены по классу магазина
+price_multipliers = {
+    'Элитный': 1.3,  # На 30% дороже
+    'Эконом': 0.8  # На 20% дешевле
+}
+
+# Порядок таблиц с учётом внешних ключей; номер таблицы входит в зерно её генератора
+table_order = [
+    'store_class',
+    'trading_base',
+    'employee',
+    'store',
+    'department',
+    'product',
+    'department_product',
+    'warehouse_product',
+    'product_price',
+    'warehouse_priority'
+]
+
+# Размер порции строк при потоковой генерации product_price
+PRICE_CHUNK_SIZE = 100000
+
+
+class ColumnBatch:
+    """Колоночный пакет строк одной таблицы: имя столбца -> массив NumPy или список."""
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def rows(self):
+        return zip(*(
+            column.tolist() if isinstance(column, np.ndarray) else column
+            for column in self.columns.values()
+        ))
+
+
+class ChunkedBatch:
+    """
+    Пакет строк, который генерируется порциями ColumnBatch по мере чтения:
+    в памяти одновременно находится одна порция. После выдачи каждой порции
+    вызывается on_chunk(table, rows_in_chunk, total_rows, elapsed_seconds).
+    """
+
+    def __init__(self, table, columns, chunks, on_chunk=None):
+        self.table = table
+        self.columns = columns
+        self.chunks = chunks
+        self.on_chunk = on_chunk
+
+    def rows(self):
+        start_time = time.perf_counter()
+        total = 0
+        for chunk in self.chunks:
+            yield from chunk.rows()
+            total += len(chunk)
+            if self.on_chunk:
+                self.on_chunk(self.table, len(chunk), total, time.perf_counter() - start_time)
+
+
+def print_chunk_progress(table, count, total, elapsed):
+    rate = total / elapsed if elapsed > 0 else 0
+    print(f"{table}: +{count} строк, всего {total} за {elapsed:.2f} секунд ({rate:,.0f} строк/с)")
+
+
+def table_rng(seed, table, part=0):
+    """Генератор NumPy части part таблицы table: свой поток случайных чисел на (seed, таблица, часть)."""
+    return np.random.default_rng([seed, table_order.index(table), part])
+
+
+class DataGenerator:
+    """
+    Векторизованный генератор тестовых данных.
+    Ключи, количества, цены и приоритеты выбираются массивами NumPy за один вызов,
+    строки собираются из словарей, заранее сгенерированных Faker.
+    При одинаковом seed набор данных воспроизводится полностью.
+    """
+
+    def __init__(self, records_per_table, seed=42, id_offsets=None, vocabulary_size=1000,
+                 chunk_size=PRICE_CHUNK_SIZE, on_chunk=None):
+        self.records_per_table = records_per_table
+        self.seed = seed
+        self.id_offsets = id_offsets or {}
+        self.chunk_size = chunk_size
+        self.on_chunk = on_chunk
+
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.companies = [fake.company() for i in range(vocabulary_size)]
+        self.words = [fake.word() for i in range(vocabulary_size)]
+        self.first_names = [fake.first_name() for i in range(vocabulary_size)]
+        self.last_names = [fake.last_name() for i in range(vocabulary_size)]
+        self.base_texts = [fake.text(max_nb_chars=150) for i in range(vocabulary_size // 4)]
+        self.store_texts = [fake.text(max_nb_chars=20) for i in range(vocabulary_size // 4)]
+
+        # Размеры таблиц-справочников и диапазоны их ключей
+        self.store_class_count = min(records_per_table, len(store_classes_data))
+        self.base_count = records_per_table
+        self.employee_count = records_per_table * 2
+        self.store_count = records_per_table
+        self.department_count = records_per_table * 2
+        self.product_count = records_per_table
+
+    def rng(self, table, part=0):
+        return table_rng(self.seed, table, part)
+
+    def first_id(self, table):
+        return self.id_offsets.get(table, 0) + 1
+
+    def ids(self, table, count, start=0):
+        """Ключи таблицы с номерами [start, count) (с нуля)."""
+        first = self.first_id(table)
+        return np.arange(first + start, first + count)
+
+    def choice(self, rng, vocabulary, size):
+        indexes = rng.integers(0, len(vocabulary), size)
+        return [vocabulary[i] for i in indexes.tolist()]
+
+    def random_ids(self, rng, table, count, size):
+        return rng.integers(0, count, size) + self.first_id(table)
+
+    def tables(self):
+        """Все таблицы в порядке внешних ключей."""
+        for table in table_order:
+            yield getattr(self, table)()
+
+    def store_class(self):
+        classes = store_classes_data[:self.store_class_count]
+        return ColumnBatch('store_class', {
+            'store_class_id': self.ids('store_class', len(classes)),
+            'name': [name for name, description in classes],
+            'description': [description for name, description in classes]
+        })
+
+    def trading_base(self):
+        rng = self.rng('trading_base')
+        n = self.base_count
+        names = zip(self.choice(rng, self.companies, n), self.choice(rng, base_suffixes, n))
+        return ColumnBatch('trading_base', {
+            'trading_base_id': self.ids('trading_base', n),
+            'name': [company + ' ' + suffix for company, suffix in names],
+            'description': self.choice(rng, self.base_texts, n)
+        })
+
+    def employee(self):
+        rng = self.rng('employee')
+        n = self.employee_count
+        return ColumnBatch('employee', {
+            'employee_id': self.ids('employee', n),
+            'first_name': self.choice(rng, self.first_names, n),
+            'last_name': self.choice(rng, self.last_names, n)
+        })
+
+    def store(self):
+        rng = self.rng('store')
+        n = self.store_count
+        names = zip(self.choice(rng, store_names, n), self.choice(rng, self.companies, n))
+        return ColumnBatch('store', {
+            'store_id': self.ids('store', n),
+            'name': [kind + ' ' + company for kind, company in names],
+            'description': self.choice(rng, self.store_texts, n),
+            'store_class_id': self.random_ids(rng, 'store_class', self.store_class_count, n),
+            'director_id': self.random_ids(rng, 'employee', self.employee_count, n)
+        })
+
+    def department(self):
+        rng = self.rng('department')
+        n = self.department_count
+        # Обязательный отдел для каждого магазина и дополнительные отделы в случайных магазинах
+        store_ids = np.concatenate([
+            self.ids('store', self.store_count),
+            self.random_ids(rng, 'store', self.store_count, n - self.store_count)
+        ])
+        suffixes = self.choice(rng, self.words, n)
+        with_suffix = rng.random(n) < 0.5
+        names = zip(self.choice(rng, department_names, n), suffixes, with_suffix.tolist())
+        return ColumnBatch('department', {
+            'department_id': self.ids('department', n),
+            'store_id': store_ids,
+            'manager_id': self.random_ids(rng, 'employee', self.employee_count, n),
+            'name': [name + ' ' + suffix if flag else name for name, suffix, flag in names]
+        })
+
+    def partition(self, count, part, parts):
+        """Диапазон ключей [lo, hi) (с нуля) для части part из parts."""
+        return count * part // parts, count * (part + 1) // parts
+
+    def product(self, part=0, parts=1):
+        rng = self.rng('product', part)
+        lo, hi = self.partition(self.product_count, part, parts)
+        n = hi - lo
+        categories = list(product_types.values())
+        category_index = rng.integers(0, len(categories), n)
+        is_electronics = category_index == list(product_types).index('Электроника')
+        # Для электроники сорт выбирается только из общих вариантов
+        sort_index = np.where(
+            is_electronics,
+            rng.integers(0, len(product_sorts), n),
+            rng.integers(0, len(product_sorts) + len(food_sorts), n)
+        )
+        sorts = product_sorts + food_sorts
+        kinds = rng.random(n)
+        words = self.choice(rng, self.words, n)
+        names = []
+        for category, kind, word in zip(category_index.tolist(), kinds.tolist(), words):
+            types = categories[category]
+            names.append(f"{types[int(kind * len(types))]} {word}")
+        return ColumnBatch('product', {
+            'article': self.ids('product', hi, lo),
+            'name': names,
+            'sort': [sorts[i] for i in sort_index.tolist()]
+        })
+
+    def unique_keys(self, table, tables, size, part=0, parts=1):
+        """
+        Различные составные ключи таблицы связей по ссылаемым таблицам tables.
+        Части делят диапазон первого ключа; общее число строк min(size, число комбинаций)
+        распределяется между частями гипергеометрически и одинаково в любом процессе.
+        Возвращает генератор случайных чисел части и массивы ключей.
+        """
+        other_shape = [count for other, count in tables[1:]]
+        other_size = int(np.prod(other_shape, dtype=object))
+        bounds = [self.partition(tables[0][1], i, parts) for i in range(parts)]
+        sizes = np.array([(hi - lo) * other_size for lo, hi in bounds], dtype=np.int64)
+        part_size = block_counts(self.rng(table), sizes, min(size, int(sizes.sum())))[part]
+
+        rng = self.rng(table, part + 1)
+        lo, hi = bounds[part]
+        keys = sample_unique_keys(rng, [hi - lo] + other_shape, int(part_size))
+        keys = [keys[0] + lo] + list(keys[1:])
+        return rng, [key + self.first_id(other) for key, (other, count) in zip(keys, tables)]
+
+    def department_product(self, part=0, parts=1):
+        rng, (department_ids, articles) = self.unique_keys('department_product', [
+            ('department', self.department_count),
+            ('product', self.product_count)
+        ], self.records_per_table * 5, part, parts)
+        return ColumnBatch('department_product', {
+            'department_id': department_ids,
+            'article': articles,
+            'count': rng.integers(0, 101, len(articles))
+        })
+
+    def warehouse_product(self, part=0, parts=1):
+        rng, (base_ids, articles) = self.unique_keys('warehouse_product', [
+            ('trading_base', self.base_count),
+            ('product', self.product_count)
+        ], self.records_per_table * 2, part, parts)
+        return ColumnBatch('warehouse_product', {
+            'trading_base_id': base_ids,
+            'article': articles,
+            'count': rng.integers(10, 501, len(articles)),
+            'price': rng.integers(50, 50001, len(articles)) / 100  # Цены от 0.50 до 500.00
+        })
+
+    def product_price(self, part=0, parts=1):
+        """Цены всех товаров части для каждого класса магазина, порциями около chunk_size строк."""
+        classes = store_classes_data[:self.store_class_count]
+        columns = {'store_class_id': None, 'article': None, 'price': None}
+        return ChunkedBatch('product_price', columns, self.product_price_chunks(classes, part, parts), self.on_chunk)
+
+    def product_price_chunks(self, classes, part, parts):
+        rng = self.rng('product_price', part)
+        lo, hi = self.partition(self.product_count, part, parts)
+        class_ids = self.ids('store_class', len(classes))
+        multipliers = np.array([price_multipliers.get(name, 1) for name, description in classes])
+        step = max(1, self.chunk_size // max(1, len(classes)))
+
+        for chunk_lo in range(lo, hi, step):
+            chunk_hi = min(chunk_lo + step, hi)
+            n = chunk_hi - chunk_lo
+            base_prices = rng.integers(100, 10001, (len(classes), n)) / 100
+            yield ColumnBatch('product_price', {
+                'store_class_id': np.repeat(class_ids, n),
+                'article': np.tile(self.ids('product', chunk_hi, chunk_lo), len(classes)),
+                'price': np.round(base_prices * multipliers[:, None], 2).ravel()
+            })
+
+    def warehouse_priority(self, part=0, parts=1):
+        rng, (articles, store_ids, base_ids) = self.unique_keys('warehouse_priority', [
+            ('product', self.product_count),
+            ('store', self.store_count),
+            ('trading_base', self.base_count)
+        ], self.records_per_table * 2, part, parts)
+        return ColumnBatch('warehouse_priority', {
+            'article': articles,
+            'store_id': store_ids,
+            'trading_base_id': base_ids,
+            'priority': rng.integers(1, 11, len(articles))
+        })
@@ -0,0 +1,184 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter_ns
+import functools
+import threading
+
+# Границы корзин гистограмм, микросекунды
+BUCKETS_US = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000,
+              100000, 250000, 500000, 1000000, 2500000, 5000000, 10000000]
+
+# Фазы выполнения запроса
+PHASES = ["build", "compile", "db", "fetch", "format", "total"]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_US) + 1)
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ns):
+        value_us = value_ns / 1000
+        bucket = next((i for i, bound in enumerate(BUCKETS_US) if value_us <= bound), len(BUCKETS_US))
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.sum_ns += value_ns
+            self.max_ns = max(self.max_ns, value_ns)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum_ms": self.sum_ns / 1e6,
+                "mean_ms": self.sum_ns / self.count / 1e6 if self.count else 0,
+                "max_ms": self.max_ns / 1e6,
+                "buckets_us": dict(zip([str(bound) for bound in BUCKETS_US] + ["+Inf"], self.counts))
+            }
+
+
+# Гистограммы по имени запроса и фазе
+histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def histogram(name, phase):
+    with _histograms_lock:
+        return histograms.setdefault((name, phase), Histogram())
+
+
+def export_metrics():
+    """Все гистограммы в виде {запрос: {фаза: снимок}}."""
+    result = {}
+    for (name, phase), hist in list(histograms.items()):
+        result.setdefault(name, {})[phase] = hist.snapshot()
+    return result
+
+
+class QueryTimer:
+    """Отметки времени одного вызова запроса, заполняются событиями движка SQLAlchemy."""
+
+    def __init__(self):
+        self.start = perf_counter_ns()
+        self.first_execute = None
+        self.last_result = None
+        self.compile_ns = 0
+        self.db_ns = 0
+        self.format_start = None
+        self.format_ns = 0
+        self.end = None
+        self._execute_start = None
+        self._cursor_start = None
+
+    def phases(self):
+        data_end = self.format_start or self.end
+        return {
+            "build": (self.first_execute or data_end) - self.start,
+            "compile": self.compile_ns,
+            "db": self.db_ns,
+            "fetch": data_end - self.last_result if self.last_result else 0,
+            "format": self.format_ns,
+            "total": self.end - self.start
+        }
+
+    def execution_time(self):
+        """Время до начала вывода результата, секунды."""
+        return ((self.format_start or self.end) - self.start) / 1e9
+
+
+_current = ContextVar("query_timer", default=None)
+
+
+@event.listens_for(Engine, "before_execute")
+def _before_execute(conn, clauseelement, multiparams, params, execution_options):
+    timer = _current.get()
+    if timer:
+        timer._execute_start = perf_counter_ns()
+        if timer.first_execute is None:
+            timer.first_execute = timer._execute_start
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _current.get()
+    if timer:
+        timer._cursor_start = perf_counter_ns()
+        if timer._execute_start is not None:
+            timer.compile_ns += timer._cursor_start - timer._execute_start
+            timer._execute_start = None
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _current.get()
+    if timer and timer._cursor_start is not None:
+        timer.last_result = perf_counter_ns()
+        timer.db_ns += timer.last_result - timer._cursor_start
+        timer._cursor_start = None
+
+
+@contextmanager
+def formatting():
+    """Отмечает вывод результата: время внутри блока учитывается как фаза format."""
+    timer = _current.get()
+    start = perf_counter_ns()
+    try:
+        yield
+    finally:
+        if timer:
+            timer.format_start = timer.format_start or start
+            timer.format_ns += perf_counter_ns() - start
+
+
+def instrumented(label):
+    """
+    Замеряет вызов функции запроса по фазам (построение выражения, компиляция SQL,
+    обращение к базе, выборка строк, вывод) и пишет их в гистограммы.
+    Функция возвращает строки, обёртка - пару (строки, время выполнения), как раньше.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timer = QueryTimer()
+            token = _current.set(timer)
+            try:
+                rows = func(*args, **kwargs)
+            finally:
+                timer.end = perf_counter_ns()
+                _current.reset(token)
+
+            for phase, value in timer.phases().items():
+                histogram(func.__name__, phase).observe(value)
+
+            execution_time = timer.execution_time()
+            print(f"Запрос {label} выполнен за {execution_time:.4f} секунд, обработано {len(rows)} записей")
+            return rows, execution_time
+
+        return wrapper
+    return decorator
+
+
+def instrumented_async(label):
+    """
+    Вариант instrumented для корутин async_queries: замеряется только полное время вызова
+    (события движка выполняются в другом контексте), гистограмма - ("async." + имя, "total").
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = perf_counter_ns()
+            rows = await func(*args, **kwargs)
+            elapsed = perf_counter_ns() - start
+            histogram(f"async.{func.__name__}", "total").observe(elapsed)
+
+            execution_time = elapsed / 1e9
+            print(f"Запрос {label} выполнен за {execution_time:.4f} секунд, обработано {len(rows)} записей")
+            return rows, execution_time
+
+        return wrapper
+    return decorator
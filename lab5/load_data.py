@@ -0,0 +1,87 @@
+from db import engine, SessionLocal
+from models import Base
+from populate_data import populate_test_data_faker, deferred_indexes
+from contextlib import nullcontext
+from parallel_load import populate_test_data_parallel
+from generators import PRICE_CHUNK_SIZE, print_chunk_progress
+from delta_sync import sync_snapshot, print_result
+from cache import notify_changed
+import argparse
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description="Заполнение базы данных синтетическими тестовыми данными")
+    parser.add_argument("--records", type=int, default=10000, help="количество записей на таблицу")
+    parser.add_argument("--mode", choices=["orm", "copy", "parallel", "delta"], default="copy",
+                        help="orm - через сессию SQLAlchemy, copy - потоковая загрузка COPY FROM STDIN, "
+                             "parallel - COPY из нескольких процессов по частям таблиц, "
+                             "delta - применить только отличия от снимка --snapshot без TRUNCATE")
+    parser.add_argument("--snapshot", default=None, help="каталог снимка для режима delta (<таблица>.csv или .parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов для режима parallel")
+    parser.add_argument("--partitions", type=int, default=None, help="число частей крупных таблиц для режима parallel")
+    parser.add_argument("--seed", type=int, default=42, help="зерно генератора для воспроизводимых наборов данных")
+    parser.add_argument("--chunk-size", type=int, default=PRICE_CHUNK_SIZE, help="размер порции product_price")
+    parser.add_argument("--progress", action="store_true", help="печатать скорость загрузки после каждой порции")
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="удалить вторичные индексы на время загрузки и построить их заново в конце")
+    parser.add_argument("--defer-fk", action="store_true",
+                        help="вместе с --defer-indexes снять внешние ключи и проверить их после загрузки")
+    parser.add_argument("--no-truncate", action="store_true",
+                        help="не очищать таблицы перед загрузкой (в режиме delta - не удалять строки, которых нет в снимке)")
+    args = parser.parse_args()
+
+    print("Создание отсутствующих таблиц в PostgreSQL...")
+    Base.metadata.create_all(engine)
+
+    if args.defer_indexes:
+        load_mode = deferred_indexes(engine, defer_foreign_keys=args.defer_fk, workers=args.workers)
+    else:
+        load_mode = nullcontext()
+
+    with load_mode:
+        load(args)
+
+    # Запущенное приложение очищает кэш запросов по уведомлению
+    with engine.begin() as conn:
+        notify_changed(conn)
+
+
+def load(args):
+    if args.mode == "delta":
+        if not args.snapshot:
+            raise SystemExit("Для режима delta нужен --snapshot")
+        start_time = time.perf_counter()
+        with engine.begin() as conn:
+            result = sync_snapshot(conn, args.snapshot, delete=not args.no_truncate)
+        print_result(result, time.perf_counter() - start_time)
+        return
+
+    if args.mode == "parallel":
+        populate_test_data_parallel(
+            records_per_table=args.records,
+            use_truncate=not args.no_truncate,
+            seed=args.seed,
+            workers=args.workers,
+            partitions=args.partitions
+        )
+        return
+
+    session = SessionLocal()
+    try:
+        populate_test_data_faker(
+            session,
+            records_per_table=args.records,
+            use_truncate=not args.no_truncate,
+            use_copy=args.mode == "copy",
+            seed=args.seed,
+            chunk_size=args.chunk_size,
+            on_chunk=print_chunk_progress if args.progress else None
+        )
+    except Exception as e:
+        print(f"Произошла ошибка: {e}")
+        session.rollback()
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
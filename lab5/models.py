@@ -1,9 +1,37 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DECIMAL
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DECIMAL, Index, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+import os
 
 Base = declarative_base()
 
+# DB_PARTITIONS > 1 - крупнейшие таблицы department_product и warehouse_priority создаются
+# секционированными по хешу (отдела и магазина соответственно) на DB_PARTITIONS секций.
+# Ключ секционирования входит в первичный ключ, запросы с условием на отдел или магазин
+# читают одну секцию. Действует только при создании таблиц (create_all): существующие
+# таблицы не перестраиваются.
+db_partitions = int(os.getenv('DB_PARTITIONS', '0'))
+
+
+def hash_partitioned(column):
+    """Аргументы таблицы, секционированной по хешу column (пустые без DB_PARTITIONS)."""
+    return {'postgresql_partition_by': f'HASH ({column})'} if db_partitions > 1 else {}
+
+
+def hash_partitions_sql(table_name, partitions):
+    return [
+        f"CREATE TABLE IF NOT EXISTS {table_name}_p{remainder} PARTITION OF {table_name} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        for remainder in range(partitions)
+    ]
+
+
+def create_hash_partitions(table, connection, **kw):
+    if 'postgresql_partition_by' not in table.dialect_kwargs:
+        return
+    for statement in hash_partitions_sql(table.name, db_partitions):
+        connection.execute(text(statement))
+
 class StoreClass(Base):
     __tablename__ = 'store_class'
     
@@ -82,6 +110,8 @@ class DepartmentProduct(Base):
     department = relationship("Department", back_populates="department_products")
     product = relationship("Product", back_populates="department_products")
 
+    __table_args__ = hash_partitioned('department_id')
+
 class WarehouseProduct(Base):
     __tablename__ = 'warehouse_product'
     
@@ -114,3 +144,28 @@ class WarehousePriority(Base):
     product = relationship("Product", back_populates="warehouse_priorities")
     store = relationship("Store", back_populates="warehouse_priorities")
     trading_base = relationship("TradingBase", back_populates="warehouse_priorities")
+
+    __table_args__ = hash_partitioned('store_id')
+
+class DepartmentValue(Base):
+    """Суммарная стоимость товаров отдела, поддерживается триггерами (department_values.py)."""
+    __tablename__ = 'department_value'
+    
+    department_id = Column(Integer, ForeignKey('department.department_id', ondelete='CASCADE'), primary_key=True)
+    total_value = Column(DECIMAL(16, 2), nullable=False, default=0)
+    row_count = Column(Integer, nullable=False, default=0)
+    
+    department = relationship("Department")
+
+    __table_args__ = (
+        Index('idx_department_value_total', 'total_value', 'department_id'),
+    )
+
+event.listen(DepartmentProduct.__table__, "after_create", create_hash_partitions)
+event.listen(WarehousePriority.__table__, "after_create", create_hash_partitions)
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_department_value_triggers(target, connection, **kw):
+    # Триггеры ссылаются на department_product и product_price, поэтому ставятся после создания всех таблиц
+    from department_values import install_triggers
+    install_triggers(connection)
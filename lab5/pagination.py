@@ -0,0 +1,45 @@
+from sqlalchemy import bindparam
+import base64
+import binascii
+import json
+
+# Постраничная выборка по ключу (keyset): следующая страница начинается после
+# значений ключа сортировки последней строки предыдущей, без OFFSET. Курсор -
+# непрозрачный токен: base64 от JSON-списка этих значений. Ключи описываются словарём
+# {столбец: тип Python}, типы проверяются при разборе курсора.
+
+integer_range = (-2**31, 2**31 - 1)
+
+
+def after_param(key, type_):
+    """Параметр "после значения key" для условия продолжения выборки."""
+    return bindparam(f"after_{key}", type_=type_)
+
+
+def encode_cursor(row, keys):
+    payload = json.dumps([getattr(row, key) for key in keys], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, keys):
+    """Значения параметров after_<ключ> из курсора; ValueError, если курсор испорчен."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Неверный курсор: {cursor}") from e
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError(f"Неверный курсор: {cursor}")
+    for value, type_ in zip(values, keys.values()):
+        # bool в JSON - подкласс int в Python, но не значение ключа
+        if not isinstance(value, type_) or isinstance(value, bool) or (
+            type_ is int and not integer_range[0] <= value <= integer_range[1]
+        ):
+            raise ValueError(f"Неверный курсор: {cursor}")
+    return {f"after_{key}": value for key, value in zip(keys, values)}
+
+
+def next_cursor(rows, keys, limit):
+    """Курсор следующей страницы или None, если страница последняя."""
+    if limit is None or not rows or len(rows) < int(limit):
+        return None
+    return encode_cursor(rows[-1], keys)
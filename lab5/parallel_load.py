@@ -0,0 +1,99 @@
+from sqlalchemy import text
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from db import engine
+from models import Base
+from bulk_load import copy_batch, max_id, reset_sequences, print_copy_stats
+from generators import DataGenerator
+from populate_data import truncate_sql
+from department_values import refresh_department_values
+import os
+import time
+
+# Этапы загрузки в порядке внешних ключей: таблицы одного этапа друг на друга
+# не ссылаются, поэтому загружаются одновременно
+load_stages = [
+    ['store_class', 'trading_base', 'employee', 'product'],
+    ['store'],
+    ['department'],
+    ['department_product', 'warehouse_product', 'product_price', 'warehouse_priority']
+]
+
+# Крупные таблицы делятся на диапазоны ключей, каждая часть - отдельная задача пула
+partitioned_tables = {'product', 'department_product', 'product_price', 'warehouse_priority'}
+
+# Генератор процесса-исполнителя (словари Faker строятся один раз на процесс)
+_generator = None
+
+
+def _init_worker(records_per_table, seed, id_offsets):
+    global _generator
+    # Соединения пула, унаследованные от родительского процесса, не используются
+    engine.dispose(close=False)
+    _generator = DataGenerator(records_per_table, seed=seed, id_offsets=id_offsets)
+
+
+def _load_partition(table, part, parts):
+    """Генерирует часть таблицы и загружает её через COPY по собственному соединению."""
+    generate = getattr(_generator, table)
+    batch = generate(part, parts) if table in partitioned_tables else generate()
+    with engine.begin() as conn:
+        count, _ = copy_batch(conn, batch, report=False)
+    return table, count
+
+
+def populate_test_data_parallel(records_per_table=10, use_truncate=True, seed=42, workers=None, partitions=None):
+    """
+    Многопроцессная загрузка тестовых данных DataGenerator через COPY.
+    Каждая часть фиксируется отдельной транзакцией, поэтому при ошибке
+    набор данных может остаться загруженным частично.
+    """
+    start_time = time.time()
+    workers = workers or os.cpu_count()
+    partitions = partitions or workers
+
+    with engine.begin() as conn:
+        if use_truncate:
+            print("Очистка существующих данных...")
+            conn.execute(text(truncate_sql))
+
+        id_offsets = {
+            table.name: max_id(conn, table.name, table.primary_key.columns[0].name)
+            for table in Base.metadata.sorted_tables
+            if len(table.primary_key.columns) == 1
+        }
+
+    print(f"Параллельная загрузка тестовых данных ({records_per_table} записей на таблицу, "
+          f"процессов: {workers}, частей: {partitions}, seed={seed})...")
+
+    total = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(records_per_table, seed, id_offsets)
+    ) as pool:
+        for stage in load_stages:
+            stage_start = time.perf_counter()
+            counts = dict.fromkeys(stage, 0)
+            remaining = dict.fromkeys(stage, 0)
+            futures = []
+            for table in stage:
+                parts = partitions if table in partitioned_tables else 1
+                remaining[table] = parts
+                futures += [pool.submit(_load_partition, table, part, parts) for part in range(parts)]
+
+            # Скорость таблицы считается по времени завершения её последней части
+            for future in as_completed(futures):
+                table, count = future.result()
+                counts[table] += count
+                remaining[table] -= 1
+                if not remaining[table]:
+                    print_copy_stats(table, counts[table], time.perf_counter() - stage_start)
+            total += sum(counts.values())
+
+    with engine.begin() as conn:
+        reset_sequences(conn)
+        # Части department_product и product_price загружались параллельно и не видели друг друга
+        refresh_department_values(conn)
+
+    execution_time = time.time() - start_time
+    print(f"Загружено {total} строк за {execution_time:.2f} секунд ({total / execution_time:,.0f} строк/с)")
@@ -1,13 +1,20 @@
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from models import Base, StoreClass, TradingBase, Employee, Store, Department, Product, DepartmentProduct, WarehouseProduct, ProductPrice, WarehousePriority
+from bulk_load import copy_batch, max_id, reset_sequences
+from generators import *
+from sampling import sample_unique_keys
 from faker import Faker
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import os
 import time
 from datetime import datetime
 
 
 truncate_sql = """
 TRUNCATE TABLE
+    department_value,
     department_product,
     department,
     warehouse_priority,
@@ -21,10 +28,14 @@ TRUNCATE TABLE
 RESTART IDENTITY;
 """
 
+def populate_test_data_faker(session, records_per_table=10, use_truncate=True, use_copy=False, seed=42,
+                             chunk_size=PRICE_CHUNK_SIZE, on_chunk=None):
+    if use_copy:
+        return populate_test_data_copy(session.get_bind(), records_per_table, use_truncate, seed, chunk_size, on_chunk)
 
-def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
     start_time = time.time()
     fake = Faker('ru_RU')  # Русская локализация
+    fake.seed_instance(seed)
     
     # Очистка существующих данных
     if use_truncate:
@@ -36,14 +47,6 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
     
     
     # print("Генерация классов магазинов...")
-    store_classes_data = [
-        ('Элитный', 'Магазины премиум-класса с широким ассортиментом'),
-        ('Стандарт', 'Магазины среднего ценового сегмента'),
-        ('Эконом', 'Бюджетные магазины'),
-        ('Специализированный', 'Магазины узкой направленности'),
-        ('Гипермаркет', 'Крупные торговые центры')
-    ]
-    
     store_classes = []
     for i in range(min(records_per_table, len(store_classes_data))):
         if i < len(store_classes_data):
@@ -67,7 +70,7 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
     trading_bases = []
     for i in range(records_per_table):
         trading_bases.append(TradingBase(
-            name=fake.company() + ' ' + fake.random_element(['Центр', 'База', 'Склад', 'Комплекс', 'Хаб']),
+            name=fake.company() + ' ' + fake.random_element(base_suffixes),
             description=fake.text(max_nb_chars=150)
         ))
     
@@ -94,7 +97,6 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
     
     # print("Генерация магазинов...")
     stores = []
-    store_names = ['Супермаркет', 'Гипермаркет', 'Магазин', 'Торговый центр', 'Универмаг', 'Маркет', 'Торговая точка']
     
     for i in range(records_per_table):
         stores.append(Store(
@@ -111,12 +113,6 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
 
     # print("Генерация отделов...")
     departments = []
-    department_names = [
-        'Молочный отдел', 'Хлебный отдел', 'Овощной отдел', 'Мясной отдел', 'Бакалея',
-        'Гастрономия', 'Кондитерский отдел', 'Бытовая техника', 'Электроника', 'Напитки',
-        'Фруктовый отдел', 'Рыбный отдел', 'Колбасный отдел', 'Сыры', 'Замороженные продукты',
-        'Хозтовары', 'Косметика', 'Одежда', 'Обувь', 'Аксессуары'
-    ]
     store_ids = [s.store_id for s in stores]
     
     # Обязательное количество отделов для каждого магазина
@@ -141,15 +137,6 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
 
     # print("Генерация товаров...")
     products = []
-    product_types = {
-        'Молочные': ['Молоко', 'Йогурт', 'Сыр', 'Кефир', 'Творог', 'Сметана'],
-        'Хлебные': ['Хлеб', 'Булочка', 'Батон', 'Пирог', 'Печенье'],
-        'Овощи': ['Картофель', 'Морковь', 'Лук', 'Помидоры', 'Огурцы'],
-        'Мясо': ['Курица', 'Говядина', 'Свинина', 'Баранина', 'Колбаса'],
-        'Бакалея': ['Рис', 'Гречка', 'Макароны', 'Мука', 'Сахар'],
-        'Напитки': ['Сок', 'Вода', 'Лимонад', 'Чай', 'Кофе'],
-        'Электроника': ['Телевизор', 'Смартфон', 'Ноутбук', 'Планшет', 'Наушники']
-    }
     
     for i in range(records_per_table):
         category = fake.random_element(list(product_types.keys()))
@@ -157,7 +144,7 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
         
         products.append(Product(
             name=f"{product_name} {fake.word()}",
-            sort=fake.random_element(['Премиум', 'Стандарт', 'Эконом'] + (['Высший сорт', 'Первый сорт', 'Отборный'] if category != 'Электроника' else []))
+            sort=fake.random_element(product_sorts + (food_sorts if category != 'Электроника' else []))
         ))
     
     session.add_all(products)
@@ -168,21 +155,16 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
     # print("Генерация товаров в отделах...")
     department_products = []
     
-    # Создаем связи между отделами и товарами
-    used_combinations = set()
-    for i in range(records_per_table * 5):
-        dept = fake.random_element(departments)
-        prod = fake.random_element(products)
-        
-        # Избегаем дубликатов
-        combination = (dept.department_id, prod.article)
-        if combination not in used_combinations:
-            department_products.append(DepartmentProduct(
-                department_id=dept.department_id,
-                article=prod.article,
-                count=fake.random_int(min=0, max=100)
-            ))
-            used_combinations.add(combination)
+    # Создаем связи между отделами и товарами: ровно нужное число различных пар
+    dept_index, prod_index = sample_unique_keys(
+        table_rng(seed, 'department_product'), (len(departments), len(products)), records_per_table * 5
+    )
+    for d, p in zip(dept_index.tolist(), prod_index.tolist()):
+        department_products.append(DepartmentProduct(
+            department_id=departments[d].department_id,
+            article=products[p].article,
+            count=fake.random_int(min=0, max=100)
+        ))
     
     session.add_all(department_products)
     session.flush()
@@ -192,20 +174,16 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
     # print("Генерация товаров на складах...")
     warehouse_products = []
     
-    used_combinations = set()
-    for i in range(records_per_table * 2):
-        base = fake.random_element(trading_bases)
-        prod = fake.random_element(products)
-        
-        combination = (base.trading_base_id, prod.article)
-        if combination not in used_combinations:
-            warehouse_products.append(WarehouseProduct(
-                trading_base_id=base.trading_base_id,
-                article=prod.article,
-                count=fake.random_int(min=10, max=500),
-                price=float(fake.random_int(min=50, max=50000) / 100)  # Цены от 0.50 до 500.00
-            ))
-            used_combinations.add(combination)
+    base_index, prod_index = sample_unique_keys(
+        table_rng(seed, 'warehouse_product'), (len(trading_bases), len(products)), records_per_table * 2
+    )
+    for b, p in zip(base_index.tolist(), prod_index.tolist()):
+        warehouse_products.append(WarehouseProduct(
+            trading_base_id=trading_bases[b].trading_base_id,
+            article=products[p].article,
+            count=fake.random_int(min=10, max=500),
+            price=float(fake.random_int(min=50, max=50000) / 100)  # Цены от 0.50 до 500.00
+        ))
     
     session.add_all(warehouse_products)
     session.flush()
@@ -213,45 +191,33 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
     
 
     # print("Генерация цен товаров...")
-    product_prices = []
-    for store_class in store_classes:
-        for prod in products:
-            base_price = float(fake.random_int(min=100, max=10000) / 100)
-            if store_class.name == 'Элитный':
-                price = base_price * 1.3  # На 30% дороже
-            elif store_class.name == 'Эконом':
-                price = base_price * 0.8  # На 20% дешевле
-            else:
-                price = base_price
-
-            product_prices.append(ProductPrice(
-                store_class_id=store_class.store_class_id,
-                article=prod.article,
-                price=price
-            ))
-    session.add_all(product_prices)
-    session.flush()
-    print(f"Создано {len(product_prices)} ценовых позиций")
+    # Цены генерируются и сбрасываются в базу порциями, сессия не копит объекты
+    price_count = 0
+    chunk_start = time.perf_counter()
+    for chunk in iter_product_price_chunks(fake, store_classes, products, chunk_size):
+        session.add_all(chunk)
+        session.flush()
+        for price in chunk:
+            session.expunge(price)
+        price_count += len(chunk)
+        if on_chunk:
+            on_chunk('product_price', len(chunk), price_count, time.perf_counter() - chunk_start)
+    print(f"Создано {price_count} ценовых позиций")
     
 
     # print("Генерация приоритетов поставок...")
     warehouse_priorities = []
     
-    used_combinations = set()
-    for i in range(records_per_table * 2):
-        prod = fake.random_element(products)
-        store = fake.random_element(stores)
-        base = fake.random_element(trading_bases)
-        
-        combination = (prod.article, store.store_id, base.trading_base_id)
-        if combination not in used_combinations:
-            warehouse_priorities.append(WarehousePriority(
-                article=prod.article,
-                store_id=store.store_id,
-                trading_base_id=base.trading_base_id,
-                priority=fake.random_int(min=1, max=10)
-            ))
-            used_combinations.add(combination)
+    prod_index, store_index, base_index = sample_unique_keys(
+        table_rng(seed, 'warehouse_priority'), (len(products), len(stores), len(trading_bases)), records_per_table * 2
+    )
+    for p, st, b in zip(prod_index.tolist(), store_index.tolist(), base_index.tolist()):
+        warehouse_priorities.append(WarehousePriority(
+            article=products[p].article,
+            store_id=stores[st].store_id,
+            trading_base_id=trading_bases[b].trading_base_id,
+            priority=fake.random_int(min=1, max=10)
+        ))
     
     session.add_all(warehouse_priorities)
     session.flush()
@@ -266,77 +232,209 @@ def populate_test_data_faker(session, records_per_table=10, use_truncate=True):
     print(f"Время выполнения: {execution_time:.2f} секунд")
 
 
-def create_indexes(engine):
+def iter_product_price_chunks(fake, store_classes, products, chunk_size=PRICE_CHUNK_SIZE):
+    """Лениво генерирует объекты ProductPrice порциями не больше chunk_size."""
+    chunk = []
+    for store_class in store_classes:
+        multiplier = price_multipliers.get(store_class.name, 1)
+        for prod in products:
+            base_price = float(fake.random_int(min=100, max=10000) / 100)
+            chunk.append(ProductPrice(
+                store_class_id=store_class.store_class_id,
+                article=prod.article,
+                price=base_price * multiplier
+            ))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def populate_test_data_copy(engine, records_per_table=10, use_truncate=True, seed=42,
+                            chunk_size=PRICE_CHUNK_SIZE, on_chunk=None):
+    """Синтетические данные генератора DataGenerator, загружаемые потоково через COPY."""
+    start_time = time.time()
+
+    with engine.begin() as conn:
+        if use_truncate:
+            print("Очистка существующих данных...")
+            conn.execute(text(truncate_sql))
+
+        print(f"Загрузка тестовых данных через COPY ({records_per_table} записей на таблицу, seed={seed})...")
+
+        # Ключи назначаются явно, начиная с текущего максимума в таблице
+        id_offsets = {
+            table.name: max_id(conn, table.name, table.primary_key.columns[0].name)
+            for table in Base.metadata.sorted_tables
+            if len(table.primary_key.columns) == 1
+        }
+        generator = DataGenerator(
+            records_per_table,
+            seed=seed,
+            id_offsets=id_offsets,
+            chunk_size=chunk_size,
+            on_chunk=on_chunk
+        )
+
+        total = 0
+        for batch in generator.tables():
+            count, _ = copy_batch(conn, batch)
+            total += count
+
+        reset_sequences(conn)
+
+    execution_time = time.time() - start_time
+    print(f"Загружено {total} строк за {execution_time:.2f} секунд ({total / execution_time:,.0f} строк/с)")
+
+
+# Реестр вторичных индексов: (имя, таблица, определение)
+indexes = [
+    # 1. Индекс для поиска по названию товара
+    ("idx_product_name_search", "product", "(name)"),
+
+    # 2. Индекс для JOIN между Department и Store
+    ("idx_department_store_id_fk", "department", "(store_id)"),
+
+    # 3. Индексы для сортировки по количеству
+    ("idx_department_product_count_sort", "department_product", "(count)"),
+    ("idx_warehouse_product_count_sort", "warehouse_product", "(count)"),
+
+    # 4. Индекс для сортировки по приоритетам
+    ("idx_warehouse_priority_sort", "warehouse_priority", "(priority)"),
+
+    # 5. Индексы для сортировки по ценам
+    ("idx_product_price_sort", "product_price", "(price)"),
+    ("idx_warehouse_product_price_sort", "warehouse_product", "(price)"),
+
+    # 6. Составной индекс для DepartmentProduct
+    ("idx_department_product_join", "department_product", "(department_id, article)"),
+
+    # 7. Составной индекс для WarehouseProduct
+    ("idx_warehouse_product_join", "warehouse_product", "(trading_base_id, article)"),
+
+    # 8. Составной индекс для ProductPrice
+    ("idx_product_price_join", "product_price", "(store_class_id, article)"),
+
+    # 9. Индекс для Employee (поиск по имени)
+    ("idx_employee_name", "employee", "(last_name, first_name)"),
+
+    # 10. Индекс для Store по классу
+    ("idx_store_class", "store", "(store_class_id)"),
+
+    # 11. Поиск товара по подстроке (ILIKE '%...%') и по похожести - триграммы pg_trgm
+    ("idx_product_name_trgm", "product", "USING gin (name gin_trgm_ops)"),
+
+    # 12. Полнотекстовый поиск по названию товара
+    ("idx_product_name_fts", "product", "USING gin (to_tsvector('russian', name))"),
+
+    # 13. Автодополнение по началу названия (lower(name) LIKE 'префикс%')
+    ("idx_product_name_prefix", "product", "(lower(name) text_pattern_ops)")
+]
+
+# Расширения PostgreSQL, нужные индексам реестра
+index_extensions = ["pg_trgm"]
+
+
+def selected_indexes(names=None):
+    return [index for index in indexes if names is None or index[0] in names]
+
+
+def _create_index(engine, name, table, definition):
+    start_time = time.perf_counter()
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition};"))
+        conn.commit()
+    return time.perf_counter() - start_time
+
+
+def create_indexes(engine, names=None, workers=1):
+    """Создаёт индексы реестра (или только перечисленные в names), при workers > 1 - параллельно."""
     print("Создание индексов для улучшения производительности...")
-    
-    indexes_sql = [
-        # 1. Индекс для поиска по названию товара
-        "CREATE INDEX IF NOT EXISTS idx_product_name_search ON product (name);",
-        
-        # 2. Индекс для JOIN между Department и Store
-        "CREATE INDEX IF NOT EXISTS idx_department_store_id_fk ON department (store_id);",
-        
-        # 3. Индексы для сортировки по количеству
-        "CREATE INDEX IF NOT EXISTS idx_department_product_count_sort ON department_product (count);",
-        "CREATE INDEX IF NOT EXISTS idx_warehouse_product_count_sort ON warehouse_product (count);",
-        
-        # 4. Индекс для сортировки по приоритетам
-        "CREATE INDEX IF NOT EXISTS idx_warehouse_priority_sort ON warehouse_priority (priority);",
-        
-        # 5. Индексы для сортировки по ценам
-        "CREATE INDEX IF NOT EXISTS idx_product_price_sort ON product_price (price);",
-        "CREATE INDEX IF NOT EXISTS idx_warehouse_product_price_sort ON warehouse_product (price);",
-        
-        # 6. Составной индекс для DepartmentProduct
-        "CREATE INDEX IF NOT EXISTS idx_department_product_join ON department_product (department_id, article);",
-        
-        # 7. Составной индекс для WarehouseProduct
-        "CREATE INDEX IF NOT EXISTS idx_warehouse_product_join ON warehouse_product (trading_base_id, article);",
-        
-        # 8. Составной индекс для ProductPrice
-        "CREATE INDEX IF NOT EXISTS idx_product_price_join ON product_price (store_class_id, article);",
-        
-        # 9. Индекс для Employee (поиск по имени)
-        "CREATE INDEX IF NOT EXISTS idx_employee_name ON employee (last_name, first_name);",
-        
-        # 10. Индекс для Store по классу
-        "CREATE INDEX IF NOT EXISTS idx_store_class ON store (store_class_id);"
-    ]
-    
+    start_time = time.perf_counter()
+
     with engine.connect() as conn:
-        for sql in indexes_sql:
+        for extension in index_extensions:
             try:
-                conn.execute(text(sql))
+                conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {extension};"))
                 conn.commit()
+            except Exception as e:
+                print(f"Ошибка при создании расширения {extension}: {e}")
+                conn.rollback()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_create_index, engine, name, table, definition): name
+            for name, table, definition in selected_indexes(names)
+        }
+        for future in as_completed(futures):
+            try:
+                print(f"Индекс {futures[future]:35} создан за {future.result():8.2f} секунд")
             except Exception as e:
                 print(f"Ошибка при создании индекса: {e}")
 
+    print(f"Индексы созданы за {time.perf_counter() - start_time:.2f} секунд")
+
 
-def drop_indexes(engine):
+def drop_indexes(engine, names=None):
     print("Удаление индексов...")
-    
-    drop_sql = [
-        "DROP INDEX IF EXISTS idx_product_name_search;",
-        "DROP INDEX IF EXISTS idx_department_store_id_fk;",
-        "DROP INDEX IF EXISTS idx_department_product_count_sort;",
-        "DROP INDEX IF EXISTS idx_warehouse_product_count_sort;",
-        "DROP INDEX IF EXISTS idx_warehouse_priority_sort;",
-        "DROP INDEX IF EXISTS idx_product_price_sort;",
-        "DROP INDEX IF EXISTS idx_warehouse_product_price_sort;",
-        "DROP INDEX IF EXISTS idx_department_product_join;",
-        "DROP INDEX IF EXISTS idx_warehouse_product_join;",
-        "DROP INDEX IF EXISTS idx_product_price_join;",
-        "DROP INDEX IF EXISTS idx_employee_name;",
-        "DROP INDEX IF EXISTS idx_store_class;"
-    ]
 
     with engine.connect() as conn:
-        for sql in drop_sql:
+        for name, table, definition in selected_indexes(names):
             try:
-                conn.execute(text(sql))
+                conn.execute(text(f"DROP INDEX IF EXISTS {name};"))
                 conn.commit()
             except Exception as e:
                 print(f"Ошибка при удалении индекса: {e}")
+
+
+def drop_foreign_keys(engine):
+    """Удаляет внешние ключи таблиц модели, возвращает их определения для восстановления."""
+    table_names = [table.name for table in Base.metadata.sorted_tables]
+    with engine.begin() as conn:
+        constraints = conn.execute(text("""
+            SELECT con.conrelid::regclass::text, con.conname, pg_get_constraintdef(con.oid), rel.relkind = 'p'
+            FROM pg_constraint con
+            JOIN pg_class rel ON rel.oid = con.conrelid
+            WHERE con.contype = 'f' AND con.conrelid::regclass::text = ANY(:tables)
+        """), {"tables": table_names}).all()
+        for table, name, definition, partitioned in constraints:
+            conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {name}"))
+    return constraints
+
+
+def restore_foreign_keys(engine, constraints):
+    """
+    Возвращает внешние ключи: добавление без проверки и отдельная проверка всех строк.
+    Секционированным таблицам (DB_PARTITIONS) PostgreSQL до 18 не даёт добавить ключ NOT VALID,
+    их ключи добавляются сразу с проверкой.
+    """
+    start_time = time.perf_counter()
+    with engine.begin() as conn:
+        for table, name, definition, partitioned in constraints:
+            not_valid = "" if partitioned else " NOT VALID"
+            conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}{not_valid}"))
+    with engine.begin() as conn:
+        for table, name, definition, partitioned in constraints:
+            if not partitioned:
+                conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}"))
+    print(f"Внешние ключи ({len(constraints)}) проверены за {time.perf_counter() - start_time:.2f} секунд")
+
+
+@contextmanager
+def deferred_indexes(engine, defer_foreign_keys=False, workers=None):
+    """
+    Режим массовой загрузки: вторичные индексы реестра (и, по желанию, внешние ключи)
+    удаляются на время загрузки и строятся заново один раз в конце.
+    """
+    drop_indexes(engine)
+    constraints = drop_foreign_keys(engine) if defer_foreign_keys else []
+    try:
+        yield
+    finally:
+        create_indexes(engine, workers=workers or os.cpu_count())
+        if constraints:
+            restore_foreign_keys(engine, constraints)
     
 
 def populate_test_data(session):
@@ -0,0 +1,116 @@
+from sqlalchemy import text
+from bulk_load import copy_table
+from decimal import Decimal
+import argparse
+import csv
+import time
+
+# Прайс-лист класса магазинов применяется одной операцией: строки загружаются COPY во временную
+# таблицу и сливаются с product_price одним INSERT ... ON CONFLICT DO UPDATE. Условие
+# WHERE ... IS DISTINCT FROM пропускает строки с прежней ценой: они не переписываются, не
+# создают мёртвых версий и не запускают триггеры department_value.
+
+staging_sql = [
+    "DROP TABLE IF EXISTS price_list_staging",
+    # line - порядок строк файла: при повторе товара действует последняя цена
+    """CREATE TEMP TABLE price_list_staging (
+    line bigint GENERATED ALWAYS AS IDENTITY,
+    article integer NOT NULL,
+    price numeric(10, 2) NOT NULL
+) ON COMMIT DROP"""
+]
+
+merge_sql = """
+WITH merged AS (
+    INSERT INTO {table} (store_class_id, article, price)
+    SELECT DISTINCT ON (article) :store_class_id, article, price
+    FROM price_list_staging
+    ORDER BY article, line DESC
+    ON CONFLICT (store_class_id, article) DO UPDATE SET price = EXCLUDED.price
+    WHERE {table}.price IS DISTINCT FROM EXCLUDED.price
+    RETURNING xmax = 0 AS inserted
+)
+SELECT
+    (SELECT count(DISTINCT article) FROM price_list_staging),
+    count(*) FILTER (WHERE inserted),
+    count(*) FILTER (WHERE NOT inserted)
+FROM merged
+"""
+
+# Полная замена прайс-листа: товары класса, которых нет в новом списке, удаляются
+delete_missing_sql = """
+DELETE FROM {table} pp
+WHERE pp.store_class_id = :store_class_id
+  AND NOT EXISTS (SELECT 1 FROM price_list_staging s WHERE s.article = pp.article)
+"""
+
+
+def apply_price_list(connection, store_class_id, prices, replace=False, table="product_price"):
+    """
+    Применяет прайс-лист prices - пары (article, price) - к классу магазинов в транзакции connection.
+    replace=True удаляет цены товаров, которых нет в списке. Товар, отсутствующий в product,
+    нарушает внешний ключ, и прайс-лист не применяется целиком.
+    Возвращает число строк списка, новых, изменённых, неизменных и удалённых цен.
+    """
+    start_time = time.perf_counter()
+    for statement in staging_sql:
+        connection.execute(text(statement))
+    lines, copy_time = copy_table(connection, "price_list_staging", ["article", "price"], prices, report=False)
+    connection.execute(text("ANALYZE price_list_staging"))
+
+    articles, new, changed = connection.execute(
+        text(merge_sql.format(table=table)), {"store_class_id": store_class_id}
+    ).one()
+    removed = 0
+    if replace:
+        removed = connection.execute(
+            text(delete_missing_sql.format(table=table)), {"store_class_id": store_class_id}
+        ).rowcount
+
+    return {
+        "lines": lines,
+        "articles": articles,
+        "new": new,
+        "changed": changed,
+        "unchanged": articles - new - changed,
+        "removed": removed,
+        "copy_seconds": copy_time,
+        "total_seconds": time.perf_counter() - start_time
+    }
+
+
+def read_price_list(path):
+    """CSV с колонками article, price (заголовок необязателен)."""
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if not row or not row[0].strip().isdigit():
+                continue
+            yield int(row[0]), Decimal(row[1])
+
+
+def print_summary(summary):
+    print(f"Строк прайс-листа: {summary['lines']}, товаров: {summary['articles']}")
+    print(f"Новых цен: {summary['new']}, изменённых: {summary['changed']}, без изменений: {summary['unchanged']}, "
+          f"удалено: {summary['removed']}")
+    print(f"COPY {summary['copy_seconds']:.2f} секунд, всего {summary['total_seconds']:.2f} секунд")
+
+
+def main():
+    from db import engine
+    from cache import notify_changed
+
+    parser = argparse.ArgumentParser(description="Загрузка прайс-листа класса магазинов в product_price")
+    parser.add_argument("store_class_id", type=int)
+    parser.add_argument("path", help="CSV: article,price")
+    parser.add_argument("--replace", action="store_true", help="удалить цены товаров, которых нет в прайс-листе")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        summary = apply_price_list(conn, args.store_class_id, read_price_list(args.path), args.replace)
+        # Кэш запросов приложения очищается после COMMIT по уведомлению
+        notify_changed(conn, "product_price", "department_value")
+    print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
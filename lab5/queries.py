@@ -1,32 +1,70 @@
-from sqlalchemy import func, and_, or_, not_, case, select, text
+from sqlalchemy import func, and_, or_, not_, case, select, text, bindparam, tuple_, true, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import aliased
-from models import WarehousePriority, ProductPrice, WarehouseProduct, DepartmentProduct, Product, Department, Store, Employee, TradingBase, StoreClass
+from models import WarehousePriority, ProductPrice, WarehouseProduct, DepartmentProduct, Product, Department, Store, Employee, TradingBase, StoreClass, DepartmentValue
+from instrumentation import instrumented, formatting
+from pagination import after_param, decode_cursor
+from cache import cached
+from db import SessionLocal
+from concurrent.futures import ThreadPoolExecutor
 import time
-    
-def execute_queries(session, show_output=True):
+
+# Запросы собираются один раз при импорте модуля как параметризованные операторы:
+# выражение не строится заново при каждом вызове, а скомпилированный SQL
+# берётся из кэша компиляции SQLAlchemy (ключ кэша у оператора один и тот же)
+store_id_param = bindparam("store_id", type_=Integer)
+base_id_param = bindparam("base_id", type_=Integer)
+department_id_param = bindparam("department_id", type_=Integer)
+pattern_param = bindparam("pattern", type_=String)
+# LIMIT тоже параметр: None (LIMIT NULL) снимает ограничение для потоковой выгрузки
+limit_param = bindparam("limit", type_=Integer)
+    
+def _run_in_own_session(query_func, show_output):
+    session = SessionLocal()
+    try:
+        return query_func(session, show_output=show_output)
+    finally:
+        session.close()
+
+def execute_queries(session, show_output=True, concurrency=1):
+    """
+    Выполняет все запросы из queries. concurrency > 1 - запросы независимы и идут
+    параллельно в пуле потоков, каждый на своей сессии (своём соединении из пула),
+    не больше concurrency одновременно; время ответа - примерно время самого долгого запроса.
+    В log результаты в порядке списка queries, с временем каждого запроса, как и при последовательном выполнении.
+    """
     print("=" * 80)
     print("ЗАПРОСЫ К БАЗЕ ДАННЫХ УНИВЕРСИТЕТСКОГО МАГАЗИНА")
     print("=" * 80)
 
     log = {}
-    
-    # Выполнение всех запросов
-    for query_func in queries:
-        log[query_func.__name__] = str(query_func(session, show_output=show_output))
-    
+    start_time = time.perf_counter()
+
+    if concurrency <= 1:
+        # Выполнение всех запросов
+        for query_func in queries:
+            log[query_func.__name__] = str(query_func(session, show_output=show_output))
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(queries))) as pool:
+            futures = [pool.submit(_run_in_own_session, query_func, show_output) for query_func in queries]
+            for query_func, future in zip(queries, futures):
+                log[query_func.__name__] = str(future.result())
+
+    print(f"Все запросы выполнены за {time.perf_counter() - start_time:.4f} секунд (параллельно: {max(concurrency, 1)})")
     return log
 
-def query_1_1_store_products(session, store_id=1, show_output=True):
-    """1.1 Какие товары имеются в магазине?"""
-    start_time = time.time()
-    
-    if show_output:
-        print(f"\n1.1 ТОВАРЫ В МАГАЗИНЕ ID={store_id}:")
-        print("-" * 60)
-    
-    store_products = (session.query(
+# Ключи сортировки списочных запросов для постраничной выборки: имена столбцов результата
+# и их типы, последний ключ делает порядок однозначным
+store_products_keys = {"department_name": str, "product_name": str, "department_id": int, "article": int}
+base_products_keys = {"product_name": str, "article": int}
+department_products_keys = {"product_name": str, "article": int}
+search_products_keys = {"available_quantity": int, "trading_base_id": int, "article": int}
+
+def build_store_products(after=False, store_id=store_id_param):
+    statement = (select(
         Store.name.label('store_name'),
         Department.name.label('department_name'),
+        Department.department_id,
         Product.article,
         Product.name.label('product_name'),
         Product.sort.label('product_sort'),
@@ -43,31 +81,45 @@ def query_1_1_store_products(session, store_id=1, show_output=True):
         Store.store_class_id == ProductPrice.store_class_id
     ))
     .filter(Store.store_id == store_id)
-    .order_by(Department.name, Product.name)
-    .limit(100)
-    .all())
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    
-    if show_output:
-        for product in store_products:
-            print(f"Отдел: {product.department_name:20} Товар: {product.product_name:25} "
-                  f"Кол-во: {product.quantity:3} Цена: {float(product.current_price):8.2f} "
-                  f"Сумма: {float(product.total_value):10.2f}")
-    
-    print(f"Запрос 1.1 выполнен за {execution_time:.4f} секунд, обработано {len(store_products)} записей")
-    return store_products, execution_time
+    .order_by(Department.name, Product.name, Department.department_id, Product.article)
+    .limit(limit_param)
+    )
+    if after:
+        statement = statement.filter(
+            tuple_(Department.name, Product.name, Department.department_id, Product.article) > tuple_(
+                after_param("department_name", String), after_param("product_name", String),
+                after_param("department_id", Integer), after_param("article", Integer)
+            )
+        )
+    return statement
 
-def query_1_2_base_products(session, base_id=2, show_output=True):
-    """1.2 Какие товары имеются на базе?"""
-    start_time = time.time()
-    
-    if show_output:
-        print(f"\n1.2 ТОВАРЫ НА ТОРГОВОЙ БАЗЕ ID={base_id}:")
-        print("-" * 60)
-    
-    base_products = (session.query(
+store_products_statement = build_store_products()
+store_products_after_statement = build_store_products(after=True)
+
+@cached({"store", "department", "department_product", "product", "product_price"})
+@instrumented("1.1")
+def query_1_1_store_products(session, store_id=1, limit=100, cursor=None, show_output=True):
+    """1.1 Какие товары имеются в магазине?"""
+    if cursor is None:
+        store_products = session.execute(store_products_statement, {"store_id": store_id, "limit": limit}).all()
+    else:
+        store_products = session.execute(store_products_after_statement, {
+            "store_id": store_id, "limit": limit, **decode_cursor(cursor, store_products_keys)
+        }).all()
+    
+    with formatting():
+        if show_output:
+            print(f"\n1.1 ТОВАРЫ В МАГАЗИНЕ ID={store_id}:")
+            print("-" * 60)
+            for product in store_products:
+                print(f"Отдел: {product.department_name:20} Товар: {product.product_name:25} "
+                      f"Кол-во: {product.quantity:3} Цена: {float(product.current_price):8.2f} "
+                      f"Сумма: {float(product.total_value):10.2f}")
+    
+    return store_products
+
+def build_base_products(after=False, base_id=base_id_param):
+    statement = (select(
         TradingBase.name.label('trading_base_name'),
         Product.article,
         Product.name.label('product_name'),
@@ -81,29 +133,42 @@ def query_1_2_base_products(session, base_id=2, show_output=True):
     .join(Product, WarehouseProduct.article == Product.article)
     .filter(TradingBase.trading_base_id == base_id)
     .filter(WarehouseProduct.count > 0)
-    .order_by(Product.name)
-    .limit(100)
-    .all())
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    
-    if show_output:
-        for product in base_products:
-            print(f"Товар: {product.product_name:25} Кол-во: {product.available_quantity:4} "
-                  f"Цена: {float(product.base_price):8.2f} Сумма: {float(product.total_value):12.2f}")
-    
-    print(f"Запрос 1.2 выполнен за {execution_time:.4f} секунд, обработано {len(base_products)} записей")
-    return base_products, execution_time
+    .order_by(Product.name, Product.article)
+    .limit(limit_param)
+    )
+    if after:
+        statement = statement.filter(
+            tuple_(Product.name, Product.article) > tuple_(
+                after_param("product_name", String), after_param("article", Integer)
+            )
+        )
+    return statement
 
-def query_2_1_orderable_products(session, store_id=1, show_output=True):
-    """2. Какие отсутствующие товары может заказать магазин на базе?"""
-    start_time = time.time()
-    
-    if show_output:
-        print(f"\n2. ОТСУТСТВУЮЩИЕ ТОВАРЫ ДЛЯ ЗАКАЗА МАГАЗИНОМ ID={store_id}:")
-        print("-" * 60)
-    
+base_products_statement = build_base_products()
+base_products_after_statement = build_base_products(after=True)
+
+@cached({"trading_base", "warehouse_product", "product"})
+@instrumented("1.2")
+def query_1_2_base_products(session, base_id=2, limit=100, cursor=None, show_output=True):
+    """1.2 Какие товары имеются на базе?"""
+    if cursor is None:
+        base_products = session.execute(base_products_statement, {"base_id": base_id, "limit": limit}).all()
+    else:
+        base_products = session.execute(base_products_after_statement, {
+            "base_id": base_id, "limit": limit, **decode_cursor(cursor, base_products_keys)
+        }).all()
+    
+    with formatting():
+        if show_output:
+            print(f"\n1.2 ТОВАРЫ НА ТОРГОВОЙ БАЗЕ ID={base_id}:")
+            print("-" * 60)
+            for product in base_products:
+                print(f"Товар: {product.product_name:25} Кол-во: {product.available_quantity:4} "
+                      f"Цена: {float(product.base_price):8.2f} Сумма: {float(product.total_value):12.2f}")
+    
+    return base_products
+
+def build_orderable_products(store_id=store_id_param):
     # Подзапрос для товаров с нулевым количеством в магазине
     zero_products_subquery = select(DepartmentProduct.article).\
         join(Department, DepartmentProduct.department_id == Department.department_id).\
@@ -111,9 +176,10 @@ def query_2_1_orderable_products(session, store_id=1, show_output=True):
             Department.store_id == store_id,
             DepartmentProduct.count == 0
         )).\
+        correlate_except(DepartmentProduct, Department).\
         scalar_subquery()
     
-    orderable_products = (session.query(
+    return (select(
         Store.name.label('store_name'),
         Product.name.label('product_name'),
         TradingBase.name.label('trading_base'),
@@ -133,33 +199,33 @@ def query_2_1_orderable_products(session, store_id=1, show_output=True):
     .filter(Product.article.in_(zero_products_subquery))
     .filter(WarehouseProduct.count >= 1)
     .order_by(Product.name, WarehousePriority.priority)
-    .limit(100)
-    .all())
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    
-    if show_output:
-        for product in orderable_products:
-            print(f"Товар: {product.product_name:25} База: {product.trading_base:30} "
-                  f"Доступно: {product.available_quantity:3} Цена: {float(product.base_price):8.2f} "
-                  f"Приоритет: {product.priority}")
-    
-    print(f"Запрос 2 выполнен за {execution_time:.4f} секунд, обработано {len(orderable_products)} записей")
-    return orderable_products, execution_time
+    .limit(limit_param)
+    )
 
-def query_2_2_extended_orderable_products(session, store_id=1, show_output=True):
-    """2.2 Какие отсутствующие товары может заказать магазин на базе (включая новые товары)?"""
-    start_time = time.time()
-    
-    if show_output:
-        print(f"\n2.2 ОТСУТСТВУЮЩИЕ ТОВАРЫ ДЛЯ ЗАКАЗА МАГАЗИНОМ ID={store_id} (включая новые товары):")
-        print("-" * 60)
-    
+orderable_products_statement = build_orderable_products()
+
+@instrumented("2")
+def query_2_1_orderable_products(session, store_id=1, limit=100, show_output=True):
+    """2. Какие отсутствующие товары может заказать магазин на базе?"""
+    orderable_products = session.execute(orderable_products_statement, {"store_id": store_id, "limit": limit}).all()
+    
+    with formatting():
+        if show_output:
+            print(f"\n2. ОТСУТСТВУЮЩИЕ ТОВАРЫ ДЛЯ ЗАКАЗА МАГАЗИНОМ ID={store_id}:")
+            print("-" * 60)
+            for product in orderable_products:
+                print(f"Товар: {product.product_name:25} База: {product.trading_base:30} "
+                      f"Доступно: {product.available_quantity:3} Цена: {float(product.base_price):8.2f} "
+                      f"Приоритет: {product.priority}")
+    
+    return orderable_products
+
+def build_extended_orderable_products(store_id=store_id_param):
     # Подзапрос для товаров, которые есть в магазине
     store_products_subquery = select(DepartmentProduct.article).\
         join(Department, DepartmentProduct.department_id == Department.department_id).\
-        where(Department.store_id == store_id)
+        where(Department.store_id == store_id).\
+        correlate_except(DepartmentProduct, Department)
     
     # Подзапрос для товаров с нулевым количеством
     zero_count_subquery = select(DepartmentProduct.article).\
@@ -167,9 +233,10 @@ def query_2_2_extended_orderable_products(session, store_id=1, show_output=True)
         where(and_(
             Department.store_id == store_id,
             DepartmentProduct.count == 0
-        ))
+        )).\
+        correlate_except(DepartmentProduct, Department)
     
-    extended_orderable_products = (session.query(
+    return (select(
         Store.name.label('store_name'),
         Product.name.label('product_name'),
         TradingBase.name.label('trading_base'),
@@ -197,35 +264,35 @@ def query_2_2_extended_orderable_products(session, store_id=1, show_output=True)
     ))
     .filter(WarehouseProduct.count >= 0)
     .order_by(Product.name, WarehousePriority.priority)
-    .limit(100)
-    .all())
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    
-    if show_output:
-        if extended_orderable_products:
-            for product in extended_orderable_products:
-                status_text = "ЗАКОНЧИЛСЯ" if product.status == 'ЗАКОНЧИЛСЯ' else "НОВЫЙ ТОВАР (может быть добавлен)"
-                print(f"Товар: {product.product_name:25} Статус: {status_text:25} "
-                      f"База: {product.trading_base:25} Приоритет: {product.priority}")
-        else:
-            print("Нет товаров для заказа")
-    
-    print(f"Запрос 2.2 выполнен за {execution_time:.4f} секунд, обработано {len(extended_orderable_products)} записей")
-    return extended_orderable_products, execution_time
+    .limit(limit_param)
+    )
 
-def query_3_department_products(session, department_id=1, store_id=1, show_output=True):
-    """3. Какие товары, и в каком количестве имеются в отделе магазина?"""
-    start_time = time.time()
-    
-    if show_output:
-        print(f"\n3. ТОВАРЫ В ОТДЕЛЕ ID={department_id} МАГАЗИНА ID={store_id}:")
-        print("-" * 60)
-    
-    department_products = (session.query(
+extended_orderable_products_statement = build_extended_orderable_products()
+
+@instrumented("2.2")
+def query_2_2_extended_orderable_products(session, store_id=1, limit=100, show_output=True):
+    """2.2 Какие отсутствующие товары может заказать магазин на базе (включая новые товары)?"""
+    extended_orderable_products = session.execute(extended_orderable_products_statement, {"store_id": store_id, "limit": limit}).all()
+    
+    with formatting():
+        if show_output:
+            print(f"\n2.2 ОТСУТСТВУЮЩИЕ ТОВАРЫ ДЛЯ ЗАКАЗА МАГАЗИНОМ ID={store_id} (включая новые товары):")
+            print("-" * 60)
+            if extended_orderable_products:
+                for product in extended_orderable_products:
+                    status_text = "ЗАКОНЧИЛСЯ" if product.status == 'ЗАКОНЧИЛСЯ' else "НОВЫЙ ТОВАР (может быть добавлен)"
+                    print(f"Товар: {product.product_name:25} Статус: {status_text:25} "
+                          f"База: {product.trading_base:25} Приоритет: {product.priority}")
+            else:
+                print("Нет товаров для заказа")
+    
+    return extended_orderable_products
+
+def build_department_products(after=False, department_id=department_id_param):
+    statement = (select(
         Store.name.label('store_name'),
         Department.name.label('department_name'),
+        Product.article,
         Product.name.label('product_name'),
         DepartmentProduct.count.label('quantity')
     )
@@ -234,30 +301,42 @@ def query_3_department_products(session, department_id=1, store_id=1, show_outpu
     .join(DepartmentProduct, Department.department_id == DepartmentProduct.department_id)
     .join(Product, DepartmentProduct.article == Product.article)
     .filter(Department.department_id == department_id)
-    .order_by(Product.name)
-    .limit(100)
-    .all())
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    
-    if show_output:
-        for product in department_products:
-            print(f"Магазин: {product.store_name:25} Отдел: {product.department_name:20} "
-                  f"Товар: {product.product_name:25} Кол-во: {product.quantity}")
-    
-    print(f"Запрос 3 выполнен за {execution_time:.4f} секунд, обработано {len(department_products)} записей")
-    return department_products, execution_time
+    .order_by(Product.name, Product.article)
+    .limit(limit_param)
+    )
+    if after:
+        statement = statement.filter(
+            tuple_(Product.name, Product.article) > tuple_(
+                after_param("product_name", String), after_param("article", Integer)
+            )
+        )
+    return statement
 
-def query_4_department_managers(session, store_id=1, show_output=True):
-    """4. Список заведующих отделами магазина"""
-    start_time = time.time()
-    
-    if show_output:
-        print(f"\n4. ЗАВЕДУЮЩИЕ ОТДЕЛАМИ МАГАЗИНА ID={store_id}:")
-        print("-" * 60)
-    
-    department_managers = (session.query(
+department_products_statement = build_department_products()
+department_products_after_statement = build_department_products(after=True)
+
+@instrumented("3")
+def query_3_department_products(session, department_id=1, store_id=1, limit=100, cursor=None, show_output=True):
+    """3. Какие товары, и в каком количестве имеются в отделе магазина?"""
+    if cursor is None:
+        department_products = session.execute(department_products_statement, {"department_id": department_id, "limit": limit}).all()
+    else:
+        department_products = session.execute(department_products_after_statement, {
+            "department_id": department_id, "limit": limit, **decode_cursor(cursor, department_products_keys)
+        }).all()
+    
+    with formatting():
+        if show_output:
+            print(f"\n3. ТОВАРЫ В ОТДЕЛЕ ID={department_id} МАГАЗИНА ID={store_id}:")
+            print("-" * 60)
+            for product in department_products:
+                print(f"Магазин: {product.store_name:25} Отдел: {product.department_name:20} "
+                      f"Товар: {product.product_name:25} Кол-во: {product.quantity}")
+    
+    return department_products
+
+def build_department_managers(store_id=store_id_param):
+    return (select(
         Store.name.label('store_name'),
         Department.name.label('department_name'),
         func.concat(Employee.first_name, ' ', Employee.last_name).label('manager_name')
@@ -267,65 +346,64 @@ def query_4_department_managers(session, store_id=1, show_output=True):
     .join(Employee, Department.manager_id == Employee.employee_id)
     .filter(Store.store_id == store_id)
     .order_by(Department.name)
-    .limit(100)
-    .all())
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    
-    if show_output:
-        for manager in department_managers:
-            print(f"Отдел: {manager.department_name:20} Заведующий: {manager.manager_name}")
-    
-    print(f"Запрос 4 выполнен за {execution_time:.4f} секунд, обработано {len(department_managers)} записей")
-    return department_managers, execution_time
+    .limit(limit_param)
+    )
 
-def query_5_department_values(session, show_output=True):
-    """5. Суммарная стоимость товара в каждом отделе"""
-    start_time = time.time()
+department_managers_statement = build_department_managers()
+
+@cached({"store", "department", "employee"})
+@instrumented("4")
+def query_4_department_managers(session, store_id=1, limit=100, show_output=True):
+    """4. Список заведующих отделами магазина"""
+    department_managers = session.execute(department_managers_statement, {"store_id": store_id, "limit": limit}).all()
     
-    if show_output:
-        print(f"\n5. СУММАРНАЯ СТОИМОСТЬ ТОВАРОВ ПО ОТДЕЛАМ:")
-        print("-" * 60)
+    with formatting():
+        if show_output:
+            print(f"\n4. ЗАВЕДУЮЩИЕ ОТДЕЛАМИ МАГАЗИНА ID={store_id}:")
+            print("-" * 60)
+            for manager in department_managers:
+                print(f"Отдел: {manager.department_name:20} Заведующий: {manager.manager_name}")
     
-    department_values = (session.query(
+    return department_managers
+
+def build_department_values():
+    # Суммы поддерживаются триггерами в department_value (department_values.py),
+    # первые строки берутся из индекса idx_department_value_total
+    return (select(
         Store.name.label('store_name'),
         Department.name.label('department_name'),
-        func.sum(DepartmentProduct.count * ProductPrice.price).label('total_value')
+        DepartmentValue.total_value
+    )
+    .select_from(DepartmentValue)
+    .join(Department, DepartmentValue.department_id == Department.department_id)
+    .join(Store, Department.store_id == Store.store_id)
+    .filter(DepartmentValue.row_count > 0)
+    .order_by(DepartmentValue.total_value.desc(), DepartmentValue.department_id.desc())
+    .limit(limit_param)
     )
-    .select_from(Store)
-    .join(Department, Store.store_id == Department.store_id)
-    .join(DepartmentProduct, Department.department_id == DepartmentProduct.department_id)
-    .join(ProductPrice, and_(
-        DepartmentProduct.article == ProductPrice.article,
-        Store.store_class_id == ProductPrice.store_class_id
-    ))
-    .group_by(Store.name, Department.name)
-    .order_by(func.sum(DepartmentProduct.count * ProductPrice.price).desc())
-    .limit(100)
-    .all())
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    
-    if show_output:
-        for dept in department_values:
-            print(f"Магазин: {dept.store_name:25} Отдел: {dept.department_name:20} "
-                  f"Сумма: {float(dept.total_value):12.2f}")
-    
-    print(f"Запрос 5 выполнен за {execution_time:.4f} секунд, обработано {len(department_values)} записей")
-    return department_values, execution_time
 
-def query_6_product_search(session, product_name='Молоко', show_output=True):
-    """6. На каких базах, и в каких количествах есть товар нужного наименования?"""
-    start_time = time.time()
+department_values_statement = build_department_values()
+
+@instrumented("5")
+def query_5_department_values(session, limit=100, show_output=True):
+    """5. Суммарная стоимость товара в каждом отделе"""
+    department_values = session.execute(department_values_statement, {"limit": limit}).all()
     
-    if show_output:
-        print(f"\n6. ПОИСК ТОВАРА '{product_name}' ПО БАЗАМ:")
-        print("-" * 60)
+    with formatting():
+        if show_output:
+            print(f"\n5. СУММАРНАЯ СТОИМОСТЬ ТОВАРОВ ПО ОТДЕЛАМ:")
+            print("-" * 60)
+            for dept in department_values:
+                print(f"Магазин: {dept.store_name:25} Отдел: {dept.department_name:20} "
+                      f"Сумма: {float(dept.total_value):12.2f}")
     
-    search_products = (session.query(
+    return department_values
+
+def build_search_products(after=False):
+    statement = (select(
+        Product.article,
         Product.name.label('product_name'),
+        TradingBase.trading_base_id,
         TradingBase.name.label('trading_base'),
         TradingBase.description.label('base_description'),
         WarehouseProduct.count.label('available_quantity'),
@@ -334,21 +412,46 @@ def query_6_product_search(session, product_name='Молоко', show_output=Tru
     .select_from(Product)
     .join(WarehouseProduct, Product.article == WarehouseProduct.article)
     .join(TradingBase, WarehouseProduct.trading_base_id == TradingBase.trading_base_id)
-    .filter(Product.name.ilike(f'%{product_name}%'))
-    .order_by(WarehouseProduct.count.desc())
-    .limit(100)
-    .all())
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    
-    if show_output:
-        for product in search_products:
-            print(f"Товар: {product.product_name:25} База: {product.trading_base:35} "
-                  f"Кол-во: {product.available_quantity:4} Цена: {float(product.price_per_unit):8.2f}")
-    
-    print(f"Запрос 6 выполнен за {execution_time:.4f} секунд, обработано {len(search_products)} записей")
-    return search_products, execution_time
+    .filter(Product.name.ilike(pattern_param))
+    .order_by(WarehouseProduct.count.desc(), TradingBase.trading_base_id, Product.article)
+    .limit(limit_param)
+    )
+    if after:
+        # Направления сортировки разные, поэтому сравнение строк (a, b) > (x, y) не подходит
+        after_count = after_param("available_quantity", Integer)
+        statement = statement.filter(or_(
+            WarehouseProduct.count < after_count,
+            and_(
+                WarehouseProduct.count == after_count,
+                tuple_(TradingBase.trading_base_id, Product.article) > tuple_(
+                    after_param("trading_base_id", Integer), after_param("article", Integer)
+                )
+            )
+        ))
+    return statement
+
+search_products_statement = build_search_products()
+search_products_after_statement = build_search_products(after=True)
+
+@instrumented("6")
+def query_6_product_search(session, product_name='Молоко', limit=100, cursor=None, show_output=True):
+    """6. На каких базах, и в каких количествах есть товар нужного наименования?"""
+    if cursor is None:
+        search_products = session.execute(search_products_statement, {"pattern": f'%{product_name}%', "limit": limit}).all()
+    else:
+        search_products = session.execute(search_products_after_statement, {
+            "pattern": f'%{product_name}%', "limit": limit, **decode_cursor(cursor, search_products_keys)
+        }).all()
+    
+    with formatting():
+        if show_output:
+            print(f"\n6. ПОИСК ТОВАРА '{product_name}' ПО БАЗАМ:")
+            print("-" * 60)
+            for product in search_products:
+                print(f"Товар: {product.product_name:25} База: {product.trading_base:35} "
+                      f"Кол-во: {product.available_quantity:4} Цена: {float(product.price_per_unit):8.2f}")
+    
+    return search_products
 
 queries = [
     query_1_1_store_products,
@@ -361,6 +464,91 @@ queries = [
     query_6_product_search
 ]
 
+# Оператор и параметры каждого запроса для потоковой выгрузки (аргументы как у функций запросов)
+query_statements = {
+    query_1_1_store_products.__name__: (store_products_statement, lambda store_id=1: {"store_id": store_id}),
+    query_1_2_base_products.__name__: (base_products_statement, lambda base_id=2: {"base_id": base_id}),
+    query_2_1_orderable_products.__name__: (orderable_products_statement, lambda store_id=1: {"store_id": store_id}),
+    query_2_2_extended_orderable_products.__name__: (extended_orderable_products_statement,
+                                                     lambda store_id=1: {"store_id": store_id}),
+    query_3_department_products.__name__: (department_products_statement,
+                                           lambda department_id=1, store_id=1: {"department_id": department_id}),
+    query_4_department_managers.__name__: (department_managers_statement, lambda store_id=1: {"store_id": store_id}),
+    query_5_department_values.__name__: (department_values_statement, lambda: {}),
+    query_6_product_search.__name__: (search_products_statement,
+                                      lambda product_name='Молоко': {"pattern": f'%{product_name}%'})
+}
+
+# Ключи сортировки запросов с постраничной выборкой (параметр cursor)
+keyset_columns = {
+    query_1_1_store_products.__name__: store_products_keys,
+    query_1_2_base_products.__name__: base_products_keys,
+    query_3_department_products.__name__: department_products_keys,
+    query_6_product_search.__name__: search_products_keys
+}
+
+# Пакетные варианты запросов: ключ, сборщик и столбцы порядка строк внутри одного ключа.
+# Список ключей разворачивается unnest и соединяется с тем же запросом через LATERAL,
+# поэтому для каждого ключа сохраняются условие, порядок и LIMIT одиночного запроса,
+# а база получает один оператор вместо запроса на каждый ключ
+batch_queries = {
+    query_1_1_store_products.__name__: ("store_id", build_store_products, store_products_keys),
+    query_1_2_base_products.__name__: ("base_id", build_base_products, base_products_keys),
+    query_2_1_orderable_products.__name__: ("store_id", build_orderable_products, ("product_name", "priority")),
+    query_2_2_extended_orderable_products.__name__: ("store_id", build_extended_orderable_products,
+                                                     ("product_name", "priority")),
+    query_3_department_products.__name__: ("department_id", build_department_products, department_products_keys),
+    query_4_department_managers.__name__: ("store_id", build_department_managers, ("department_name",))
+}
+
+ids_param = bindparam("ids", type_=ARRAY(Integer))
+
+def build_batch(key, build, order_keys):
+    ids = func.unnest(ids_param).table_valued("id", with_ordinality="position").render_derived(name="ids")
+    per_id = build(**{key: ids.c.id}).lateral("per_id")
+    return (select(ids.c.id.label(key), per_id)
+    .select_from(ids.join(per_id, true()))
+    .order_by(ids.c.position, *[per_id.c[column] for column in order_keys])
+    )
+
+batch_statements = {
+    name: (key, build_batch(key, build, order_keys)) for name, (key, build, order_keys) in batch_queries.items()
+}
+
+@instrumented("batch")
+def query_batch(session, name, ids, limit=100, show_output=True):
+    """Запрос name сразу для списка ключей ids одним обращением к базе; строки сгруппированы по ключу."""
+    key, statement = batch_statements[name]
+    ids = list(dict.fromkeys(ids))  # Повторный ключ дал бы его строки дважды
+    rows = session.execute(statement, {"ids": ids, "limit": limit}).all()
+
+    grouped = {id: [] for id in ids}
+    for row in rows:
+        grouped[getattr(row, key)].append(row)
+
+    with formatting():
+        if show_output:
+            print(f"\nПАКЕТНЫЙ ЗАПРОС {name} ДЛЯ {len(grouped)} КЛЮЧЕЙ:")
+            print("-" * 60)
+            for id, id_rows in grouped.items():
+                print(f"{key}={id}: {len(id_rows)} записей")
+
+    return grouped
+
+def stream_query(session, name, chunk_size=1000, limit=None, **kwargs):
+    """
+    Потоковое выполнение запроса name через серверный курсор (yield_per):
+    строки читаются из базы частями по chunk_size, в памяти одновременно только одна часть.
+    Возвращает имена столбцов и итератор по частям результата.
+    """
+    statement, params = query_statements[name]
+    result = session.execute(
+        statement,
+        {**params(**kwargs), "limit": limit},
+        execution_options={"yield_per": chunk_size}
+    )
+    return list(result.keys()), result.partitions()
+
 # -- 6. На каких базах, и в каких количествах есть товар нужного наименования?
 def bad_query_like(session, value):
     sql_query = f"""
@@ -0,0 +1,237 @@
+from sqlalchemy import text
+import argparse
+import time
+
+# План пополнения сразу для всех магазинов сети. Ассортимент магазина - товары его отделов
+# (department_product) и товары, для которых магазину назначены базы (warehouse_priority), в том
+# числе ни разу не поступавшие в магазин. Потребность - пары (магазин, товар) ассортимента, у
+# которых суммарный остаток по отделам магазина (0, если товара нет) меньше reorder_point;
+# заказывается до target_stock.
+# Кандидаты - базы из warehouse_priority для этой пары, у которых товар есть на складе
+# (warehouse_product.count). Меньшее значение priority - более предпочтительная база.
+#
+# Распределение идёт раундами, каждый раунд - один оператор над всеми магазинами:
+#   1. каждая непокрытая пара выбирает лучшую по приоритету базу, у которой ещё остался товар;
+#   2. заявки к одной базе на один товар упорядочиваются по (priority, store_id), нарастающая
+#      сумма заявок (оконная функция) показывает, сколько товара уже отдано магазинам впереди;
+#   3. магазин получает min(потребность, остаток базы - отданное до него), остатки базы и
+#      потребности уменьшаются.
+# Магазины, которым не хватило товара лучшей базы, в следующем раунде переходят к следующей.
+# Каждый раунд либо закрывает потребность, либо исчерпывает базу, поэтому раундов немного.
+#
+# Промежуточные данные и план - временные таблицы, удаляются в конце транзакции. Настройки
+# планировщика меняются только на время построения плана, затем возвращаются прежние.
+
+# Исходные таблицы; бенчмарк подставляет свои копии
+source_tables = {
+    "department_product": "department_product",
+    "department": "department",
+    "warehouse_product": "warehouse_product",
+    "warehouse_priority": "warehouse_priority"
+}
+
+settings_sql = "SELECT current_setting('work_mem') AS work_mem, current_setting('enable_nestloop') AS enable_nestloop"
+
+# is_local = true: как SET LOCAL, значение действует до конца транзакции, если его не вернуть
+restore_settings_sql = "SELECT set_config('work_mem', :work_mem, true), set_config('enable_nestloop', :enable_nestloop, true)"
+
+setup_sql = [
+    # Сортировки и хеш-таблицы раундов на всю сеть не помещаются в work_mem по умолчанию (4MB)
+    """SET LOCAL work_mem = '{work_mem}'""",
+    # Соединения по составным ключам (магазин, товар) оцениваются в тысячи строк вместо миллионов,
+    # и планировщик выбирает вложенные циклы с поиском по индексу на каждую строку
+    """SET LOCAL enable_nestloop = off""",
+    """DROP TABLE IF EXISTS replenishment_demand, replenishment_stock, replenishment_candidate, replenishment_plan""",
+    # Раунды читают таблицы целиком и соединяют их хешированием, индексы не нужны;
+    # fillfactor оставляет место на страницах для обновлений remaining на месте
+    """CREATE TEMP TABLE replenishment_demand WITH (fillfactor = 50) ON COMMIT DROP AS
+SELECT COALESCE(stocked.store_id, assortment.store_id) AS store_id,
+       COALESCE(stocked.article, assortment.article) AS article,
+       :target_stock - COALESCE(stocked.count, 0) AS remaining
+FROM (
+    SELECT d.store_id, dp.article, COALESCE(SUM(dp.count), 0) AS count
+    FROM {department_product} dp
+    JOIN {department} d ON d.department_id = dp.department_id
+    GROUP BY d.store_id, dp.article
+) AS stocked
+FULL JOIN (
+    SELECT DISTINCT store_id, article FROM {warehouse_priority}
+) AS assortment ON assortment.store_id = stocked.store_id AND assortment.article = stocked.article
+WHERE COALESCE(stocked.count, 0) < :reorder_point""",
+    """CREATE TEMP TABLE replenishment_stock WITH (fillfactor = 50) ON COMMIT DROP AS
+SELECT wp.trading_base_id, wp.article, wp.count AS remaining
+FROM {warehouse_product} wp
+WHERE wp.count > 0 AND wp.article IN (SELECT article FROM replenishment_demand)""",
+    """CREATE TEMP TABLE replenishment_candidate ON COMMIT DROP AS
+SELECT p.store_id, p.article, p.trading_base_id, p.priority
+FROM {warehouse_priority} p
+JOIN replenishment_demand dm ON dm.store_id = p.store_id AND dm.article = p.article
+JOIN replenishment_stock s ON s.trading_base_id = p.trading_base_id AND s.article = p.article""",
+    """CREATE TEMP TABLE replenishment_plan (
+    store_id integer NOT NULL,
+    article integer NOT NULL,
+    trading_base_id integer NOT NULL,
+    quantity integer NOT NULL,
+    priority integer,
+    round integer NOT NULL
+) ON COMMIT DROP""",
+    # Временные таблицы не анализируются автоматически, без статистики планы раундов хуже
+    """ANALYZE replenishment_demand, replenishment_stock, replenishment_candidate"""
+]
+
+round_sql = """
+WITH allocated AS (
+    INSERT INTO replenishment_plan (store_id, article, trading_base_id, quantity, priority, round)
+    SELECT store_id, article, trading_base_id, LEAST(remaining, stock - (running - remaining)), priority, :round
+    FROM (
+        SELECT choice.*,
+               SUM(remaining) OVER (PARTITION BY trading_base_id, article
+                                    ORDER BY priority, store_id ROWS UNBOUNDED PRECEDING) AS running
+        FROM (
+            SELECT DISTINCT ON (c.store_id, c.article)
+                   c.store_id, c.article, c.trading_base_id, c.priority, dm.remaining, s.remaining AS stock
+            FROM replenishment_candidate c
+            JOIN replenishment_demand dm ON dm.store_id = c.store_id AND dm.article = c.article
+            JOIN replenishment_stock s ON s.trading_base_id = c.trading_base_id AND s.article = c.article
+            WHERE dm.remaining > 0 AND s.remaining > 0
+            ORDER BY c.store_id, c.article, c.priority, c.trading_base_id
+        ) AS choice
+    ) AS ranked
+    WHERE running - remaining < stock
+    RETURNING store_id, article, trading_base_id, quantity
+), demand AS (
+    UPDATE replenishment_demand dm SET remaining = dm.remaining - a.quantity
+    FROM allocated a
+    WHERE dm.store_id = a.store_id AND dm.article = a.article
+), stock AS (
+    UPDATE replenishment_stock s SET remaining = s.remaining - a.quantity
+    FROM (SELECT trading_base_id, article, SUM(quantity) AS quantity FROM allocated GROUP BY trading_base_id, article) a
+    WHERE s.trading_base_id = a.trading_base_id AND s.article = a.article
+)
+SELECT count(*), COALESCE(SUM(quantity), 0) FROM allocated
+"""
+
+totals_sql = """
+SELECT
+    (SELECT count(*) FROM replenishment_demand),
+    (SELECT COALESCE(SUM(remaining), 0) FROM replenishment_demand),
+    (SELECT COALESCE(SUM(quantity), 0) FROM replenishment_plan),
+    (SELECT count(*) FROM replenishment_candidate)
+"""
+
+plan_sql = """
+SELECT store_id, article, trading_base_id, quantity, priority, round
+FROM replenishment_plan
+ORDER BY store_id, article, round
+LIMIT :limit
+"""
+
+# Нарушения плана: база отдала больше, чем есть; магазин получил больше потребности;
+# поставка от базы, которой нет в warehouse_priority для этой пары
+check_sql = [
+    ("перерасход остатка базы", """
+SELECT p.trading_base_id, p.article
+FROM replenishment_plan p
+JOIN {warehouse_product} wp ON wp.trading_base_id = p.trading_base_id AND wp.article = p.article
+GROUP BY p.trading_base_id, p.article, wp.count
+HAVING SUM(p.quantity) > wp.count"""),
+    ("превышение потребности", """
+SELECT store_id, article FROM replenishment_demand WHERE remaining < 0"""),
+    ("база вне приоритетов", """
+SELECT p.store_id, p.article
+FROM replenishment_plan p
+LEFT JOIN {warehouse_priority} wp
+    ON wp.store_id = p.store_id AND wp.article = p.article AND wp.trading_base_id = p.trading_base_id
+WHERE wp.store_id IS NULL OR p.quantity <= 0""")
+]
+
+
+def plan_replenishment(connection, reorder_point=1, target_stock=10, max_rounds=10, tables=source_tables,
+                       work_mem="256MB"):
+    """
+    Строит план пополнения во временной таблице replenishment_plan (до конца транзакции).
+    Возвращает сводку: потребность, распределено, не покрыто, статистику раундов.
+    """
+    if target_stock < reorder_point:
+        raise ValueError("target_stock не может быть меньше reorder_point")
+
+    start_time = time.perf_counter()
+    settings = connection.execute(text(settings_sql)).one()._asdict()
+    params = {"reorder_point": reorder_point, "target_stock": target_stock}
+    for statement in setup_sql:
+        connection.execute(text(statement.format(work_mem=work_mem, **tables)), params)
+    demand_rows, demand_units, _, candidates = connection.execute(text(totals_sql)).one()
+    setup_time = time.perf_counter() - start_time
+
+    rounds = []
+    for number in range(1, max_rounds + 1):
+        round_start = time.perf_counter()
+        rows, units = connection.execute(text(round_sql), {"round": number}).one()
+        if rows == 0:
+            break
+        rounds.append({"round": number, "rows": rows, "units": int(units), "seconds": time.perf_counter() - round_start})
+
+    _, unfilled_units, allocated_units, _ = connection.execute(text(totals_sql)).one()
+    # Последующие запросы транзакции вызывающего выполняются с его настройками
+    connection.execute(text(restore_settings_sql), settings)
+    return {
+        "demand_rows": demand_rows,
+        "demand_units": int(demand_units),
+        "candidates": candidates,
+        "allocated_units": int(allocated_units),
+        "unfilled_units": int(unfilled_units),
+        "plan_rows": sum(r["rows"] for r in rounds),
+        "rounds": rounds,
+        "setup_seconds": setup_time,
+        "total_seconds": time.perf_counter() - start_time
+    }
+
+
+def replenishment_plan(connection, limit=None):
+    """Строки плана, построенного plan_replenishment в этой же транзакции."""
+    return connection.execute(text(plan_sql), {"limit": limit}).all()
+
+
+def check_plan(connection, tables=source_tables):
+    """Список (нарушение, число строк) для плана в этой же транзакции; пустой - план корректен."""
+    problems = []
+    for name, sql in check_sql:
+        count = len(connection.execute(text(sql.format(**tables))).all())
+        if count:
+            problems.append((name, count))
+    return problems
+
+
+def print_summary(summary):
+    print(f"Потребность: {summary['demand_rows']} пар (магазин, товар), {summary['demand_units']} единиц, "
+          f"кандидатов (пара, база): {summary['candidates']}")
+    print(f"Подготовка: {summary['setup_seconds']:.2f} секунд")
+    for r in summary["rounds"]:
+        print(f"Раунд {r['round']}: {r['rows']} поставок, {r['units']} единиц за {r['seconds']:.2f} секунд")
+    print(f"Распределено {summary['allocated_units']} единиц, не покрыто {summary['unfilled_units']}, "
+          f"строк плана {summary['plan_rows']}, всего {summary['total_seconds']:.2f} секунд")
+
+
+def main():
+    from db import engine
+
+    parser = argparse.ArgumentParser(description="План пополнения отсутствующих товаров всех магазинов с торговых баз "
+                                                 "(включая товары из warehouse_priority, которых в магазине ещё не было)")
+    parser.add_argument("--reorder-point", type=int, default=1, help="заказывать, если остаток в магазине меньше")
+    parser.add_argument("--target-stock", type=int, default=10, help="заказывать до этого остатка")
+    parser.add_argument("--max-rounds", type=int, default=10)
+    parser.add_argument("--show", type=int, default=20, help="сколько строк плана вывести")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        summary = plan_replenishment(conn, args.reorder_point, args.target_stock, args.max_rounds)
+        print_summary(summary)
+        for row in replenishment_plan(conn, args.show):
+            print(f"Магазин {row.store_id:6} Товар {row.article:8} База {row.trading_base_id:6} "
+                  f"Количество {row.quantity:5} Приоритет {row.priority} Раунд {row.round}")
+        problems = check_plan(conn)
+        print("План корректен" if not problems else f"Нарушения: {problems}")
+
+
+if __name__ == "__main__":
+    main()
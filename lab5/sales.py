@@ -0,0 +1,345 @@
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from cache import invalidate_tables, notify_changed
+from collections import Counter
+import os
+import queue
+import threading
+import time
+
+# Приём продаж: событие (department_id, article, quantity) уменьшает department_product.count.
+# Продажи копятся в ограниченной очереди, фоновый поток забирает их окнами (window секунд или
+# max_batch событий), дописывает окно в журнал на диске, складывает продажи одной пары
+# (отдел, товар) и применяет окно одним UPDATE ... FROM unnest(...), после COMMIT отмечает
+# позицию журнала в файле контрольной точки.
+#
+# Доставка "хотя бы один раз": submit возвращается только после того, как окно с продажами
+# записано в журнал и сброшено на диск (fsync) - одна запись на всё окно, как групповой COMMIT.
+# После сбоя журнал с контрольной точки применяется заново при запуске. Окно, применённое в
+# базе, но не отмеченное в контрольной точке, будет применено повторно.
+# flush() дожидается, пока всё принятое будет применено.
+#
+# Очередь ограничена: если база не успевает, submit блокируется (обратное давление).
+#
+# Окно, которое база не может применить из-за сбоя соединения (OperationalError), повторяется.
+# Прочие ошибки не пройдут и при повторе: продажи окна применяются по одной паре, пары с
+# ошибкой дописываются в файл отвергнутых продаж (<журнал>.dead), контрольная точка идёт дальше.
+
+sales_log_path = os.getenv('SALES_LOG_PATH', 'sales.log')
+sales_window = float(os.getenv('SALES_WINDOW', '0.05'))
+sales_max_batch = int(os.getenv('SALES_MAX_BATCH', '20000'))
+sales_queue_size = int(os.getenv('SALES_QUEUE_SIZE', '100000'))
+# Сколько submit ждёт записи в журнал, прежде чем ответить ошибкой (поток приёма мог остановиться)
+sales_ack_timeout = float(os.getenv('SALES_ACK_TIMEOUT', '30'))
+# Журнал, полностью применённый и больше этого размера, обрезается
+sales_log_max_bytes = 64 << 20
+
+# Ключи и количество продажи - integer в базе
+max_integer = 2 ** 31 - 1
+
+# Остаток не уходит ниже нуля: проданное сверх учёта отдел видит как закончившийся товар
+apply_sales_sql = text("""
+UPDATE department_product dp
+SET count = GREATEST(COALESCE(dp.count, 0) - s.quantity, 0)
+FROM unnest(CAST(:department_ids AS integer[]), CAST(:articles AS integer[]), CAST(:quantities AS integer[]))
+    AS s(department_id, article, quantity)
+WHERE dp.department_id = s.department_id AND dp.article = s.article
+""")
+
+changed_tables = ("department_product", "department_value")
+
+
+def format_sale(department_id, article, quantity):
+    return f"{department_id},{article},{quantity}\n".encode()
+
+
+def check_sale(department_id, article, quantity):
+    if not 0 < quantity <= max_integer:
+        raise ValueError(f"Количество продажи должно быть от 1 до {max_integer}: {quantity}")
+    if not (-max_integer - 1 <= department_id <= max_integer and -max_integer - 1 <= article <= max_integer):
+        raise ValueError(f"Отдел или товар вне диапазона integer: {department_id}, {article}")
+
+
+def is_transient(error):
+    """Ошибка соединения или сервера, после которой тот же UPDATE может пройти."""
+    return isinstance(error, (OperationalError, InterfaceError)) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated
+    )
+
+
+class _Ticket:
+    """Ожидание записи в журнал продаж одного вызова submit_many."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = 0
+        self.error = None
+
+    def add(self):
+        with self._condition:
+            self._pending += 1
+
+    def logged(self, count, error=None):
+        with self._condition:
+            self._pending -= count
+            self.error = self.error or error
+            self._condition.notify_all()
+
+    def wait(self, timeout=sales_ack_timeout):
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._pending == 0, timeout):
+                raise OSError(f"Запись продаж в журнал не подтверждена за {timeout} секунд")
+        if self.error:
+            raise OSError(f"Продажи не записаны в журнал: {self.error}")
+
+
+def parse_sales(data):
+    for line in data.splitlines():
+        department_id, article, quantity = line.split(b",")
+        yield int(department_id), int(article), int(quantity)
+
+
+class SalesIngestor:
+    def __init__(self, engine, log_path=sales_log_path, window=sales_window, max_batch=sales_max_batch,
+                 queue_size=sales_queue_size):
+        self.engine = engine
+        self.log_path = log_path
+        self.checkpoint_path = log_path + ".checkpoint"
+        self.dead_letter_path = log_path + ".dead"
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._log = None
+        self._torn_at = None
+        self.events = 0
+        self.batches = 0
+        self.rows = 0
+        self.unknown = 0
+        self.replayed = 0
+        self.dead = 0
+
+    def start(self):
+        """Применяет журнал после контрольной точки (восстановление после сбоя) и запускает фоновый поток."""
+        # Без буфера: байты окна, которое не удалось записать, не останутся в памяти и не
+        # допишутся в журнал вместе со следующим окном
+        self._log = open(self.log_path, "ab+", buffering=0)
+        self._replay()
+        self._thread = threading.Thread(target=self._run, name="sales-ingestor", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, department_id, article, quantity=1, timeout=None):
+        """Принимает продажу и ждёт её записи в журнал; при заполненной очереди - см. submit_many."""
+        return self.submit_many([(department_id, article, quantity)], timeout=timeout)
+
+    def submit_many(self, sales, timeout=None):
+        """
+        Принимает продажи (department_id, article, quantity) и возвращает их число после записи
+        в журнал на диске. При заполненной очереди ждёт не дольше timeout на каждую продажу, затем
+        queue.Full; атрибут accepted исключения - сколько продаж до этого принято и записано.
+        Продажа с количеством вне 1..2**31-1 или ключом вне integer - ValueError, пачка не принимается.
+        Ошибка записи журнала или запись, не подтверждённая за SALES_ACK_TIMEOUT секунд, - OSError.
+        """
+        if self._stopping.is_set():
+            raise RuntimeError("Приём продаж остановлен")
+        sales = list(sales)
+        for sale in sales:
+            check_sale(*sale)
+        ticket = _Ticket()
+        accepted = 0
+        try:
+            for department_id, article, quantity in sales:
+                ticket.add()
+                try:
+                    self._queue.put((department_id, article, quantity, ticket), timeout=timeout)
+                except queue.Full:
+                    ticket.logged(1)
+                    raise
+                accepted += 1
+        except queue.Full as e:
+            ticket.wait()
+            e.accepted = accepted
+            raise
+        ticket.wait()
+        return accepted
+
+    def flush(self):
+        """Ждёт, пока все принятые продажи будут применены."""
+        self._queue.join()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+        self._log.close()
+
+    def stats(self):
+        return {
+            "events": self.events,
+            "batches": self.batches,
+            "rows": self.rows,
+            "unknown": self.unknown,
+            "replayed": self.replayed,
+            "dead": self.dead,
+            "queued": self._queue.qsize()
+        }
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            items = self._collect()
+            if not items:
+                continue
+            batch = [item[:3] for item in items]
+            tickets = Counter(item[3] for item in items)
+            try:
+                error = RuntimeError("Окно продаж не записано")
+                try:
+                    offset = self._write_window(b"".join(format_sale(*sale) for sale in batch))
+                    error = None
+                except OSError as e:
+                    # Окно не подтверждается: клиенты получают ошибку и повторяют продажи
+                    print(f"Ошибка записи журнала продаж: {e}")
+                    error = e
+                finally:
+                    for ticket, count in tickets.items():
+                        ticket.logged(count, error=error)
+                if error:
+                    continue
+                while True:
+                    try:
+                        self._apply(batch, offset)
+                        break
+                    except Exception as e:
+                        # Сбой соединения или контрольной точки; окно уже в журнале: повтор,
+                        # а при остановке - применение при следующем запуске
+                        print(f"Ошибка применения продаж: {e}")
+                        if self._stopping.is_set():
+                            raise
+                        time.sleep(1)
+            finally:
+                for i in range(len(items)):
+                    self._queue.task_done()
+
+    def _write_window(self, data):
+        """Дописывает окно в журнал и сбрасывает на диск, возвращает позицию конца журнала."""
+        if self._torn_at is not None:
+            # Хвост прошлого неудачного окна не удалось отрезать: без этого новое окно приклеилось бы к нему
+            self._log.truncate(self._torn_at)
+            self._torn_at = None
+        start = os.path.getsize(self.log_path)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._log.fileno(), view):]
+            os.fsync(self._log.fileno())
+        except OSError:
+            try:
+                self._log.truncate(start)
+            except OSError as e:
+                print(f"Не удалось отрезать недописанное окно журнала продаж: {e}")
+                self._torn_at = start
+            raise
+        return start + len(data)
+
+    def _collect(self):
+        """События окна: первое ждётся до window секунд, остальные забираются до конца окна или max_batch."""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.window))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, 0.001))
+        return batch
+
+    def _apply(self, sales, offset):
+        # Продажи одной пары складываются (сумма сверх integer списала бы остаток так же до нуля)
+        totals = Counter()
+        for department_id, article, quantity in sales:
+            totals[(department_id, article)] += quantity
+        totals = {key: min(quantity, max_integer) for key, quantity in totals.items()}
+        dead = self.dead
+        try:
+            updated = self._update(totals)
+        except Exception as e:
+            if is_transient(e):
+                raise
+            print(f"Окно продаж не применено ({getattr(e, 'orig', e)}), применение по одной паре")
+            updated = self._update_each(totals)
+        invalidate_tables(*changed_tables)
+        self._checkpoint(offset)
+
+        self.events += len(sales)
+        self.batches += 1
+        self.rows += updated
+        self.unknown += len(totals) - updated - (self.dead - dead)
+
+    def _update(self, totals):
+        # Ключи упорядочены, чтобы несколько приёмников блокировали строки в одном порядке
+        keys = sorted(totals)
+        with self.engine.begin() as conn:
+            updated = conn.execute(apply_sales_sql, {
+                "department_ids": [key[0] for key in keys],
+                "articles": [key[1] for key in keys],
+                "quantities": [totals[key] for key in keys]
+            }).rowcount
+            notify_changed(conn, *changed_tables)
+        return updated
+
+    def _update_each(self, totals):
+        updated = 0
+        for key in sorted(totals):
+            try:
+                updated += self._update({key: totals[key]})
+            except Exception as e:
+                if is_transient(e):
+                    raise
+                self._dead_letter(*key, totals[key], e)
+        return updated
+
+    def _dead_letter(self, department_id, article, quantity, error):
+        print(f"Продажа отвергнута: отдел {department_id}, товар {article}, количество {quantity}: {getattr(error, 'orig', error)}")
+        with open(self.dead_letter_path, "ab") as file:
+            file.write(format_sale(department_id, article, quantity))
+            file.flush()
+            os.fsync(file.fileno())
+        self.dead += 1
+
+    def _checkpoint(self, offset):
+        if offset >= sales_log_max_bytes and offset == os.path.getsize(self.log_path):
+            # Всё записанное применено: журнал начинается заново
+            self._log.truncate(0)
+            offset = 0
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "w") as file:
+            file.write(str(offset))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def _replay(self):
+        try:
+            with open(self.checkpoint_path) as file:
+                offset = int(file.read() or 0)
+        except FileNotFoundError:
+            offset = 0
+        self._log.seek(min(offset, os.path.getsize(self.log_path)))
+        data = self._log.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # Строка, недописанная при сбое, отбрасывается, иначе к ней приклеилась бы следующая запись
+            self._log.truncate(self._log.tell() - (len(data) - complete))
+        sales = list(parse_sales(data[:complete]))
+        self._log.seek(0, os.SEEK_END)
+        if sales:
+            self._apply(sales, self._log.tell())
+            self.replayed = len(sales)
+            print(f"Из журнала {self.log_path} применено {len(sales)} продаж после сбоя")
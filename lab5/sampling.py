@@ -0,0 +1,72 @@
+import numpy as np
+
+# Размер блока индексного пространства, внутри которого выборка делается явно
+SAMPLE_BLOCK_SIZE = 1 << 20
+
+# При меньшей доле выборки NumPy выбирает без возвращения через хеш-множество (память ~ выборке),
+# при большей - перестановкой всего диапазона (память ~ размеру блока)
+SPARSE_FRACTION = 1 / 20
+
+# NumPy умеет точное гипергеометрическое распределение только для суммы меньше 10**9
+HYPERGEOMETRIC_LIMIT = 10 ** 9
+
+
+def block_counts(rng, block_sizes, size):
+    """Сколько значений выборки попадает в каждый блок (в сумме ровно size)."""
+    population = int(block_sizes.sum())
+    if population < HYPERGEOMETRIC_LIMIT:
+        return rng.multivariate_hypergeometric(block_sizes, size, method='marginals')
+
+    # Для очень больших пространств - мультиномиальное приближение,
+    # переполнение блока переносится в блоки со свободным местом
+    counts = rng.multinomial(size, block_sizes / population)
+    excess = int(np.maximum(counts - block_sizes, 0).sum())
+    while excess:
+        counts = np.minimum(counts, block_sizes)
+        free = block_sizes - counts
+        counts += rng.multinomial(excess, free / free.sum())
+        excess = int(np.maximum(counts - block_sizes, 0).sum())
+    return counts
+
+
+def iter_unique_indices(rng, population, size, block_size=SAMPLE_BLOCK_SIZE):
+    """
+    Ровно size различных индексов из range(population) без отбраковки повторов.
+    Сначала выбирается число попаданий в каждый блок индексного пространства,
+    затем внутри блока делается выборка без возвращения. В плотном случае блоки
+    ограничены block_size, в разреженном - на блок приходится около block_size значений,
+    так что память ограничена размером блока и самой выборкой.
+    Индексы выдаются по возрастанию, частями по блокам.
+    """
+    if size > population:
+        raise ValueError(f"Нельзя выбрать {size} различных значений из {population}")
+    if size == 0:
+        return
+
+    if size < population * SPARSE_FRACTION:
+        # Разреженная выборка: блоки крупнее, около block_size значений на блок
+        block_size = max(block_size, -(-population // -(-size // block_size)))
+    block_count = -(-population // block_size)
+    block_sizes = np.full(block_count, block_size, dtype=np.int64)
+    block_sizes[-1] = population - block_size * (block_count - 1)
+    counts = block_counts(rng, block_sizes, size)
+
+    for block in np.flatnonzero(counts).tolist():
+        offsets = rng.choice(int(block_sizes[block]), int(counts[block]), replace=False, shuffle=False)
+        offsets.sort()
+        yield offsets.astype(np.int64) + block * block_size
+
+
+def sample_unique_indices(rng, population, size, block_size=SAMPLE_BLOCK_SIZE):
+    parts = list(iter_unique_indices(rng, population, size, block_size))
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+def sample_unique_keys(rng, shape, size):
+    """
+    Ровно min(size, число комбинаций) различных составных ключей (с нуля),
+    упорядоченных по ключу. Возвращает по массиву на каждый столбец ключа.
+    """
+    population = int(np.prod(shape, dtype=object))
+    flat = sample_unique_indices(rng, population, min(size, population))
+    return np.unravel_index(flat, shape)
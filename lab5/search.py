@@ -0,0 +1,132 @@
+from sqlalchemy import func, select, bindparam, literal_column, Integer, String
+from sqlalchemy.dialects import postgresql  # регистрирует типы функций полнотекстового поиска (to_tsvector и др.)
+from models import Product
+from instrumentation import instrumented, formatting
+
+# Поиск товаров по названию. Каждый режим обслуживается своим индексом из реестра populate_data:
+#   fts       - полнотекстовый поиск, idx_product_name_fts, ранжирование ts_rank_cd
+#   substring - подстрока ILIKE '%...%', idx_product_name_trgm (pg_trgm), выше - совпадение ближе к началу
+#   similar   - похожие названия (опечатки), оператор % из pg_trgm, ранжирование similarity
+# Автодополнение - префикс lower(name) LIKE 'префикс%', idx_product_name_prefix
+
+query_param = bindparam("query", type_=String)
+pattern_param = bindparam("pattern", type_=String)
+limit_param = bindparam("limit", type_=Integer)
+
+# Конфигурация задаётся литералом, а не параметром, чтобы выражение совпадало с индексом
+russian = literal_column("'russian'")
+
+
+def name_tsvector(table):
+    return func.to_tsvector(russian, table.c.name)
+
+
+def build_fts_search(table=Product.__table__):
+    tsquery = func.websearch_to_tsquery(russian, query_param)
+    rank = func.ts_rank_cd(name_tsvector(table), tsquery)
+    return (select(
+        table.c.article,
+        table.c.name.label('product_name'),
+        table.c.sort.label('product_sort'),
+        rank.label('rank')
+    )
+    .where(name_tsvector(table).op('@@')(tsquery))
+    .order_by(rank.desc(), table.c.article)
+    .limit(limit_param)
+    )
+
+
+def build_substring_search(table=Product.__table__):
+    position = func.strpos(func.lower(table.c.name), func.lower(query_param))
+    return (select(
+        table.c.article,
+        table.c.name.label('product_name'),
+        table.c.sort.label('product_sort'),
+        (1.0 / func.nullif(position, 0)).label('rank')
+    )
+    .where(table.c.name.ilike(pattern_param))
+    .order_by(position, func.length(table.c.name), table.c.article)
+    .limit(limit_param)
+    )
+
+
+def build_similar_search(table=Product.__table__):
+    similarity = func.similarity(table.c.name, query_param)
+    return (select(
+        table.c.article,
+        table.c.name.label('product_name'),
+        table.c.sort.label('product_sort'),
+        similarity.label('rank')
+    )
+    .where(table.c.name.op('%')(query_param))
+    .order_by(similarity.desc(), table.c.article)
+    .limit(limit_param)
+    )
+
+
+def build_autocomplete(table=Product.__table__):
+    return (select(table.c.name.label('product_name'))
+    .where(func.lower(table.c.name).like(pattern_param))
+    .group_by(table.c.name)
+    .order_by(func.lower(table.c.name), table.c.name)
+    .limit(limit_param)
+    )
+
+
+search_statements = {
+    "fts": build_fts_search(),
+    "substring": build_substring_search(),
+    "similar": build_similar_search()
+}
+
+autocomplete_statement = build_autocomplete()
+
+
+def escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_params(mode, query, limit):
+    if mode not in search_statements:
+        raise ValueError(f"Неизвестный режим поиска: {mode}")
+    return {"query": query, "pattern": f"%{escape_like(query)}%", "limit": limit}
+
+
+def autocomplete_params(prefix, limit):
+    return {"pattern": escape_like(prefix.lower()) + "%", "limit": limit}
+
+
+@instrumented("search")
+def search_products(session, query='Молоко', mode="auto", limit=20, show_output=True):
+    """Поиск товаров по названию с ранжированием. mode="auto" - полнотекстовый, если он ничего не нашёл - по подстроке."""
+    if mode == "auto":
+        products = session.execute(search_statements["fts"], search_params("fts", query, limit)).all()
+        if not products:
+            products = session.execute(search_statements["substring"], search_params("substring", query, limit)).all()
+    else:
+        params = search_params(mode, query, limit)
+        products = session.execute(search_statements[mode], params).all()
+
+    with formatting():
+        if show_output:
+            print(f"\nПОИСК ТОВАРОВ '{query}' ({mode}):")
+            print("-" * 60)
+            for product in products:
+                print(f"Товар: {product.product_name:35} Сорт: {product.product_sort:15} Ранг: {float(product.rank):.4f}")
+
+    return products
+
+
+@instrumented("autocomplete")
+def autocomplete_products(session, prefix='Мол', limit=10, show_output=True):
+    """Названия товаров, начинающиеся с prefix (без учёта регистра)."""
+    suggestions = session.execute(autocomplete_statement, autocomplete_params(prefix, limit)).all()
+
+    with formatting():
+        if show_output:
+            print(f"\nАВТОДОПОЛНЕНИЕ '{prefix}':")
+            print("-" * 60)
+            for suggestion in suggestions:
+                print(suggestion.product_name)
+
+    return suggestions
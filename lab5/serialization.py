@@ -0,0 +1,136 @@
+from decimal import Decimal
+from json.encoder import encode_basestring
+import csv
+import datetime
+import io
+import math
+
+# Кодирование значений в JSON по типу значения, без промежуточных словарей.
+# Decimal записывается числом в точности как хранится в базе (47.38, а не 47.379999...)
+
+
+def _encode_float(v):
+    return repr(v) if math.isfinite(v) else "null"
+
+
+def _encode_decimal(v):
+    return str(v) if v.is_finite() else "null"
+
+
+def _encode_date(v):
+    return f'"{v.isoformat()}"'
+
+
+_encoders = {
+    type(None): lambda v: "null",
+    bool: lambda v: "true" if v else "false",
+    int: int.__repr__,
+    float: _encode_float,
+    Decimal: _encode_decimal,
+    str: encode_basestring,
+    datetime.date: _encode_date,
+    datetime.datetime: _encode_date,
+    datetime.time: _encode_date
+}
+
+
+def encode_value(v):
+    try:
+        return _encoders[type(v)](v)
+    except KeyError:
+        for base in type(v).__mro__[1:]:
+            if base in _encoders:
+                return _encoders[base](v)
+        return encode_basestring(str(v))
+
+
+def _encode_column(column):
+    # Столбец из значений одного типа кодируется одной функцией без поиска кодировщика для каждой ячейки
+    types = set(map(type, column))
+    if len(types) == 1:
+        column_type = types.pop()
+        encoder = _encoders.get(column_type, encode_value)
+        if column_type is Decimal and all(map(Decimal.is_finite, column)):
+            encoder = Decimal.__str__
+    else:
+        encoder = encode_value
+    return list(map(encoder, column))
+
+
+def _encode_columns(rows, width):
+    # Кодирование по столбцам: map по столбцу быстрее, чем цикл по ячейкам каждой строки
+    return [_encode_column(column) for column in zip(*rows)] if rows else [[] for i in range(width)]
+
+
+def _encode_rows(rows, width):
+    return ["[" + ",".join(row) + "]" for row in zip(*_encode_columns(rows, width))]
+
+
+def dumps_rows(columns, rows, execution_time=None, layout="rows", **extra):
+    """
+    JSON-ответ запроса в виде строки.
+    layout="rows":    {"columns": [...], "rows": [[v1, v2, ...], ...]}
+    layout="columns": {"columns": [...], "data": {"column": [v1, v2, ...], ...}} - столбцовое
+                      представление в духе Arrow, компактнее при большом числе строк
+    Дополнительные поля extra (например, next_cursor) добавляются в конец объекта.
+    """
+    header = "[" + ",".join(map(encode_basestring, columns)) + "]"
+    if layout == "rows":
+        body = '"rows":[' + ",".join(_encode_rows(rows, len(columns))) + "]"
+    elif layout == "columns":
+        body = '"data":{' + ",".join(
+            encode_basestring(name) + ":[" + ",".join(values) + "]"
+            for name, values in zip(columns, _encode_columns(rows, len(columns)))
+        ) + "}"
+    else:
+        raise ValueError(f"Неизвестный формат: {layout}")
+
+    timing = f',"execution_time":{_encode_float(execution_time)}' if execution_time is not None else ""
+    fields = "".join("," + encode_basestring(name) + ":" + encode_value(value) for name, value in extra.items())
+    return '{"columns":' + header + "," + body + ',"count":' + str(len(rows)) + timing + fields + "}"
+
+
+def dumps_grouped(grouped, execution_time=None, layout="rows"):
+    """
+    JSON-ответ пакетного запроса: {"results": {"ключ": <ответ dumps_rows>, ...}, "execution_time": ...}.
+    Ключи идут в порядке запроса.
+    """
+    results = ",".join(
+        encode_basestring(str(key)) + ":" + dumps_rows(row_columns(rows), rows, layout=layout)
+        for key, rows in grouped.items()
+    )
+    timing = f',"execution_time":{_encode_float(execution_time)}' if execution_time is not None else ""
+    return '{"results":{' + results + "}" + timing + "}"
+
+
+def row_columns(rows):
+    """Имена столбцов результата по первой строке (Row._fields)."""
+    return list(rows[0]._fields) if rows else []
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+# Форматы потоковой выгрузки: заголовок и кодирование одной части строк
+stream_formats = {
+    "ndjson": (lambda columns: _encode_rows([columns], len(columns))[0] + "\n",
+               lambda rows, width: "".join(line + "\n" for line in _encode_rows(rows, width))),
+    "csv": (lambda columns: _csv_lines([columns]),
+            lambda rows, width: _csv_lines(rows))
+}
+
+stream_mimetypes = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def stream_rows(columns, partitions, format="ndjson"):
+    """
+    Построчная выгрузка результата по частям: первая строка - имена столбцов,
+    далее по строке на запись (NDJSON - JSON-массив, CSV - строка CSV).
+    """
+    header, encode = stream_formats[format]
+    yield header(columns)
+    for rows in partitions:
+        yield encode(rows, len(columns))
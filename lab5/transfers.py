@@ -0,0 +1,90 @@
+from sqlalchemy import text
+from cache import mark_changed
+
+# Перемещение товара с торговой базы в отдел магазина. Пакет перемещений выполняется одним
+# оператором в транзакции вызывающего:
+#   1. строки warehouse_product пакета блокируются FOR UPDATE в порядке (trading_base_id, article);
+#   2. если на какой-то базе товара меньше, чем запрошено по всему пакету, ничего не меняется,
+#      оператор возвращает недостачи и transfer_stock поднимает InsufficientStockError;
+#   3. иначе остатки баз уменьшаются, а department_product пополняется upsert'ом
+#      в порядке (department_id, article).
+# Все транзакции берут блокировки строк в одном и том же порядке (сначала базы, затем отделы,
+# внутри таблицы - по ключу), поэтому пакеты, задевающие одни и те же товары, ждут друг друга,
+# но не попадают во взаимоблокировку.
+
+transfer_sql = text("""
+WITH requested AS (
+    SELECT * FROM unnest(CAST(:trading_base_ids AS integer[]), CAST(:department_ids AS integer[]),
+                         CAST(:articles AS integer[]), CAST(:quantities AS integer[]))
+        AS t(trading_base_id, department_id, article, quantity)
+), taken AS (
+    SELECT trading_base_id, article, SUM(quantity) AS quantity
+    FROM requested
+    GROUP BY trading_base_id, article
+), locked AS (
+    SELECT wp.trading_base_id, wp.article, wp.count
+    FROM warehouse_product wp
+    JOIN taken t ON t.trading_base_id = wp.trading_base_id AND t.article = wp.article
+    ORDER BY wp.trading_base_id, wp.article
+    FOR UPDATE OF wp
+), shortage AS (
+    SELECT t.trading_base_id, t.article, t.quantity AS requested, COALESCE(l.count, 0) AS available
+    FROM taken t
+    LEFT JOIN locked l ON l.trading_base_id = t.trading_base_id AND l.article = t.article
+    WHERE l.count IS NULL OR l.count < t.quantity
+), taken_from_bases AS (
+    UPDATE warehouse_product wp SET count = wp.count - t.quantity
+    FROM taken t
+    WHERE wp.trading_base_id = t.trading_base_id AND wp.article = t.article
+      AND NOT EXISTS (SELECT 1 FROM shortage)
+), delivered AS (
+    INSERT INTO department_product (department_id, article, count)
+    SELECT department_id, article, SUM(quantity)
+    FROM requested
+    WHERE NOT EXISTS (SELECT 1 FROM shortage)
+    GROUP BY department_id, article
+    ORDER BY department_id, article
+    ON CONFLICT (department_id, article) DO UPDATE
+    SET count = COALESCE(department_product.count, 0) + EXCLUDED.count
+)
+SELECT trading_base_id, article, requested, available FROM shortage
+ORDER BY trading_base_id, article
+""")
+
+changed_tables = ("warehouse_product", "department_product", "department_value")
+
+
+class InsufficientStockError(Exception):
+    """На базе меньше товара, чем запрошено; shortages - строки (trading_base_id, article, requested, available)."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__("Недостаточно товара: " + ", ".join(
+            f"база {s.trading_base_id} товар {s.article}: запрошено {s.requested}, есть {s.available}" for s in shortages
+        ))
+
+
+def transfer_stock(session, transfers):
+    """
+    Перемещает товар пакетом transfers - кортежи (trading_base_id, department_id, article, quantity) -
+    за одно обращение к базе. Изменения видны после COMMIT вызывающего; при нехватке товара
+    поднимается InsufficientStockError и пакет не применяется целиком.
+    """
+    transfers = list(transfers)
+    if not transfers:
+        return 0
+    if any(quantity <= 0 for *_, quantity in transfers):
+        raise ValueError("Количество перемещаемого товара должно быть положительным")
+
+    trading_base_ids, department_ids, articles, quantities = (list(column) for column in zip(*transfers))
+    shortages = session.execute(transfer_sql, {
+        "trading_base_ids": trading_base_ids,
+        "department_ids": department_ids,
+        "articles": articles,
+        "quantities": quantities
+    }).all()
+    if shortages:
+        raise InsufficientStockError(shortages)
+
+    mark_changed(session, *changed_tables)
+    return len(transfers)